@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Compares a fresh httpx.AsyncClient per call (the old KieService/proxy pattern)
+against the shared pooled client from services.http_client.
+
+    cd backend && python -m benchmarks.bench_http_client --requests 2000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.stub_server import StubHTTPServer
+from services.http_client import build_http_client
+
+
+async def _run(label: str, total: int, concurrency: int, fetch):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with sem:
+            await fetch()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {total / elapsed:10.1f} req/s   ({elapsed:.2f}s for {total} requests)")
+
+
+async def main(total: int, concurrency: int):
+    async with StubHTTPServer() as server:
+        url = f"{server.url}/api/v1/jobs/recordInfo"
+
+        async def per_call():
+            async with httpx.AsyncClient() as client:
+                resp = await client.get(url, timeout=30.0)
+                resp.raise_for_status()
+
+        await _run("per-call", total, concurrency, per_call)
+        per_call_connections = server.connections
+
+        shared = build_http_client()
+
+        async def pooled():
+            resp = await shared.get(url)
+            resp.raise_for_status()
+
+        try:
+            await _run("pooled", total, concurrency, pooled)
+        finally:
+            await shared.aclose()
+
+        print(f"TCP connections opened: per-call={per_call_connections} pooled={server.connections - per_call_connections}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.concurrency))
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Lookup latency on a large generations collection before and after the index
+bootstrap in indexes.py. Needs a real mongod; uses a scratch database that is
+dropped afterwards.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python -m benchmarks.bench_mongo_indexes --docs 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from indexes import INDEXES, ensure_indexes
+
+STATUSES = ["processing", "draft", "completed", "failed"]
+MODES = ["standard", "viral"]
+
+
+def make_doc(i: int, start: datetime) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "topic": f"Topic {i}",
+        "status": random.choice(STATUSES),
+        "mode": random.choice(MODES),
+        "theme": "trust_clarity",
+        "slide_count": 5,
+        "slides": [{"id": str(uuid.uuid4()), "title": "t", "content": "c", "background_prompt": "p"} for _ in range(5)],
+        "created_at": (start + timedelta(seconds=i)).isoformat(),
+        "updated_at": (start + timedelta(seconds=i)).isoformat(),
+    }
+
+
+async def seed(collection, total: int, batch: int = 10000) -> list:
+    start = datetime.now(timezone.utc) - timedelta(seconds=total)
+    sample_ids = []
+    for offset in range(0, total, batch):
+        docs = [make_doc(i, start) for i in range(offset, min(offset + batch, total))]
+        sample_ids.extend(random.sample([(d["id"], d["slides"][2]["id"]) for d in docs], k=min(20, len(docs))))
+        await collection.insert_many(docs, ordered=False)
+        print(f"\rseeded {offset + len(docs):,}/{total:,}", end="", flush=True)
+    print()
+    return sample_ids
+
+
+async def timed(label: str, samples: int, op):
+    durations = []
+    for _ in range(samples):
+        t = time.perf_counter()
+        await op()
+        durations.append((time.perf_counter() - t) * 1000)
+    durations.sort()
+    p95 = durations[int(len(durations) * 0.95) - 1]
+    print(f"  {label:<32} p50={statistics.median(durations):9.2f}ms  p95={p95:9.2f}ms")
+
+
+async def run_queries(collection, ids: list, samples: int):
+    await timed("find_one({id})", samples, lambda: collection.find_one({"id": random.choice(ids)[0]}, {"_id": 0}))
+    await timed("find_one({id, slides.id})", samples,
+                lambda: collection.find_one({"id": random.choice(ids)[0], "slides.id": random.choice(ids)[1]}, {"_id": 0}))
+    await timed("list newest 100", max(samples // 10, 3),
+                lambda: collection.find({}, {"_id": 0}).sort("created_at", -1).to_list(100))
+    await timed("status=draft newest 100", max(samples // 10, 3),
+                lambda: collection.find({"status": "draft"}, {"_id": 0}).sort("created_at", -1).to_list(100))
+    plan = await collection.find({"id": ids[0][0]}).explain()
+    stage = plan["queryPlanner"]["winningPlan"]
+    while "inputStage" in stage:
+        stage = stage["inputStage"]
+    print(f"  plan for find_one({{id}}): {stage['stage']}")
+
+
+async def main(total: int, samples: int):
+    client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    db = client[f"bench_indexes_{uuid.uuid4().hex[:8]}"]
+    try:
+        ids = await seed(db.generations, total)
+        print("Before indexes:")
+        await run_queries(db.generations, ids, samples)
+
+        t = time.perf_counter()
+        report = await ensure_indexes(db, {"generations": INDEXES["generations"]})
+        print(f"ensure_indexes created {len(report['created'])} indexes in {time.perf_counter() - t:.1f}s")
+
+        print("After indexes:")
+        await run_queries(db.generations, ids, samples)
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--samples", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.docs, args.samples))
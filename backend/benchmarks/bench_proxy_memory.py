@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Load test for /api/proxy/image: N concurrent downloads of a large image from a
+local stub server, sampling the proxy process RSS while they run.
+
+    cd backend && python -m benchmarks.bench_proxy_memory --mode stream --concurrency 200 --size-mb 4
+
+The proxy runs in a uvicorn subprocess with only the proxy router mounted, so
+no Mongo or provider keys are needed.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.stub_server import StubHTTPServer
+
+
+def build_app() -> FastAPI:
+    from routes import proxy
+    from services.http_client import start_http_client, close_http_client
+
+    app = FastAPI()
+    app.include_router(proxy.router, prefix="/api/proxy")
+    app.add_event_handler("startup", start_http_client)
+    app.add_event_handler("shutdown", close_http_client)
+    return app
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+async def wait_ready(url: str):
+    async with httpx.AsyncClient() as client:
+        for _ in range(100):
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("proxy did not start")
+
+
+async def main(mode: str, concurrency: int, size_mb: float, port: int):
+    body = os.urandom(int(size_mb * 1024 * 1024))
+    async with StubHTTPServer(body=body, content_type="image/png", latency=0.05) as upstream:
+        env = {**os.environ, "PROXY_MODE": mode, "IMAGE_CACHE_DIR": tempfile.mkdtemp(prefix="proxy-bench-"),
+               "HTTP_MAX_CONNECTIONS_PER_HOST": str(concurrency), "HTTP_MAX_CONNECTIONS": str(concurrency)}
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "benchmarks.bench_proxy_memory:build_app", "--factory",
+             "--port", str(port), "--log-level", "warning"],
+            env=env,
+        )
+        try:
+            base = f"http://127.0.0.1:{port}"
+            await wait_ready(f"{base}/docs")
+            baseline = rss_mb(proc.pid)
+
+            peak = baseline
+            done = asyncio.Event()
+
+            async def sample():
+                nonlocal peak
+                while not done.is_set():
+                    peak = max(peak, rss_mb(proc.pid))
+                    await asyncio.sleep(0.05)
+
+            limits = httpx.Limits(max_connections=concurrency)
+            async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+                async def download(i: int):
+                    # Distinct URLs so cache mode can't serve everything from one entry
+                    url = f"{upstream.url}/image-{i}.png"
+                    total = 0
+                    async with client.stream("GET", f"{base}/api/proxy/image", params={"url": url}) as resp:
+                        resp.raise_for_status()
+                        async for chunk in resp.aiter_bytes():
+                            total += len(chunk)
+                    return total
+
+                sampler = asyncio.create_task(sample())
+                start = time.perf_counter()
+                sizes = await asyncio.gather(*(download(i) for i in range(concurrency)))
+                elapsed = time.perf_counter() - start
+                done.set()
+                await sampler
+
+            ok = sum(1 for s in sizes if s == len(body))
+            print(f"mode={mode} downloads={concurrency} size={size_mb}MB ok={ok} elapsed={elapsed:.2f}s")
+            print(f"RSS baseline={baseline:.1f}MB peak={peak:.1f}MB delta={peak - baseline:.1f}MB "
+                  f"(fully buffered would need ~{concurrency * size_mb:.0f}MB)")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["stream", "cache"], default="stream")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(main(args.mode, args.concurrency, args.size_mb, args.port))
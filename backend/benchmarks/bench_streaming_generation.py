@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Time-to-first-slide and total time for the viral text phase, streaming vs a
+single blocking completion, against the local fake OpenAI server.
+
+    cd backend && python -m benchmarks.bench_streaming_generation --slides 12 --token-delay 0.01
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.fake_openai import FakeOpenAI
+
+
+async def blocking(service, slides: int):
+    start = time.perf_counter()
+    await service.generate_viral_structure("Benchmarks", slides, use_cache=False)
+    total = time.perf_counter() - start
+    return total, total  # nothing can be shown until the whole answer is parsed
+
+
+async def streaming(service, slides: int):
+    start = time.perf_counter()
+    first = None
+    received = 0
+    async for part, _ in service.stream_viral_structure("Benchmarks", slides, use_cache=False):
+        received += 1
+        if first is None:
+            first = time.perf_counter() - start
+    assert received == slides, f"expected {slides} parts, got {received}"
+    return first, time.perf_counter() - start
+
+
+async def main(slides: int, token_delay: float, runs: int):
+    async with FakeOpenAI(token_delay=token_delay) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.url
+        os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+        from services.openai_service import OpenAIService
+        service = OpenAIService()
+
+        print(f"{slides} slides, {token_delay * 1000:.0f}ms/token, {runs} runs")
+        for label, run in (("blocking", blocking), ("streaming", streaming)):
+            results = [await run(service, slides) for _ in range(runs)]
+            first = statistics.median(r[0] for r in results)
+            total = statistics.median(r[1] for r in results)
+            print(f"{label:<10} first slide {first * 1000:8.0f}ms   all slides {total * 1000:8.0f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slides", type=int, default=12)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(main(args.slides, args.token_delay, args.runs))
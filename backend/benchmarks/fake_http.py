@@ -0,0 +1,134 @@
+import asyncio
+import json
+import logging
+import random
+import struct
+import zlib
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+def tiny_png(width: int = 64, height: int = 64) -> bytes:
+    """A valid solid-colour PNG, so mirroring/variants work against the fakes"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    raw = b"".join(b"\x00" + b"\x30\x60\x90" * width for _ in range(height))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b""))
+
+
+class Request:
+    def __init__(self, method: str, target: str, body: bytes):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        self.body = body
+
+    def json(self) -> dict:
+        return json.loads(self.body) if self.body else {}
+
+
+class FakeHTTPServer:
+    """
+    Base for the local provider fakes: keep-alive HTTP/1.1, a `handle(request,
+    writer)` hook per request, injected failures at `error_rate` (429 with
+    Retry-After or 500, half each) and PNGs served under /images/.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.png = tiny_png()
+        self._server = None
+
+    @property
+    def origin(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def image_url(self, name: str) -> str:
+        return f"{self.origin}/images/{name}.png"
+
+    async def handle(self, request: Request, writer: asyncio.StreamWriter):
+        raise NotImplementedError
+
+    # Response helpers
+
+    @staticmethod
+    def write_head(writer, status: int = 200, content_type: str = "application/json",
+                   length: Optional[int] = None, headers: Optional[dict] = None):
+        reason = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}.get(status, "OK")
+        lines = [f"HTTP/1.1 {status} {reason}", f"Content-Type: {content_type}", "Connection: keep-alive"]
+        lines.append(f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked")
+        lines += [f"{k}: {v}" for k, v in (headers or {}).items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+
+    def write_json(self, writer, payload, status: int = 200, headers: Optional[dict] = None):
+        body = json.dumps(payload).encode()
+        self.write_head(writer, status, "application/json", len(body), headers)
+        writer.write(body)
+
+    @staticmethod
+    def write_chunk(writer, data: bytes):
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    # Plumbing
+
+    async def _dispatch(self, request: Request, writer):
+        if request.path.startswith("/images/"):
+            self.write_head(writer, 200, "image/png", len(self.png))
+            writer.write(self.png)
+            return
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            if self.random.random() < 0.5:
+                self.write_json(writer, {"error": {"message": "rate limited"}}, 429, {"Retry-After": "0.2"})
+            else:
+                self.write_json(writer, {"error": {"message": "injected failure"}}, 500)
+            return
+        await self.handle(request, writer)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                request_line, *headers = head.decode().split("\r\n")
+                method, target, _ = request_line.split(" ", 2)
+                length = 0
+                for line in headers:
+                    if line.lower().startswith("content-length:"):
+                        length = int(line.split(":", 1)[1])
+                body = await reader.readexactly(length) if length else b""
+                self.requests += 1
+                await self._dispatch(Request(method, target, body), writer)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
@@ -0,0 +1,40 @@
+import json
+import time
+import uuid
+
+from benchmarks.fake_http import FakeHTTPServer, Request
+
+
+class FakeKie(FakeHTTPServer):
+    """
+    Local stand-in for the Kie jobs API: createTask returns a task id and
+    recordInfo reports it as waiting until `task_duration` seconds have
+    passed, then success with a result image served by this server.
+
+        async with FakeKie(task_duration=3) as kie:
+            os.environ["KIE_BASE_URL"] = kie.origin
+    """
+
+    def __init__(self, task_duration: float = 2.0, latency: float = 0.02, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        self.task_duration = task_duration
+        self.tasks = {}
+
+    async def handle(self, request: Request, writer):
+        if request.path.endswith("/jobs/createTask"):
+            task_id = uuid.uuid4().hex
+            self.tasks[task_id] = time.monotonic()
+            self.write_json(writer, {"code": 200, "msg": "success", "data": {"taskId": task_id}})
+        elif request.path.endswith("/jobs/recordInfo"):
+            task_id = request.query.get("taskId")
+            created = self.tasks.get(task_id)
+            if created is None:
+                self.write_json(writer, {"code": 404, "msg": "task not found", "data": None})
+                return
+            data = {"taskId": task_id, "state": "waiting"}
+            if time.monotonic() - created >= self.task_duration:
+                data = {"taskId": task_id, "state": "success",
+                        "resultJson": json.dumps({"resultUrls": [self.image_url(task_id)]})}
+            self.write_json(writer, {"code": 200, "msg": "success", "data": data})
+        else:
+            self.write_json(writer, {"code": 404, "msg": "not found"}, 404)
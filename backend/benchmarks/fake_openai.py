@@ -0,0 +1,109 @@
+import asyncio
+import json
+import re
+import time
+import uuid
+
+from benchmarks.fake_http import FakeHTTPServer, Request
+
+DESIGN = {
+    "headline_color": "#FACC15",
+    "font_color": "#FFFFFF",
+    "text_position": "middle_center",
+    "text_align": "center",
+    "containerOpacity": 0.6,
+    "textShadow": True,
+    "font": "modern",
+    "text_width": "medium",
+}
+
+
+def viral_structure(count: int) -> dict:
+    """A plausible generate_viral_structure answer for `count` slides (~300 char bodies)"""
+    body = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor incididunt ut labore. " * 3
+    slides = [{"title": f"Point {i + 1}", "content": body.strip(), "type": "body"} for i in range(max(count - 2, 0))]
+    slides.append({"title": "Follow for more", "content": "Tap follow for daily tips", "type": "cta"})
+    return {"hero": {"topheadline": "The hook", "bottomheadline": "The subhook"}, "slides": slides}
+
+
+class FakeOpenAI(FakeHTTPServer):
+    """
+    Local stand-in for the OpenAI API (chat completions, streaming or not,
+    and image generation) so generation can be tested and benchmarked without
+    keys or network. `latency` is time to first token; completions are then
+    "generated" at `token_delay` seconds per ~4-character token, which is
+    what makes streaming measurable.
+
+        async with FakeOpenAI(token_delay=0.01) as fake:
+            os.environ["OPENAI_BASE_URL"] = fake.url
+    """
+
+    def __init__(self, token_delay: float = 0.005, latency: float = 0.05, image_latency: float = 0.5, **kwargs):
+        super().__init__(latency=latency, **kwargs)
+        self.token_delay = token_delay
+        self.image_latency = image_latency
+
+    @property
+    def url(self) -> str:
+        return f"{self.origin}/v1"
+
+    def _completion_text(self, body: dict) -> str:
+        messages = body.get("messages") or []
+        content = messages[-1].get("content") if messages else ""
+        if isinstance(content, list):  # vision request
+            return json.dumps(DESIGN)
+        match = re.search(r"(\d+)-slide", content or "")
+        return json.dumps(viral_structure(int(match.group(1)) if match else 5), indent=2)
+
+    @staticmethod
+    def _tokens(text: str):
+        return [text[i:i + 4] for i in range(0, len(text), 4)]
+
+    async def handle(self, request: Request, writer):
+        if request.path.endswith("/chat/completions"):
+            await self._chat(request.json(), writer)
+        elif request.path.endswith("/images/generations"):
+            await self._image(request.json(), writer)
+        else:
+            self.write_json(writer, {"error": {"message": "not found"}}, 404)
+
+    async def _chat(self, body: dict, writer):
+        text = self._completion_text(body)
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "gpt-4o")}
+
+        if not body.get("stream"):
+            await asyncio.sleep(self.token_delay * len(self._tokens(text)))
+            self.write_json(writer, {
+                **base, "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 500, "completion_tokens": len(text) // 4, "total_tokens": 500 + len(text) // 4},
+            })
+            return
+
+        self.write_head(writer, 200, "text/event-stream")
+
+        def event(delta: dict, finish=None) -> bytes:
+            chunk = {**base, "object": "chat.completion.chunk",
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        self.write_chunk(writer, event({"role": "assistant", "content": ""}))
+        # Paced against the clock (not sleep-per-token) so streaming and
+        # blocking responses take the same total time
+        start = time.monotonic()
+        for i, token in enumerate(self._tokens(text), 1):
+            delay = start + i * self.token_delay - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.write_chunk(writer, event({"content": token}))
+            await writer.drain()
+        self.write_chunk(writer, event({}, "stop"))
+        self.write_chunk(writer, b"data: [DONE]\n\n")
+        self.write_chunk(writer, b"")
+
+    async def _image(self, body: dict, writer):
+        await asyncio.sleep(self.image_latency)
+        self.write_json(writer, {
+            "created": int(time.time()),
+            "data": [{"url": self.image_url(uuid.uuid4().hex)} for _ in range(body.get("n", 1))],
+        })
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+End-to-end load/latency harness. Runs the real API (uvicorn server:app, with
+its embedded job worker) against local fake OpenAI and Kie servers and a
+local mongod, drives it at a fixed concurrency and writes a JSON results
+file for comparing runs over time.
+
+    cd backend && MONGO_URL=mongodb://localhost:27017 python -m benchmarks.harness \\
+        --scenarios trigger,list,proxy,pipeline --concurrency 20 --requests 500 --pipelines 10
+
+    # compare against an earlier run
+    python -m benchmarks.harness --compare benchmarks/results/bench-20260101-120000.json
+
+    # throughput at 1, 2, 4 and 8 worker processes (uvicorn --workers, multi-worker mode)
+    python -m benchmarks.harness --workers 1,2,4,8 --scenarios trigger,list,pipeline
+
+Per scenario: throughput, latency p50/p95/p99/max, errors, server event-loop
+lag (from /api/admin/event-loop, i.e. whichever worker answers) and server
+RSS summed over all worker processes. Fakes take --openai-latency,
+--token-delay, --kie-task-duration and --error-rate. A scratch database is
+used and dropped afterwards (--keep-db to inspect it).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from benchmarks.bench_proxy_memory import rss_mb, wait_ready
+from benchmarks.fake_kie import FakeKie
+from benchmarks.fake_openai import FakeOpenAI
+from services.loop_monitor import percentile
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ("trigger", "list", "proxy", "pipeline")
+
+
+def tree_rss_mb(pid: int) -> float:
+    """RSS of a process plus its children (uvicorn --workers forks one per worker)"""
+    total = rss_mb(pid)
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(c) for c in f.read().split()]
+    except OSError:
+        return total
+    for child in children:
+        try:
+            total += tree_rss_mb(child)
+        except OSError:
+            pass
+    return total
+
+
+def summarize(latencies, errors: int, elapsed: float) -> dict:
+    ms = [l * 1000 for l in latencies]
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(ms, 50), 2),
+            "p95": round(percentile(ms, 95), 2),
+            "p99": round(percentile(ms, 99), 2),
+            "max": round(max(ms), 2) if ms else 0.0,
+            "mean": round(sum(ms) / len(ms), 2) if ms else 0.0,
+        },
+    }
+
+
+async def drive(total: int, concurrency: int, op) -> dict:
+    """Runs op(i) `total` times with at most `concurrency` in flight"""
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await op(i)
+                latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+class Harness:
+    def __init__(self, args):
+        self.args = args
+        self.client: httpx.AsyncClient = None
+        self.proc: subprocess.Popen = None
+        self.rss_peak = 0.0
+
+    # Scenarios
+
+    async def trigger(self, i: int):
+        payload = {"topic": f"Benchmark topic {uuid.uuid4().hex[:8]}", "slide_count": 5}
+        if self.args.trigger_mode == "viral":
+            payload["extra_context"] = "viral"
+        resp = await self.client.post("/api/webhooks/trigger", json=payload)
+        resp.raise_for_status()
+
+    async def list(self, i: int):
+        resp = await self.client.get("/api/generations/", params={"view": "summary", "limit": 60})
+        resp.raise_for_status()
+
+    async def proxy(self, i: int):
+        # A bounded set of distinct images: first requests miss, the rest hit the proxy cache
+        url = self.openai.image_url(f"proxy-{i % self.args.proxy_images}")
+        resp = await self.client.get("/api/proxy/image", params={"url": url})
+        resp.raise_for_status()
+
+    async def _wait_for(self, gen_id: str, done, timeout: float) -> dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            resp = await self.client.get(f"/api/generations/{gen_id}")
+            resp.raise_for_status()
+            doc = resp.json()
+            if done(doc):
+                return doc
+            await asyncio.sleep(0.25)
+        raise TimeoutError(f"generation {gen_id} not done after {timeout}s")
+
+    async def pipeline(self, i: int):
+        """Viral text phase, then visuals, end to end"""
+        start = time.perf_counter()
+        resp = await self.client.post("/api/webhooks/trigger", json={
+            "topic": f"Pipeline topic {uuid.uuid4().hex[:8]}", "slide_count": 6, "extra_context": "viral",
+        })
+        resp.raise_for_status()
+        gen_id = resp.json()["id"]
+        doc = await self._wait_for(gen_id, lambda d: d["status"] in ("draft", "failed"), self.args.pipeline_timeout)
+        if doc["status"] == "failed":
+            raise RuntimeError("text phase failed")
+        self.stage_times["text"].append(time.perf_counter() - start)
+
+        visuals_start = time.perf_counter()
+        resp = await self.client.post(f"/api/generations/{gen_id}/generate-viral-visuals")
+        resp.raise_for_status()
+        doc = await self._wait_for(
+            gen_id, lambda d: (d.get("pipeline") or {}).get("status") in ("succeeded", "failed"), self.args.pipeline_timeout
+        )
+        if doc["pipeline"]["status"] != "succeeded":
+            raise RuntimeError("visuals pipeline failed")
+        self.stage_times["visuals"].append(time.perf_counter() - visuals_start)
+
+    # Plumbing
+
+    async def sample_rss(self, stop: asyncio.Event):
+        while not stop.is_set():
+            self.rss_peak = max(self.rss_peak, tree_rss_mb(self.proc.pid))
+            await asyncio.sleep(0.1)
+
+    async def run_scenario(self, name: str) -> dict:
+        await self.client.get("/api/admin/event-loop", params={"reset": "true"})
+        self.rss_peak = rss_before = tree_rss_mb(self.proc.pid)
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(self.sample_rss(stop))
+
+        if name == "pipeline":
+            self.stage_times = {"text": [], "visuals": []}
+            result = await drive(self.args.pipelines, min(self.args.concurrency, self.args.pipelines), self.pipeline)
+            result["stages"] = {stage: summarize(times, 0, 1)["latency_ms"] for stage, times in self.stage_times.items()}
+        else:
+            result = await drive(self.args.requests, self.args.concurrency, getattr(self, name))
+
+        stop.set()
+        await sampler
+        loop = (await self.client.get("/api/admin/event-loop")).json()
+        result["event_loop_lag_ms"] = {k: loop[k] for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms")}
+        result["rss_mb"] = {"before": round(rss_before, 1), "peak": round(self.rss_peak, 1),
+                            "after": round(tree_rss_mb(self.proc.pid), 1)}
+        return result
+
+    def server_env(self, db_name: str, scratch: str, workers: int) -> dict:
+        args = self.args
+        return {
+            **os.environ,
+            "WEB_CONCURRENCY": str(workers),
+            "MONGO_URL": args.mongo_url,
+            "DB_NAME": db_name,
+            "OPENAI_API_KEY": "sk-bench",
+            "OPENAI_BASE_URL": self.openai.url,
+            "KIE_AI_API_KEY": "bench",
+            "KIE_BASE_URL": self.kie.origin,
+            "KIE_POLL_INITIAL_DELAY": "0.5",
+            "KIE_POLL_MAX_DELAY": "2",
+            "KIE_POLL_TICK": "0.2",
+            "KIE_POLL_BUDGET_PER_SECOND": "200",
+            "EMBEDDED_WORKER": "true",
+            "JOB_POLL_INTERVAL": "0.2",
+            "JOB_WORKER_CONCURRENCY": str(args.worker_concurrency),
+            # Measure the app, not the provider limits or the LLM cache
+            "LLM_CACHE_ENABLED": "false",
+            "RATE_LIMITS": json.dumps({"openai": {"rpm": 100000, "tpm": 0, "concurrency": 256},
+                                       "kie": {"rpm": 100000, "tpm": 0, "concurrency": 256}}),
+            "BLOB_STORE_DIR": os.path.join(scratch, "storage"),
+            "IMAGE_CACHE_DIR": os.path.join(scratch, "cache", "images"),
+            "VARIANT_CACHE_DIR": os.path.join(scratch, "cache", "variants"),
+            "EXPORT_CACHE_DIR": os.path.join(scratch, "cache", "exports"),
+        }
+
+    async def run_workers(self, mongo, workers: int) -> dict:
+        """Starts the API with `workers` processes on a fresh database and runs every scenario"""
+        args = self.args
+        db_name = f"bench_{uuid.uuid4().hex[:8]}"
+        scratch = tempfile.mkdtemp(prefix="bench-")
+        command = [sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.port), "--log-level", "warning"]
+        if workers > 1:
+            command += ["--workers", str(workers)]
+        self.proc = subprocess.Popen(command, env=self.server_env(db_name, scratch, workers))
+        base = f"http://127.0.0.1:{args.port}"
+        limits = httpx.Limits(max_connections=args.concurrency * 2)
+        results = {}
+        try:
+            await wait_ready(f"{base}/api/health")
+            async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60.0) as self.client:
+                for name in args.scenarios:
+                    print(f"running {name} ({workers} worker{'s' if workers > 1 else ''})...", flush=True)
+                    results[name] = await self.run_scenario(name)
+        finally:
+            self.proc.terminate()
+            self.proc.wait(timeout=60)
+            if not args.keep_db:
+                await mongo.drop_database(db_name)
+        return results
+
+    async def run(self) -> dict:
+        args = self.args
+        mongo = AsyncIOMotorClient(args.mongo_url, serverSelectionTimeoutMS=3000)
+        try:
+            await mongo.admin.command("ping")
+        except Exception as e:
+            raise SystemExit(f"The harness needs a local mongod at {args.mongo_url} ({e})")
+
+        self.openai = FakeOpenAI(latency=args.openai_latency, token_delay=args.token_delay,
+                                 image_latency=args.image_latency, error_rate=args.error_rate, seed=1)
+        self.kie = FakeKie(task_duration=args.kie_task_duration, error_rate=args.error_rate, seed=2)
+        runs = {}
+        try:
+            async with self.openai, self.kie:
+                for workers in args.workers:
+                    runs[str(workers)] = await self.run_workers(mongo, workers)
+        finally:
+            mongo.close()
+
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            # keyed by worker count
+            "runs": runs,
+            "fakes": {
+                "openai": {"requests": self.openai.requests, "injected_errors": self.openai.errors},
+                "kie": {"requests": self.kie.requests, "injected_errors": self.kie.errors},
+            },
+        }
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def _baseline_run(baseline: dict, workers: str) -> dict:
+    if not baseline:
+        return {}
+    if "runs" in baseline:
+        return baseline["runs"].get(workers, {})
+    # Reports from before --workers are single-process runs
+    return baseline.get("scenarios", {}) if workers == "1" else {}
+
+
+def print_report(report: dict, baseline: dict = None):
+    runs = report["runs"]
+    for workers, scenarios in runs.items():
+        print(f"\n{workers} worker{'s' if workers != '1' else ''}")
+        print(f"{'scenario':<10} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'errors':>7} {'lag p99':>8} {'rss peak':>9}")
+        old_run = _baseline_run(baseline, workers)
+        for name, r in scenarios.items():
+            lat = r["latency_ms"]
+            line = (f"{name:<10} {r['throughput_rps']:>9.1f} {lat['p50']:>8.1f}ms {lat['p95']:>7.1f}ms {lat['p99']:>7.1f}ms "
+                    f"{r['errors']:>7} {r['event_loop_lag_ms']['p99_ms']:>6.1f}ms {r['rss_mb']['peak']:>7.1f}MB")
+            old = old_run.get(name)
+            if old:
+                def delta(new, prev):
+                    return f"{(new - prev) / prev * 100:+.0f}%" if prev else "n/a"
+                line += f"   vs baseline: rps {delta(r['throughput_rps'], old['throughput_rps'])}, p95 {delta(lat['p95'], old['latency_ms']['p95'])}"
+            print(line)
+            for stage, s in r.get("stages", {}).items():
+                print(f"  {stage:<8} {'':>9} {s['p50']:>8.1f}ms {s['p95']:>7.1f}ms {s['p99']:>7.1f}ms")
+
+    if len(runs) > 1:
+        counts = list(runs)
+        print(f"\nscaling (rps, speedup vs {counts[0]} worker{'s' if counts[0] != '1' else ''})")
+        print(f"{'scenario':<10}" + "".join(f"{n + 'w':>16}" for n in counts))
+        for name in runs[counts[0]]:
+            first = runs[counts[0]][name]["throughput_rps"]
+            cells = []
+            for n in counts:
+                rps = runs[n].get(name, {}).get("throughput_rps")
+                cells.append(f"{rps:>8.1f} ({rps / first:.1f}x)" if rps is not None and first else f"{'n/a':>16}")
+            print(f"{name:<10}" + "".join(f"{c:>16}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda s: [x for x in s.split(",") if x in SCENARIOS])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=500, help="requests per HTTP scenario")
+    parser.add_argument("--pipelines", type=int, default=10, help="end-to-end viral generations")
+    parser.add_argument("--pipeline-timeout", type=float, default=120)
+    parser.add_argument("--trigger-mode", choices=["standard", "viral"], default="standard")
+    parser.add_argument("--proxy-images", type=int, default=50)
+    parser.add_argument("--workers", default=[1], type=lambda s: [int(x) for x in s.split(",") if x],
+                        help="comma-separated worker process counts to sweep, e.g. 1,2,4,8")
+    parser.add_argument("--worker-concurrency", type=int, default=8, help="embedded job worker concurrency per process")
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    parser.add_argument("--image-latency", type=float, default=1.0)
+    parser.add_argument("--kie-task-duration", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of provider calls failing (429/500)")
+    parser.add_argument("--mongo-url", default=os.getenv("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--keep-db", action="store_true")
+    parser.add_argument("--output", help="results file (default benchmarks/results/bench-<time>.json)")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    args = parser.parse_args()
+
+    report = asyncio.run(Harness(args).run())
+    output = Path(args.output) if args.output else RESULTS_DIR / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    print_report(report, baseline)
+    print(f"\nresults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
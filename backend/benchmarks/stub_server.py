@@ -0,0 +1,70 @@
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StubHTTPServer:
+    """
+    Minimal keep-alive HTTP/1.1 server used by the benchmarks so they can run
+    without network access or provider keys. Every request gets `body` back.
+    """
+
+    def __init__(self, body: bytes = b'{"code":200,"data":{}}', content_type: str = "application/json",
+                 host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.body = body
+        self.content_type = content_type
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    + f"Content-Type: {self.content_type}\r\n".encode()
+                    + f"Content-Length: {len(self.body)}\r\n".encode()
+                    + b"Connection: keep-alive\r\n\r\n"
+                    + self.body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
@@ -1,5 +1,6 @@
 
 import os
+import json
 from pydantic import BaseModel
 from functools import lru_cache
 from dotenv import load_dotenv
@@ -11,11 +12,154 @@ load_dotenv(ROOT_DIR / '.env')
 class Settings(BaseModel):
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
     openai_base_url: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    # Process-wide AsyncOpenAI client (services/openai_service.py)
+    openai_timeout: float = float(os.getenv("OPENAI_TIMEOUT", "120"))
+    openai_connect_timeout: float = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+    openai_max_connections: int = int(os.getenv("OPENAI_MAX_CONNECTIONS", "100"))
+    openai_max_keepalive_connections: int = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "20"))
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o")
     dalle_model: str = os.getenv("DALLE_MODEL", "dall-e-3")
     mongo_url: str = os.getenv("MONGO_URL", "mongodb://localhost:27017")
     db_name: str = os.getenv("DB_NAME", "app_db")
 
+    # Shared outbound HTTP client (Kie, image proxy)
+    http2_enabled: bool = os.getenv("HTTP2_ENABLED", "true").lower() == "true"
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "200"))
+    http_max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "50"))
+    http_max_connections_per_host: int = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "50"))
+    http_keepalive_expiry: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+    http_connect_timeout: float = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+    http_read_timeout: float = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+    http_pool_timeout: float = float(os.getenv("HTTP_POOL_TIMEOUT", "10"))
+
+    # Kie task completion: callback first, adaptive polling as fallback
+    kie_base_url: str = os.getenv("KIE_BASE_URL", "https://api.kie.ai")
+    kie_callback_url: str = os.getenv("KIE_CALLBACK_URL", "")
+    kie_callback_token: str = os.getenv("KIE_CALLBACK_TOKEN", "")
+    # Callbacks are only accepted (and KIE_CALLBACK_URL only registered) with a token, and
+    # their result URLs must be on one of these hosts (or a subdomain) before we fetch them
+    kie_result_hosts: list = [h.strip().lower() for h in os.getenv("KIE_RESULT_HOSTS", "aiquickdraw.com,kie.ai").split(",") if h.strip()]
+    kie_poll_initial_delay: float = float(os.getenv("KIE_POLL_INITIAL_DELAY", "2"))
+    kie_poll_max_delay: float = float(os.getenv("KIE_POLL_MAX_DELAY", "20"))
+    kie_task_timeout: float = float(os.getenv("KIE_TASK_TIMEOUT", "300"))
+    kie_poll_tick: float = float(os.getenv("KIE_POLL_TICK", "1"))
+    kie_poll_budget_per_second: float = float(os.getenv("KIE_POLL_BUDGET_PER_SECOND", "10"))
+
+    # Durable job queue (see services/job_queue.py and worker.py)
+    embedded_worker: bool = os.getenv("EMBEDDED_WORKER", "true").lower() == "true"
+    job_worker_concurrency: int = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+    job_poll_interval: float = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+    job_lease_seconds: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    job_retry_base_delay: float = float(os.getenv("JOB_RETRY_BASE_DELAY", "10"))
+    job_retry_max_delay: float = float(os.getenv("JOB_RETRY_MAX_DELAY", "600"))
+    job_drain_timeout: float = float(os.getenv("JOB_DRAIN_TIMEOUT", "30"))
+
+    # Multi-worker deployment (gunicorn.conf.py, or uvicorn --workers): WEB_CONCURRENCY
+    # processes coordinate through Mongo. One of them, elected with a lease in
+    # `leases`, polls Kie for everyone; provider rate limits are split between them
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "1"))
+    multi_worker: bool = os.getenv("MULTI_WORKER", "true" if int(os.getenv("WEB_CONCURRENCY", "1")) > 1 else "false").lower() == "true"
+    leader_lease_seconds: float = float(os.getenv("LEADER_LEASE_SECONDS", "15"))
+    # How often each process re-reads the shared disk cache directories
+    disk_cache_rescan_interval: float = float(os.getenv("DISK_CACHE_RESCAN_INTERVAL", "300"))
+    # On shutdown open requests (SSE streams are ended) get this long before the job drain
+    http_drain_timeout: float = float(os.getenv("HTTP_DRAIN_TIMEOUT", "10"))
+
+    # Provider rate limits, e.g. RATE_LIMITS='{"openai:gpt-4o": {"rpm": 500, "tpm": 30000, "concurrency": 16}}'
+    rate_limits: dict = json.loads(os.getenv("RATE_LIMITS", "{}"))
+    rate_limit_max_attempts: int = int(os.getenv("RATE_LIMIT_MAX_ATTEMPTS", "4"))
+    rate_limit_backoff_base: float = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "2"))
+
+    # Circuit breakers per provider/model (services/resilience.py): open after
+    # BREAKER_FAILURE_THRESHOLD consecutive failures or a BREAKER_FAILURE_RATE
+    # failure rate over BREAKER_WINDOW seconds, retry after BREAKER_RESET_TIMEOUT
+    breaker_failure_threshold: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    breaker_failure_rate: float = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+    breaker_min_calls: int = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+    breaker_window: float = float(os.getenv("BREAKER_WINDOW", "60"))
+    breaker_reset_timeout: float = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+    # Generate the viral hero with DALL-E while Kie's hero model circuit is open
+    kie_hero_fallback: bool = os.getenv("KIE_HERO_FALLBACK", "true").lower() == "true"
+    # Design analysis: per-call timeout, and a hedged second request after
+    # DESIGN_HEDGE_DELAY seconds (0 = no hedging)
+    design_analysis_timeout: float = float(os.getenv("DESIGN_ANALYSIS_TIMEOUT", "30"))
+    design_hedge_delay: float = float(os.getenv("DESIGN_HEDGE_DELAY", "0"))
+
+    # /api/proxy/image: "cache" serves from the disk cache, "stream" pipes upstream straight through
+    proxy_mode: str = os.getenv("PROXY_MODE", "cache")
+    proxy_max_image_bytes: int = int(os.getenv("PROXY_MAX_IMAGE_BYTES", str(25 * 1024 ** 2)))
+    proxy_upstream_timeout: float = float(os.getenv("PROXY_UPSTREAM_TIMEOUT", "10"))
+    proxy_allowed_content_types: list = os.getenv(
+        "PROXY_ALLOWED_CONTENT_TYPES", "image/png,image/jpeg,image/webp,image/gif,image/avif"
+    ).split(",")
+
+    # On-disk cache behind /api/proxy/image
+    image_cache_dir: str = os.getenv("IMAGE_CACHE_DIR", str(ROOT_DIR / "cache" / "images"))
+    image_cache_max_bytes: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+    image_cache_ttl: float = float(os.getenv("IMAGE_CACHE_TTL", "86400"))
+
+    # Mirrored generation images (services/image_mirror.py): BLOB_STORE=local or s3
+    mirror_generated_images: bool = os.getenv("MIRROR_GENERATED_IMAGES", "true").lower() == "true"
+    public_base_url: str = os.getenv("PUBLIC_BASE_URL", "")
+    blob_store: str = os.getenv("BLOB_STORE", "local")
+    blob_store_dir: str = os.getenv("BLOB_STORE_DIR", str(ROOT_DIR / "storage"))
+    s3_bucket: str = os.getenv("S3_BUCKET", "")
+    s3_prefix: str = os.getenv("S3_PREFIX", "")
+    s3_endpoint_url: str = os.getenv("S3_ENDPOINT_URL", "")
+    s3_public_url: str = os.getenv("S3_PUBLIC_URL", "")
+    image_variant_widths: list = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "256,512").split(",") if w]
+
+    # On-demand variants for /api/images/{hash}?w=&fmt= and other CPU-bound work
+    cpu_workers: int = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+    variant_cache_dir: str = os.getenv("VARIANT_CACHE_DIR", str(ROOT_DIR / "cache" / "variants"))
+    variant_cache_max_bytes: int = int(os.getenv("VARIANT_CACHE_MAX_BYTES", str(1024 ** 3)))
+    variant_max_width: int = int(os.getenv("VARIANT_MAX_WIDTH", "2048"))
+
+    # Server-side slide export (services/slide_exporter.py)
+    export_cache_dir: str = os.getenv("EXPORT_CACHE_DIR", str(ROOT_DIR / "cache" / "exports"))
+    export_cache_max_bytes: int = int(os.getenv("EXPORT_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+    # LLM response cache (services/llm_cache.py)
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_ttl: int = int(os.getenv("LLM_CACHE_TTL", str(7 * 86400)))
+    llm_cache_max_entries: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+
+    # Stream the viral text phase, persisting slides as they complete
+    llm_streaming: bool = os.getenv("LLM_STREAMING", "true").lower() == "true"
+    # Start viral visuals automatically after the text phase; with streaming
+    # the hero image task is created as soon as the hero prompt is known
+    viral_auto_visuals: bool = os.getenv("VIRAL_AUTO_VISUALS", "false").lower() == "true"
+
+    # Concurrent DALL-E calls per POST /generations/{id}/generate-images job
+    image_batch_concurrency: int = int(os.getenv("IMAGE_BATCH_CONCURRENCY", "4"))
+
+    # Speculative alternate hero images per viral visuals run (0 = off)
+    viral_alternates: int = int(os.getenv("VIRAL_ALTERNATES", "0"))
+
+    # Event-loop lag sampling period (services/loop_monitor.py)
+    loop_lag_interval: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.1"))
+    # Watchdog thread sampling the loop's stack whenever it is held longer than the threshold;
+    # LOOP_DEBUG also turns on asyncio debug mode to name the slow callbacks (costly, not for prod)
+    loop_watchdog: bool = os.getenv("LOOP_WATCHDOG", "true").lower() == "true"
+    loop_block_threshold: float = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+    loop_debug: bool = os.getenv("LOOP_DEBUG", "false").lower() == "true"
+
+    # Tracing (services/telemetry.py): spans are kept in memory for /api/admin/traces
+    # and, when OTEL_EXPORTER_OTLP_ENDPOINT is set, shipped to a collector as OTLP/JSON
+    tracing_enabled: bool = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+    trace_sample_rate: float = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+    trace_buffer_spans: int = int(os.getenv("TRACE_BUFFER_SPANS", "5000"))
+    otel_exporter_otlp_endpoint: str = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+    otel_service_name: str = os.getenv("OTEL_SERVICE_NAME", "social-media-automation")
+
+    # Batch ingestion (POST /api/webhooks/trigger/batch)
+    ingest_max_batch: int = int(os.getenv("INGEST_MAX_BATCH", "500"))
+    ingest_dedupe_window: int = int(os.getenv("INGEST_DEDUPE_WINDOW", "86400"))
+
+    # Startup index bootstrap (indexes.py) runs in the background and is abandoned after this long
+    index_bootstrap_timeout: float = float(os.getenv("INDEX_BOOTSTRAP_TIMEOUT", "120"))
+
 @lru_cache()
 def get_settings() -> Settings:
     return Settings()
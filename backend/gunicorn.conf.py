@@ -0,0 +1,33 @@
+"""
+Multi-worker deployment:
+
+    cd backend && WEB_CONCURRENCY=4 gunicorn server:app -c gunicorn.conf.py
+
+Workers share nothing in memory; they coordinate through Mongo (job queue,
+Kie task state, leader leases) and share the on-disk caches. Generation SSE
+across workers needs MongoDB change streams, i.e. a replica set.
+
+On SIGTERM each worker ends its SSE streams and stops claiming jobs, gives
+open requests HTTP_DRAIN_TIMEOUT seconds, then lets in-flight jobs run for
+JOB_DRAIN_TIMEOUT before handing them back to the queue for another worker.
+graceful_timeout covers both, so gunicorn doesn't kill a worker mid-drain.
+
+`uvicorn server:app --workers N` also works (set WEB_CONCURRENCY=N and
+--timeout-graceful-shutdown), but without the early drain on SIGTERM.
+"""
+
+import multiprocessing
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(multiprocessing.cpu_count(), 4))))
+# Read by config.Settings in the workers (multi-worker mode, rate limit split)
+os.environ["WEB_CONCURRENCY"] = str(workers)
+
+bind = os.getenv("BIND", "0.0.0.0:8001")
+worker_class = "gunicorn_worker.DrainingUvicornWorker"
+# The app opens its Mongo client and event loop state at import, so each worker imports it after the fork
+preload_app = False
+
+graceful_timeout = int(float(os.getenv("HTTP_DRAIN_TIMEOUT", "10")) + float(os.getenv("JOB_DRAIN_TIMEOUT", "30"))) + 15
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+keepalive = 5
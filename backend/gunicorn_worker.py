@@ -0,0 +1,37 @@
+
+import os
+import sys
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.main import Server
+from uvicorn.workers import UvicornWorker
+
+from services.lifecycle import begin_drain
+
+
+class _DrainingServer(Server):
+    def handle_exit(self, sig, frame):
+        begin_drain()
+        super().handle_exit(sig, frame)
+
+
+class DrainingUvicornWorker(UvicornWorker):
+    """
+    UvicornWorker that starts the app's drain (services/lifecycle.py) the
+    moment it is asked to stop, and gives open requests HTTP_DRAIN_TIMEOUT
+    seconds instead of waiting on them (SSE streams never finish by
+    themselves) before the lifespan shutdown drains the job worker.
+    """
+
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "timeout_graceful_shutdown": int(float(os.getenv("HTTP_DRAIN_TIMEOUT", "10"))),
+    }
+
+    async def _serve(self):
+        self.config.app = self.wsgi
+        server = _DrainingServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
@@ -0,0 +1,131 @@
+
+import asyncio
+import logging
+from typing import Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every index the app relies on, per collection. Names are fixed so startup
+# can verify them idempotently instead of piling up duplicates.
+INDEXES = {
+    "generations": [
+        # find_one / update_one({"id": ...}) on every route
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # list_generations keyset pagination on (created_at, id), newest first
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id_desc"),
+        # dashboard filters, same ordering
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="status_created_at_id"),
+        IndexModel([("mode", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="mode_created_at_id"),
+        # positional slide updates: update_one({"id": ..., "slides.id": ...})
+        IndexModel([("slides.id", ASCENDING)], name="slides_id"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("run_at", ASCENDING)], name="status_run_at"),
+        IndexModel([("status", ASCENDING), ("lease_expires_at", ASCENDING)], name="status_lease_expires_at"),
+    ],
+    "llm_cache": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+        # LRU eviction once the cache is over LLM_CACHE_MAX_ENTRIES
+        IndexModel([("last_used_at", ASCENDING)], name="last_used_at"),
+    ],
+    "kie_tasks": [
+        # shared Kie poller (multi-worker mode): the leader's due-task scan
+        IndexModel([("status", ASCENDING), ("next_poll_at", ASCENDING)], name="status_next_poll_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "ingest_keys": [
+        # batch trigger idempotency keys (_id) drop out after their dedupe window
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+}
+
+
+def _same_index(existing: dict, wanted: dict) -> bool:
+    return (
+        [tuple(k) for k in existing["key"]] == list(wanted["key"].items())
+        and bool(existing.get("unique")) == bool(wanted.get("unique"))
+    )
+
+
+async def ensure_indexes(db, indexes: dict = None, create: bool = True) -> dict:
+    """
+    Creates missing indexes and verifies existing ones match the spec. Safe to
+    run on every startup. Conflicts are logged rather than raised so a bad
+    index never keeps the API from booting. create=False only reports, with
+    absent indexes listed under "missing".
+    """
+    report = {"created": [], "verified": [], "conflicts": [], "missing": []}
+    for collection_name, models in (indexes or INDEXES).items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        for model in models:
+            wanted = model.document
+            name = wanted["name"]
+            label = f"{collection_name}.{name}"
+
+            if name in existing:
+                if _same_index(existing[name], wanted):
+                    report["verified"].append(label)
+                else:
+                    report["conflicts"].append(label)
+                    logger.error(f"Index {label} exists with a different definition: {existing[name]}")
+                continue
+
+            same_keys = [n for n, info in existing.items() if _same_index(info, wanted)]
+            if same_keys:
+                report["verified"].append(f"{collection_name}.{same_keys[0]}")
+                continue
+
+            if not create:
+                report["missing"].append(label)
+                continue
+            try:
+                await collection.create_indexes([model])
+                report["created"].append(label)
+                logger.info(f"Created index {label}")
+            except OperationFailure as e:
+                # e.g. duplicate ids prevent the unique index
+                report["conflicts"].append(label)
+                logger.error(f"Could not create index {label}: {e}")
+    return report
+
+
+_bootstrap_task: Optional[asyncio.Task] = None
+
+
+async def _bootstrap(db, timeout: float):
+    try:
+        report = await asyncio.wait_for(ensure_indexes(db), timeout)
+        logger.info(
+            f"Index bootstrap done: {len(report['created'])} created, "
+            f"{len(report['verified'])} verified, {len(report['conflicts'])} conflicts"
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"Index bootstrap did not finish within {timeout}s; running with the indexes that exist")
+    except Exception as e:
+        logger.error(f"Index bootstrap failed: {e}")
+
+
+def start_index_bootstrap(db, timeout: float):
+    """
+    Runs ensure_indexes in the background so a slow build (large collection,
+    unreachable primary) doesn't hold up boot. Queries work without the
+    indexes, only slower; failures are logged.
+    """
+    global _bootstrap_task
+    _bootstrap_task = asyncio.create_task(_bootstrap(db, timeout))
+
+
+async def stop_index_bootstrap():
+    global _bootstrap_task
+    if _bootstrap_task:
+        _bootstrap_task.cancel()
+        try:
+            await _bootstrap_task
+        except asyncio.CancelledError:
+            pass
+        _bootstrap_task = None
@@ -1,6 +1,6 @@
 
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, RootModel, model_validator
+from typing import List, Optional, Union, get_args
 from datetime import datetime, timezone
 import uuid
 
@@ -17,6 +17,8 @@ class Slide(BaseModel):
     content: str
     background_prompt: str
     background_url: Optional[str] = None
+    background_source_url: Optional[str] = None  # provider URL before mirroring
+    alternate_background_urls: List[str] = []  # speculative hero variants to swap in
     
     # Design Properties
     type: str = "body"       
@@ -53,6 +55,7 @@ class GenerationBase(BaseModel):
     # Business Context
     business_name: Optional[str] = None
     business_type: Optional[str] = None
+    rss_source: Optional[str] = None
 
 class GenerationCreate(GenerationBase):
     pass
@@ -60,11 +63,79 @@ class GenerationCreate(GenerationBase):
 class Generation(GenerationBase):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     slides: List[Slide] = []
+    version: int = 0  # bumped on every write; optimistic concurrency for editors
+    pipeline: Optional[dict] = None  # last pipeline run: status and per-stage timings
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     
     model_config = ConfigDict(extra="ignore")
 
+_NULLABLE_SLIDE_FIELDS = {name for name, field in Slide.model_fields.items() if type(None) in get_args(field.annotation)}
+
+class SlidePatch(BaseModel):
+    """Partial slide update: only the fields that are sent are written"""
+    title: Optional[str] = None
+    content: Optional[str] = None
+    background_prompt: Optional[str] = None
+    background_url: Optional[str] = None
+    background_source_url: Optional[str] = None
+    type: Optional[str] = None
+    layout: Optional[str] = None
+    variant: Optional[str] = None
+    font: Optional[str] = None
+    text_effect: Optional[str] = None
+    theme: Optional[str] = None
+    arrow_color: Optional[str] = None
+    font_color: Optional[str] = None
+    headline_color: Optional[str] = None
+    text_position: Optional[str] = None
+    text_align: Optional[str] = None
+    text_width: Optional[str] = None
+    text_bg_enabled: Optional[bool] = None
+    container_opacity: Optional[float] = None
+    glass_intensity: Optional[str] = None
+    theme_mode: Optional[str] = None
+    text_shadow: Optional[bool] = None
+
+    model_config = ConfigDict(extra="forbid")
+
+    @model_validator(mode="after")
+    def _reject_nulls(self):
+        # Fields are Optional here only so they can be left out; a null would be stored
+        # as-is and break Slide validation on every later read
+        nulls = sorted(f for f in self.model_fields_set if getattr(self, f) is None and f not in _NULLABLE_SLIDE_FIELDS)
+        if nulls:
+            raise ValueError(f"{', '.join(nulls)} cannot be null")
+        return self
+
+    def changes(self) -> dict:
+        return self.model_dump(exclude_unset=True, exclude={"id"})
+
+class SlidePatchItem(SlidePatch):
+    id: str
+
+class BulkSlidePatch(BaseModel):
+    slides: List[SlidePatchItem]
+    version: Optional[int] = None  # expected generation version; omit to skip the check
+
+class GenerationSummary(BaseModel):
+    """List-view projection: no slide bodies"""
+    id: str
+    topic: str
+    status: str = "pending"
+    mode: str = "standard"
+    theme: str = "trust_clarity"
+    business_name: Optional[str] = None
+    slide_total: int = 0
+    thumbnail: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    model_config = ConfigDict(extra="ignore")
+
+class GenerationPage(RootModel[Union[List[Generation], List[GenerationSummary]]]):
+    """One page of GET /api/generations (full or view=summary); the next cursor is in X-Next-Cursor"""
+
 class WebhookPayload(BaseModel):
     topic: str
     slide_count: int = 5
@@ -73,3 +144,9 @@ class WebhookPayload(BaseModel):
     extra_context: Optional[str] = None
     business_name: Optional[str] = None
     business_type: Optional[str] = None
+    idempotency_key: Optional[str] = None  # defaults to a hash of topic + source + business
+    use_cache: bool = True  # False forces fresh LLM output instead of a cached response
+
+class BatchTriggerPayload(BaseModel):
+    # Items are validated one by one so a bad item doesn't reject the batch
+    items: List[dict]
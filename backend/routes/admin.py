@@ -0,0 +1,101 @@
+
+from fastapi import APIRouter
+from services.kie_poller import get_kie_poller
+from services.job_queue import get_job_queue
+from services.rate_limiter import limiter_stats
+from services.resilience import breaker_stats
+from services.image_cache import get_image_cache
+from services.variant_cache import get_variant_cache
+from services.slide_exporter import get_slide_exporter
+from services.events import get_event_bus
+from services.llm_cache import get_llm_cache
+from services.loop_monitor import get_loop_monitor
+from services.telemetry import get_span_exporter
+from services.leader import HOLDER_ID, lease_stats
+from database import db
+from indexes import ensure_indexes
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/kie-poller")
+async def kie_poller_stats():
+    """Queue depth, poll counts and time-to-completion for outstanding Kie tasks"""
+    return get_kie_poller().stats()
+
+@router.get("/jobs")
+async def job_queue_stats():
+    """Job counts by status (queued / running / succeeded / dead)"""
+    return await get_job_queue().depth()
+
+@router.get("/rate-limits")
+async def rate_limit_stats():
+    """Per provider/model limiter state and time spent waiting on it"""
+    return limiter_stats()
+
+@router.get("/circuit-breakers")
+async def circuit_breaker_stats():
+    """Per provider/model breaker state, recent failure rate and fast-failed calls"""
+    return breaker_stats()
+
+@router.get("/image-cache")
+async def image_cache_stats():
+    """Proxy disk cache hit rate, size and evictions"""
+    return get_image_cache().stats()
+
+@router.get("/variant-cache")
+async def variant_cache_stats():
+    """On-demand image variant cache (/api/images/{hash}?w=&fmt=)"""
+    return get_variant_cache().stats()
+
+@router.get("/export-cache")
+async def export_cache_stats():
+    """Server-side export cache and render counts"""
+    return get_slide_exporter().stats()
+
+@router.get("/llm-cache")
+async def llm_cache_stats():
+    """LLM response cache hit rate, tokens saved and entry count"""
+    return await get_llm_cache().stats()
+
+@router.get("/events")
+async def event_bus_stats():
+    """Live-update source (change stream or in-process), subscribers and events published"""
+    return get_event_bus().stats()
+
+@router.get("/event-loop")
+async def event_loop_stats(reset: bool = False):
+    """Event-loop lag percentiles over the recent window; reset=true starts a new window"""
+    monitor = get_loop_monitor()
+    stats = monitor.stats()
+    if reset:
+        monitor.reset()
+    return stats
+
+@router.get("/event-loop/blocking")
+async def event_loop_blocking(limit: int = 20):
+    """What held the event loop: worst offenders by total blocked time with stack samples, recent blocks, slow callbacks"""
+    return get_loop_monitor().blocking_report(limit)
+
+@router.get("/traces")
+async def recent_traces(trace_id: str = None, limit: int = 200):
+    """Most recent finished spans (OTLP/JSON), newest first; trace_id narrows to one trace"""
+    spans = get_span_exporter().get_finished_spans(trace_id)
+    return [span.to_dict() for span in reversed(spans[-limit:])]
+
+@router.get("/leases")
+async def leader_leases():
+    """Leader leases (multi-worker mode): who holds each one, and this worker's view of its own"""
+    holders = await db.leases.find({}).to_list(100)
+    return {"this_worker": HOLDER_ID, "local": lease_stats(), "leases": holders}
+
+@router.get("/indexes")
+async def verify_indexes():
+    """Read-only: reports verified / missing / conflicting indexes"""
+    return await ensure_indexes(db, create=False)
+
+@router.post("/indexes")
+async def create_indexes():
+    """Re-runs the (idempotent) index bootstrap: creates missing indexes, reports the rest"""
+    return await ensure_indexes(db)
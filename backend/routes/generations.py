@@ -1,10 +1,26 @@
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from models import Generation, Slide
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query, Header
+from fastapi.responses import StreamingResponse
+from models import Generation, GenerationPage, GenerationSummary, Slide, SlidePatch, BulkSlidePatch
 from database import db
-from services.openai_service import OpenAIService
-from services.kie_service import KieService
-from typing import List
+from services.openai_service import OpenAIService, get_openai_service
+from services.kie_service import get_kie_service
+from services.hero_image import clear_hero_task, wait_for_hero
+from services.job_queue import get_job_queue, report_progress
+from services.image_mirror import ImageMirror
+from services.slide_exporter import BackgroundUnavailable, get_slide_exporter, EXPORT_FORMATS
+from services.file_response import file_response
+from services.rate_limiter import current_tenant
+from services.events import get_event_bus
+from services.pipeline import Stage, run_pipeline
+from services.resilience import CircuitOpen
+from config import get_settings
+from typing import List, Optional
+from pymongo import ReturnDocument
+import base64
+import json
+import asyncio
+import time
 from datetime import datetime, timezone
 import logging
 
@@ -12,96 +28,557 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 
 # ... existing read routes ...
-@router.get("/", response_model=List[Generation])
-async def list_generations():
-    docs = await db.generations.find({}, {"_id": 0}).sort("created_at", -1).to_list(100)
-    return docs
+SUMMARY_FIELDS = ["id", "topic", "status", "mode", "theme", "business_name", "created_at", "updated_at"]
+
+def _encode_cursor(doc: dict) -> str:
+    # The keyset filter only matches values of the stored BSON type: generations are inserted with
+    # ISO-string created_at, but a BSON date must come back as a datetime, not its str()
+    created_at = doc["created_at"]
+    if isinstance(created_at, datetime):
+        raw = json.dumps([created_at.isoformat(), doc["id"], "date"])
+    else:
+        raw = json.dumps([created_at, doc["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, gen_id, *kind = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if kind == ["date"]:
+            created_at = datetime.fromisoformat(created_at)
+        elif not isinstance(created_at, str):
+            raise ValueError(created_at)
+        return created_at, gen_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _thumbnail(first_slide: Optional[dict]) -> Optional[str]:
+    url = (first_slide or {}).get("background_url")
+    # Mirrored images can be served pre-resized for list views
+    if url and "/api/images/" in url and "?" not in url:
+        return f"{url}?w=256"
+    return url
+
+@router.get("/", response_model=GenerationPage)
+async def list_generations(
+    response: Response,
+    limit: int = Query(100, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    mode: Optional[str] = None,
+    theme: Optional[str] = None,
+    business: Optional[str] = None,
+    view: str = Query("full", pattern="^(full|summary)$"),
+):
+    """
+    Newest-first keyset pagination on (created_at, id). The body is a
+    GenerationPage: full generations, or summaries without slide bodies with
+    view=summary. The next page's cursor is returned in the X-Next-Cursor
+    header, which is absent on the last page.
+    """
+    query = {}
+    for field, value in (("status", status), ("mode", mode), ("theme", theme), ("business_name", business)):
+        if value:
+            query[field] = value
+    if cursor:
+        created_at, gen_id = _decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": gen_id}},
+        ]
+    sort = [("created_at", -1), ("id", -1)]
+
+    if view == "summary":
+        pipeline = [
+            {"$match": query},
+            {"$sort": dict(sort)},
+            {"$limit": limit},
+            {"$project": {
+                "_id": 0,
+                **{f: 1 for f in SUMMARY_FIELDS},
+                "slide_total": {"$size": {"$ifNull": ["$slides", []]}},
+                "first_slide": {"$arrayElemAt": ["$slides", 0]},
+            }},
+        ]
+        docs = await db.generations.aggregate(pipeline).to_list(limit)
+        for doc in docs:
+            doc["thumbnail"] = _thumbnail(doc.pop("first_slide", None))
+        items = [GenerationSummary.model_validate(d) for d in docs]
+    else:
+        docs = await db.generations.find(query, {"_id": 0}).sort(sort).limit(limit).to_list(limit)
+        items = [Generation.model_validate(d) for d in docs]
+
+    if len(docs) == limit:
+        response.headers["X-Next-Cursor"] = _encode_cursor(docs[-1])
+    return items
+
+SSE_HEARTBEAT_SECONDS = 15
+
+def _sse(event: dict, name: str = "generation") -> str:
+    return f"id: {event['event_id']}\nevent: {name}\ndata: {json.dumps(event, default=str)}\n\n"
+
+# Declared before /{id} so "stream" isn't captured as a generation id
+@router.get("/stream")
+async def stream_generations(
+    request: Request,
+    id: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+):
+    """
+    Server-Sent Events feed of generation changes; replaces client polling.
+    Without `id` every generation is reported (dashboard), with `id` only that
+    one (editor). Events carry the changed top-level fields, so clients refetch
+    only what they show.
+    """
+    bus = get_event_bus()
+    sub = bus.subscribe(id)
+    resumed = bus.replay(sub, last_event_id) if last_event_id else True
+
+    async def events():
+        try:
+            # Tell the browser how soon to reconnect; a non-resumable reconnect must resync
+            yield "retry: 3000\n\n"
+            if not resumed:
+                yield "event: reset\ndata: {}\n\n"
+            while not sub.closed:
+                if sub.overflowed:
+                    sub.overflowed = False
+                    yield "event: reset\ndata: {}\n\n"
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Worker is shutting down; the browser reconnects (retry: above) to another one
+                    break
+                yield _sse(event)
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # nginx would otherwise buffer the stream
+    })
 
 @router.get("/{id}", response_model=Generation)
-async def get_generation(id: str):
+async def get_generation(id: str, response: Response):
     doc = await db.generations.find_one({"id": id}, {"_id": 0})
     if not doc: raise HTTPException(status_code=404)
+    response.headers["ETag"] = f'"{doc.get("version", 0)}"'
     return doc
 
+def _expected_version(if_match: Optional[str]) -> Optional[int]:
+    if if_match is None:
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a generation version")
+
+def _version_filter(version: Optional[int]) -> dict:
+    if version is None:
+        return {}
+    # Documents written before versioning have no field; treat them as version 0
+    return {"version": {"$in": [0, None]}} if version == 0 else {"version": version}
+
+async def _write_failed(id: str, slide_ids: List[str] = ()) -> HTTPException:
+    """Works out why a guarded update matched nothing: missing generation/slide or a stale version"""
+    doc = await db.generations.find_one({"id": id}, {"_id": 0, "version": 1, "slides.id": 1})
+    if not doc:
+        return HTTPException(status_code=404, detail="Generation not found")
+    known = {s.get("id") for s in doc.get("slides", [])}
+    missing = [sid for sid in slide_ids if sid not in known]
+    if missing:
+        return HTTPException(status_code=404, detail=f"Slide(s) not found: {', '.join(missing)}")
+    return HTTPException(status_code=409, detail={
+        "message": "Generation was modified by someone else; reload and retry",
+        "version": doc.get("version", 0),
+    })
+
+async def _guarded_update(id: str, slide_ids: List[str], expected: Optional[int], update: dict,
+                          response: Response, array_filters: Optional[list] = None) -> int:
+    """
+    Applies `update` (+ version bump) if the generation, slides and version
+    all match. Returns the new version. Slide fields must be addressed with
+    `slides.$[x]` + array_filters: the `$all` match below doesn't pin the
+    positional `$` to any particular slide.
+    """
+    query = {"id": id, **_version_filter(expected)}
+    if slide_ids:
+        query["slides.id"] = {"$all": list(slide_ids)}
+    update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+    update["$inc"] = {"version": 1}
+    doc = await db.generations.find_one_and_update(
+        query, update,
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
+        **({"array_filters": array_filters} if array_filters else {}),
+    )
+    if not doc:
+        raise await _write_failed(id, slide_ids)
+    response.headers["ETag"] = f'"{doc["version"]}"'
+    return doc["version"]
+
 @router.put("/{id}")
-async def update_generation(id: str, update_data: dict):
-    update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
-    await db.generations.update_one({"id": id}, {"$set": update_data})
-    return {"status": "updated"}
+async def update_generation(id: str, update_data: dict, response: Response,
+                            if_match: Optional[str] = Header(None, alias="If-Match")):
+    """Whole-document save. Prefer PATCH /{id}/slides for edits that don't add or remove slides."""
+    expected = _expected_version(if_match)
+    if expected is None:
+        expected = update_data.get('version')
+    if expected is None:
+        # A blind whole-document write would drop concurrent slide edits
+        raise HTTPException(status_code=428, detail="Send the generation version (If-Match or body `version`)")
+    for key in ("_id", "id", "version"):
+        update_data.pop(key, None)
+    version = await _guarded_update(id, [], expected, {"$set": update_data}, response)
+    get_event_bus().notify(id, fields=list(update_data), summary={**update_data, "version": version})
+    return {"status": "updated", "version": version}
+
+@router.patch("/{id}/slides/{slide_id}")
+async def patch_slide(id: str, slide_id: str, patch: SlidePatch, response: Response,
+                      if_match: Optional[str] = Header(None, alias="If-Match")):
+    """Updates only the given fields of one slide"""
+    changes = patch.changes()
+    if not changes:
+        raise HTTPException(status_code=400, detail="No fields to update")
+    update = {"$set": {f"slides.$[s0].{field}": value for field, value in changes.items()}}
+    version = await _guarded_update(id, [slide_id], _expected_version(if_match), update, response,
+                                    [{"s0.id": slide_id}])
+    get_event_bus().notify(id, fields=["slides"], summary={"version": version})
+    return {"status": "updated", "version": version}
+
+@router.patch("/{id}/slides")
+async def patch_slides(id: str, body: BulkSlidePatch, response: Response,
+                       if_match: Optional[str] = Header(None, alias="If-Match")):
+    """Updates fields of several slides in one write, one arrayFilter per slide"""
+    merged = {}
+    for item in body.slides:
+        merged.setdefault(item.id, {}).update(item.changes())
+    merged = {slide_id: changes for slide_id, changes in merged.items() if changes}
+    if not merged:
+        raise HTTPException(status_code=400, detail="No fields to update")
+
+    updates, array_filters = {}, []
+    for i, (slide_id, changes) in enumerate(merged.items()):
+        array_filters.append({f"s{i}.id": slide_id})
+        for field, value in changes.items():
+            updates[f"slides.$[s{i}].{field}"] = value
+
+    expected = _expected_version(if_match)
+    if expected is None:
+        expected = body.version
+    version = await _guarded_update(id, list(merged), expected, {"$set": updates}, response, array_filters)
+    get_event_bus().notify(id, fields=["slides"], summary={"version": version})
+    return {"status": "updated", "version": version, "slides": len(merged)}
 
 @router.post("/{id}/generate-image/{slide_id}")
-async def generate_slide_image(id: str, slide_id: str):
+async def generate_slide_image(id: str, slide_id: str, service: OpenAIService = Depends(get_openai_service)):
     doc = await db.generations.find_one({"id": id})
     if not doc: raise HTTPException(status_code=404)
     slide = next((s for s in doc['slides'] if s['id'] == slide_id), None)
+    current_tenant.set(doc.get('business_name') or "default")
     
-    service = OpenAIService()
-    url = await service.generate_image(slide['background_prompt'])
+    source_url = await service.generate_image(slide['background_prompt'])
+    url = await ImageMirror().mirror(source_url)
     
-    await db.generations.update_one(
+    updated = await db.generations.find_one_and_update(
         {"id": id, "slides.id": slide_id}, 
         {"$set": {
-            "slides.$.background_url": url,
-            "slides.$.text_position": "middle_center", 
-            "slides.$.container_opacity": 0.6
-        }}
+            "slides.$[s].background_url": url,
+            "slides.$[s].background_source_url": source_url,
+            "slides.$[s].text_position": "middle_center", 
+            "slides.$[s].container_opacity": 0.6,
+            "updated_at": datetime.now(timezone.utc),
+        }, "$inc": {"version": 1}},
+        projection={"version": 1},
+        return_document=ReturnDocument.AFTER,
+        array_filters=[{"s.id": slide_id}],
+    )
+    version = (updated or {}).get("version")
+    get_event_bus().notify(id, fields=["slides"], summary={"version": version})
+    return {"url": url, "version": version}
+
+async def process_generate_images(generation_id: str, overwrite: bool = False):
+    """
+    Job handler: DALL-E backgrounds for every slide still missing one (all
+    slides with overwrite=True). Identical prompts are generated once, at most
+    IMAGE_BATCH_CONCURRENCY at a time, and everything lands in one write.
+    Per-slide state is reported as job progress.
+    """
+    doc = await db.generations.find_one(
+        {"id": generation_id},
+        {"_id": 0, "business_name": 1, "slides.id": 1, "slides.background_prompt": 1, "slides.background_url": 1},
     )
-    return {"url": url}
+    if not doc:
+        raise ValueError(f"Generation {generation_id} not found")
+    current_tenant.set(doc.get('business_name') or "default")
+
+    by_prompt = {}
+    for slide in doc.get('slides', []):
+        prompt = (slide.get('background_prompt') or "").strip()
+        if prompt and (overwrite or not slide.get('background_url')):
+            by_prompt.setdefault(prompt, []).append(slide['id'])
+
+    slide_state = {sid: "pending" for ids in by_prompt.values() for sid in ids}
+    progress = {"total": len(slide_state), "unique_prompts": len(by_prompt), "done": 0, "failed": 0, "slides": slide_state}
+    await report_progress(progress)
+    if not by_prompt:
+        return {"generated": 0, "slides": 0}
+
+    service = get_openai_service()
+    mirror = ImageMirror()
+    sem = asyncio.Semaphore(get_settings().image_batch_concurrency)
+    results = {}
+
+    async def generate(prompt: str, slide_ids: List[str]):
+        async with sem:
+            try:
+                source_url = await service.generate_image(prompt)
+                results[prompt] = (await mirror.mirror(source_url), source_url)
+                state = "done"
+            except Exception as e:
+                logger.warning(f"Background generation failed for {generation_id}: {e}")
+                state = "failed"
+        for sid in slide_ids:
+            slide_state[sid] = state
+        progress[state] += len(slide_ids)
+        await report_progress(progress)
 
-async def process_viral_visuals(generation_id: str):
-    kie_service = KieService()
-    openai_service = OpenAIService()
+    await asyncio.gather(*(generate(prompt, ids) for prompt, ids in by_prompt.items()))
+
+    if results:
+        update, array_filters = {}, []
+        for i, (prompt, (url, source_url)) in enumerate(results.items()):
+            slide_filter = {f"p{i}.id": {"$in": by_prompt[prompt]}}
+            if not overwrite:
+                # Leave slides that got a background some other way meanwhile
+                slide_filter[f"p{i}.background_url"] = None
+            array_filters.append(slide_filter)
+            update.update({
+                f"slides.$[p{i}].background_url": url,
+                f"slides.$[p{i}].background_source_url": source_url,
+                f"slides.$[p{i}].text_position": "middle_center",
+                f"slides.$[p{i}].container_opacity": 0.6,
+            })
+        await _set_slide_fields(generation_id, update, array_filters)
+
+    if not results:
+        raise RuntimeError(f"All {len(by_prompt)} background generations failed")
+    return {"generated": len(results), "slides": progress["done"], "failed": progress["failed"]}
+
+@router.post("/{id}/generate-images")
+async def trigger_generate_images(id: str, overwrite: bool = False):
+    """Fills in every slide background in one background job; poll GET /api/jobs/{job_id} for progress"""
+    if not await db.generations.find_one({"id": id}, {"_id": 1}):
+        raise HTTPException(status_code=404)
+    job_id = await get_job_queue().enqueue("generate_images", {"generation_id": id, "overwrite": overwrite})
+    return {"status": "accepted", "job_id": job_id}
+
+async def _set_slide_fields(generation_id: str, update: dict, array_filters: list):
+    """One positional write of slide fields, visible to the editor straight away"""
+    update["updated_at"] = datetime.now(timezone.utc)
+    await db.generations.update_one(
+        {"id": generation_id},
+        {"$set": update, "$inc": {"version": 1}},
+        array_filters=array_filters,
+    )
+    get_event_bus().notify(generation_id, fields=["slides", "updated_at"])
+
+def _body_design(design_rec: dict) -> dict:
+    return {
+        'headline_color': design_rec.get('headline_color'),
+        'font_color': design_rec.get('font_color'),
+        'font': design_rec.get('font', 'modern'),
+        'text_position': design_rec.get('text_position', 'middle_center'),
+        'text_align': design_rec.get('text_align', 'center'),
+        'container_opacity': design_rec.get('containerOpacity', 0.6),
+        'text_shadow': design_rec.get('textShadow', True),
+        'text_width': design_rec.get('text_width', 'medium'),
+    }
+
+async def process_viral_visuals(generation_id: str, use_cache: bool = True):
+    """
+    Viral image pipeline as a DAG; each stage starts once its inputs exist
+    and persists its own output, so the editor fills in progressively:
+
+        hero --> hero_mirror (hero slide background)
+          |----> clean (text removal) --> clean_mirror (body backgrounds)
+          |----> design (vision on the hero, overlaps text removal)
+        alternates (optional speculative hero variants, VIRAL_ALTERNATES)
+
+    Per-stage status and timings are recorded under `pipeline` on the generation.
+    The hero Kie task id lives on the generation (`hero_task_id`, possibly
+    started early by the text phase) so retries wait on the same task.
+    """
+    kie_service = get_kie_service()
+    openai_service = get_openai_service()
+    mirror = ImageMirror()
     
     try:
-        doc = await db.generations.find_one({"id": generation_id})
+        doc = await db.generations.find_one(
+            {"id": generation_id},
+            {"_id": 0, "business_name": 1, "slides.id": 1, "slides.background_prompt": 1},
+        )
         if not doc: return
+        current_tenant.set(doc.get('business_name') or "default")
         slides = doc.get('slides', [])
         if not slides: return
 
         hero_slide = slides[0]
-        
-        logger.info(f"Generating Viral Hero for {generation_id}")
-        hero_url = await kie_service.generate_hero_image(hero_slide['background_prompt'])
-        
-        clean_url = None
-        design_rec = {}
-        
-        if hero_url:
+        hero_filter = {"hero.id": hero_slide['id']}
+        body_filter = {"body.id": {"$in": [s['id'] for s in slides[1:]]}}
+
+        async def hero(_):
+            logger.info(f"Generating Viral Hero for {generation_id}")
+            try:
+                url = await wait_for_hero(generation_id, hero_slide['background_prompt'])
+            except CircuitOpen as e:
+                if not get_settings().kie_hero_fallback:
+                    raise
+                logger.warning(f"{e}; generating the hero for {generation_id} with DALL-E instead")
+                url = await openai_service.generate_image(hero_slide['background_prompt'])
+            if not url:
+                raise ValueError("Kie returned no hero image")
+            return url
+
+        async def hero_mirror(deps):
+            # Mirror provider URLs (they expire) into our blob store
+            url = await mirror.mirror(deps['hero'])
+            await _set_slide_fields(generation_id, {
+                "slides.$[hero].background_url": url,
+                "slides.$[hero].background_source_url": deps['hero'],
+            }, [hero_filter])
+            return url
+
+        async def clean(deps):
             logger.info(f"Generating Clean BG for {generation_id}")
-            clean_url = await kie_service.remove_text(hero_url)
-            if not clean_url:
-                clean_url = hero_url 
+            try:
+                return await kie_service.remove_text(deps['hero']) or deps['hero']
+            except CircuitOpen as e:
+                # Body slides get the hero as-is rather than failing the whole run
+                logger.warning(f"{e}; using the hero unedited as the body background for {generation_id}")
+                return deps['hero']
+
+        async def clean_mirror(deps):
+            url = await mirror.mirror(deps['clean'])
+            await _set_slide_fields(generation_id, {
+                "slides.$[body].background_url": url,
+                "slides.$[body].background_source_url": deps['clean'],
+            }, [body_filter])
+            return url
 
+        async def design(deps):
             logger.info(f"Analyzing Background for Design Recommendations...")
-            design_rec = await openai_service.analyze_design_from_image(clean_url)
+            design_rec = await openai_service.analyze_design_from_image(deps['hero'], use_cache=use_cache)
             logger.info(f"Design Recs: {design_rec}")
+            if design_rec:
+                await _set_slide_fields(generation_id, {
+                    f"slides.$[body].{field}": value for field, value in _body_design(design_rec).items()
+                }, [body_filter])
+            return design_rec
 
-        if hero_url:
-            # Update Hero
-            slides[0]['background_url'] = hero_url
-            
-            # Update Body Slides
-            for i in range(1, len(slides)):
-                slides[i]['background_url'] = clean_url
-                if clean_url and design_rec:
-                    slides[i]['headline_color'] = design_rec.get('headline_color') # UPDATED
-                    slides[i]['font_color'] = design_rec.get('font_color') # UPDATED
-                    slides[i]['font'] = design_rec.get('font', 'modern')
-                    slides[i]['text_position'] = design_rec.get('text_position', 'middle_center')
-                    slides[i]['text_align'] = design_rec.get('text_align', 'center')
-                    slides[i]['container_opacity'] = design_rec.get('containerOpacity', 0.6)
-                    slides[i]['text_shadow'] = design_rec.get('textShadow', True)
-                    slides[i]['text_width'] = design_rec.get('text_width', 'medium')
-
-            await db.generations.update_one(
-                {"id": generation_id},
-                {"$set": {"slides": slides, "updated_at": datetime.now(timezone.utc)}}
-            )
+        async def alternates(_):
+            count = get_settings().viral_alternates
+            urls = await asyncio.gather(*(kie_service.generate_hero_image(hero_slide['background_prompt']) for _ in range(count)))
+            mirrored = await asyncio.gather(*(mirror.mirror(url) for url in urls if url))
+            await _set_slide_fields(generation_id, {"slides.$[hero].alternate_background_urls": list(mirrored)}, [hero_filter])
+            return mirrored
+
+        stages = [
+            Stage("hero", hero),
+            Stage("hero_mirror", hero_mirror, after=["hero"]),
+            Stage("clean", clean, after=["hero"]),
+            Stage("clean_mirror", clean_mirror, after=["clean"]),
+            Stage("design", design, after=["hero"], required=False),
+        ]
+        if get_settings().viral_alternates > 0:
+            stages.append(Stage("alternates", alternates, required=False))
+
+        await _run_recorded(generation_id, "viral_visuals", stages)
+        # Done with it: a later regenerate starts a fresh hero
+        await clear_hero_task(generation_id)
 
     except Exception as e:
         logger.error(f"Viral Visuals Failed: {e}")
+        raise  # let the job queue retry / dead-letter
+
+async def _run_recorded(generation_id: str, name: str, stages: List[Stage]):
+    """Runs a pipeline, recording each stage's status and timing on the generation as it finishes"""
+    started_at = datetime.now(timezone.utc)
+    start = time.monotonic()
+    await db.generations.update_one({"id": generation_id}, {"$set": {"pipeline": {
+        "name": name, "status": "running", "started_at": started_at, "stages": {},
+    }}})
+    get_event_bus().notify(generation_id, fields=["pipeline"])
+
+    async def record(stage: str, timing: dict):
+        await db.generations.update_one({"id": generation_id}, {"$set": {f"pipeline.stages.{stage}": timing}})
+        get_event_bus().notify(generation_id, fields=["pipeline"])
+
+    status = "failed"
+    try:
+        await run_pipeline(stages, on_stage=record, name=name, attributes={"generation_id": generation_id})
+        status = "succeeded"
+    finally:
+        duration_ms = round((time.monotonic() - start) * 1000)
+        await db.generations.update_one({"id": generation_id}, {"$set": {
+            "pipeline.status": status,
+            "pipeline.finished_at": datetime.now(timezone.utc),
+            "pipeline.duration_ms": duration_ms,
+        }})
+        get_event_bus().notify(generation_id, fields=["pipeline"])
+        logger.info(f"Pipeline {name} for {generation_id} {status} in {duration_ms}ms")
 
 @router.post("/{id}/generate-viral-visuals")
-async def trigger_viral_visuals(id: str, background_tasks: BackgroundTasks):
-    background_tasks.add_task(process_viral_visuals, id)
-    return {"status": "accepted"}
+async def trigger_viral_visuals(id: str, use_cache: bool = True):
+    job_id = await get_job_queue().enqueue("viral_visuals", {"generation_id": id, "use_cache": use_cache})
+    return {"status": "accepted", "job_id": job_id}
+
+async def process_export(generation_id: str, format: str = "zip"):
+    """Job handler: renders a generation into the export cache (headless batch export)."""
+    doc = await db.generations.find_one({"id": generation_id}, {"_id": 0, "slides": 1})
+    if not doc or not doc.get('slides'):
+        raise ValueError(f"Generation {generation_id} has no slides to export")
+    path = await get_slide_exporter().export(doc['slides'], format)
+    return {"format": format, "bytes": path.stat().st_size}
+
+@router.get("/{id}/export")
+async def export_generation(id: str, request: Request, format: str = "zip", slide: Optional[int] = None):
+    """
+    Server-side render of the carousel. format: png | jpeg | zip | pdf.
+    png/jpeg with several slides come back as a zip unless ?slide=<index> is given.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    doc = await db.generations.find_one({"id": id}, {"_id": 0, "slides": 1, "topic": 1})
+    if not doc: raise HTTPException(status_code=404)
+    slides = doc.get('slides', [])
+    if slide is not None:
+        if not 0 <= slide < len(slides): raise HTTPException(status_code=404, detail="Slide not found")
+        slides = [slides[slide]]
+    if not slides: raise HTTPException(status_code=400, detail="Generation has no slides")
+
+    try:
+        path = await get_slide_exporter().export(slides, format)
+    except BackgroundUnavailable as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    single_image = format in ("png", "jpeg") and len(slides) == 1
+    media_type = EXPORT_FORMATS[format] if single_image or format in ("zip", "pdf") else EXPORT_FORMATS["zip"]
+    ext = {"image/png": "png", "image/jpeg": "jpg", "application/zip": "zip", "application/pdf": "pdf"}[media_type]
+    return file_response(
+        request, path, media_type, path.stat().st_size, f'"{path.name}"',
+        headers={"Content-Disposition": f'attachment; filename="carousel-{id}.{ext}"'}
+    )
+
+@router.post("/{id}/export")
+async def trigger_export(id: str, format: str = "zip"):
+    """Queues a render so a later GET /{id}/export is served from cache."""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    doc = await db.generations.find_one({"id": id}, {"_id": 1})
+    if not doc: raise HTTPException(status_code=404)
+    job_id = await get_job_queue().enqueue("export_generation", {"generation_id": id, "format": format})
+    return {"status": "accepted", "job_id": job_id}
@@ -0,0 +1,93 @@
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
+from services.blob_store import get_blob_store
+from services.file_response import file_response
+from services.image_mirror import load_manifest, original_key
+from services.image_variants import FORMATS, format_supported
+from services.variant_cache import get_variant_cache, snap_width
+from typing import Optional
+import re
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+
+IMAGE_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Cache-Control": "public, max-age=31536000, immutable"
+}
+
+def _negotiate_format(request: Request) -> str:
+    accept = request.headers.get("accept", "")
+    if "image/avif" in accept and format_supported("avif"):
+        return "avif"
+    if "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+def _pick_variant(manifest: dict, w: Optional[int], fmt: Optional[str]):
+    """Smallest pre-computed variant at least `w` wide, or None."""
+    if not w:
+        return None
+    candidates = [
+        (int(width), v) for width, v in manifest.get("variants", {}).items()
+        if int(width) >= w and (fmt is None or v["format"] == fmt)
+    ]
+    return min(candidates, key=lambda c: c[0])[1] if candidates else None
+
+@router.get("/{digest}")
+async def get_image(digest: str, request: Request, w: Optional[int] = None, fmt: Optional[str] = None):
+    """
+    Mirrored generation images (see services/image_mirror.py).
+    ?w= resizes (never upscales), ?fmt= is one of webp/avif/jpeg/png; without
+    fmt the format is negotiated from the Accept header.
+    """
+    if not DIGEST_RE.match(digest):
+        raise HTTPException(status_code=404)
+    store = get_blob_store()
+    manifest = await load_manifest(digest, store)
+    if not manifest:
+        raise HTTPException(status_code=404)
+
+    headers = dict(IMAGE_HEADERS)
+    if not w and not fmt:
+        return await _serve_blob(request, store, original_key(digest), manifest["content_type"], manifest["size"],
+                                 f'"{digest[:16]}-original"', headers)
+
+    if fmt is None:
+        fmt = _negotiate_format(request)
+        headers["Vary"] = "Accept"
+    fmt = fmt.lower()
+    if not format_supported(fmt):
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    width = snap_width(w or manifest.get("width") or 0)
+
+    variant = _pick_variant(manifest, width, fmt)
+    if variant:
+        name = variant["key"].rsplit("/", 1)[-1]
+        return await _serve_blob(request, store, variant["key"], FORMATS[fmt][1], variant["size"],
+                                 f'"{digest[:16]}-{name}"', headers)
+
+    try:
+        path = await get_variant_cache().get(digest, width, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404)
+    except Exception as e:
+        logger.error(f"Variant encode failed for {digest} w={width} fmt={fmt}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to encode image")
+    return file_response(request, path, FORMATS[fmt][1], path.stat().st_size, f'"{digest[:16]}-w{width}.{fmt}"', headers=headers)
+
+async def _serve_blob(request: Request, store, key: str, media_type: str, size: int, etag: str, headers: dict):
+    path = store.local_path(key)
+    if path:
+        return file_response(request, path, media_type, size, etag, headers=headers)
+    public = store.public_url(key)
+    if public:
+        return RedirectResponse(public, status_code=302, headers=headers)
+    data = await store.get(key)
+    if data is None:
+        raise HTTPException(status_code=404)
+    return Response(content=data, media_type=media_type, headers={**headers, "ETag": etag})
@@ -0,0 +1,13 @@
+
+from fastapi import APIRouter, HTTPException
+from services.job_queue import get_job_queue
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    job = await get_job_queue().get(job_id)
+    if not job: raise HTTPException(status_code=404)
+    return job
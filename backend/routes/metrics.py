@@ -0,0 +1,118 @@
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from services.kie_poller import get_kie_poller
+from services.job_queue import get_job_queue
+from services.rate_limiter import limiter_stats
+from services.image_cache import get_image_cache
+from services.variant_cache import get_variant_cache
+from services.slide_exporter import get_slide_exporter
+from services.events import get_event_bus
+from services.llm_cache import get_llm_cache
+from services.loop_monitor import get_loop_monitor
+from services.telemetry import get_metrics
+from services.resilience import STATE_VALUES, breaker_stats
+from services.leader import lease_stats
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+CACHE_RESULTS = ("hits", "misses", "coalesced", "revalidated", "bypassed")
+
+
+def collect_kie_poller():
+    stats = get_kie_poller().stats()
+    events = ("polls", "poll_errors", "poll_skipped", "completed", "failed", "timeouts", "callbacks")
+    return [
+        ("kie_poller_queue_depth", "gauge", "Kie tasks being waited on", [({}, stats["queue_depth"])]),
+        ("kie_poller_events_total", "counter", "Kie poller polls and task outcomes",
+         [({"event": e}, stats[e]) for e in events]),
+    ]
+
+
+async def collect_job_queue():
+    depth = await get_job_queue().depth()
+    return [("job_queue_depth", "gauge", "Jobs by status", [({"status": s}, n) for s, n in depth.items()])]
+
+
+def collect_rate_limiters():
+    limiters = limiter_stats()
+    families = []
+    for field, kind, documentation in (
+        ("in_flight", "gauge", "Provider calls in flight"),
+        ("waiting", "gauge", "Provider calls waiting on the limiter"),
+        ("calls", "counter", "Provider calls admitted"),
+        ("rate_limited", "counter", "429 responses that paused the limiter"),
+        ("wait_seconds_total", "counter", "Time spent waiting on the limiter"),
+    ):
+        name = f"provider_limiter_{field}" + ("_total" if kind == "counter" and not field.endswith("_total") else "")
+        families.append((name, kind, documentation, [({"limiter": key}, s[field]) for key, s in limiters.items()]))
+    return families
+
+
+def _cache_families(caches: dict) -> list:
+    return [
+        ("cache_requests_total", "counter", "Cache lookups by result (proxy = /api/proxy/image)",
+         [({"cache": c, "result": r}, s[r]) for c, s in caches.items() for r in CACHE_RESULTS if r in s]),
+        ("cache_entries", "gauge", "Cached entries", [({"cache": c}, s.get("entries")) for c, s in caches.items()]),
+        ("cache_bytes", "gauge", "Bytes on disk", [({"cache": c}, s.get("bytes")) for c, s in caches.items()]),
+        ("cache_evictions_total", "counter", "Entries evicted",
+         [({"cache": c}, s.get("evictions")) for c, s in caches.items()]),
+    ]
+
+
+def collect_caches():
+    return _cache_families({
+        "proxy": get_image_cache().stats(),
+        "variant": get_variant_cache().stats(),
+        "export": get_slide_exporter().stats(),
+    })
+
+
+async def collect_llm_cache():
+    # Separate from the disk caches: its entry count is a Mongo query
+    return _cache_families({"llm": await get_llm_cache().stats()})
+
+
+def collect_breakers():
+    breakers = breaker_stats()
+    return [
+        ("circuit_breaker_state", "gauge", "Circuit breaker state (0 closed, 1 half-open, 2 open)",
+         [({"breaker": key}, STATE_VALUES[s["state"]]) for key, s in breakers.items()]),
+        ("circuit_breaker_calls_total", "counter", "Calls through each breaker by result",
+         [({"breaker": key, "result": r}, s[r]) for key, s in breakers.items() for r in ("successes", "failures", "rejected")]),
+    ]
+
+
+def collect_leases():
+    return [("leader_lease_held", "gauge", "Whether this worker holds the lease (runs the singleton loop)",
+             [({"lease": name}, int(s["leader"])) for name, s in lease_stats().items()])]
+
+
+def collect_event_bus():
+    stats = get_event_bus().stats()
+    return [
+        ("event_bus_subscribers", "gauge", "Open /api/generations/stream connections", [({}, stats["subscribers"])]),
+        ("event_bus_published_total", "counter", "Generation change events published", [({}, stats["published"])]),
+    ]
+
+
+def collect_event_loop():
+    stats = get_loop_monitor().stats()
+    return [
+        ("event_loop_lag_seconds", "gauge", "Event-loop lag over the recent sample window",
+         [({"quantile": q}, stats[f"p{q[2:]}_ms"] / 1000) for q in ("0.50", "0.95", "0.99")]),
+        ("event_loop_lag_max_seconds", "gauge", "Worst event-loop lag since start/reset", [({}, stats["max_ms"] / 1000)]),
+    ]
+
+
+for _collector in (collect_kie_poller, collect_job_queue, collect_rate_limiters, collect_breakers, collect_caches, collect_llm_cache,
+                   collect_leases, collect_event_bus, collect_event_loop):
+    get_metrics().add_collector(_collector)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(await get_metrics().render(), media_type="text/plain; version=0.0.4; charset=utf-8")
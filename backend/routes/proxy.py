@@ -1,33 +1,79 @@
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from services.image_cache import get_image_cache, check_content_type, ImageTooLarge, UnsupportedContentType
+from services.file_response import file_response
+from services.http_client import get_http_client
+from config import get_settings
 import httpx
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+PROXY_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Cache-Control": "public, max-age=3600"
+}
+
+async def _stream_upstream(url: str) -> StreamingResponse:
+    """Pipes upstream chunks to the client without buffering the body."""
+    settings = get_settings()
+    client = get_http_client()
+    request = client.build_request("GET", url, timeout=settings.proxy_upstream_timeout)
+    resp = await client.send(request, stream=True)
+    try:
+        resp.raise_for_status()
+        media_type = check_content_type(resp.headers.get("content-type"))
+        declared = int(resp.headers.get("content-length") or 0)
+        if declared > settings.proxy_max_image_bytes:
+            raise ImageTooLarge(f"{declared} bytes exceeds {settings.proxy_max_image_bytes}")
+    except Exception:
+        await resp.aclose()
+        raise
+
+    async def body():
+        sent = 0
+        async for chunk in resp.aiter_bytes(64 * 1024):
+            sent += len(chunk)
+            if sent > settings.proxy_max_image_bytes:
+                # Headers are already out; aborting the body is the only option left
+                logger.warning(f"Proxy aborted {url}: body exceeds {settings.proxy_max_image_bytes} bytes")
+                break
+            yield chunk
+
+    headers = dict(PROXY_HEADERS)
+    # aiter_bytes() decodes gzip/br, so an encoded upstream's length doesn't describe what we send
+    if declared and resp.headers.get("content-encoding", "identity").lower() == "identity":
+        headers["Content-Length"] = str(declared)
+    return StreamingResponse(body(), media_type=media_type, headers=headers, background=BackgroundTask(resp.aclose))
+
 @router.get("/image")
-async def proxy_image(url: str):
+async def proxy_image(url: str, request: Request, stream: bool = False):
     """
-    Proxy external images to avoid CORS issues in frontend (html-to-image)
+    Proxy external images to avoid CORS issues in frontend (html-to-image).
+    Served from the local disk cache by default; PROXY_MODE=stream (or ?stream=true)
+    pipes the upstream body straight through instead.
     """
     if not url:
         raise HTTPException(status_code=400, detail="URL required")
         
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, follow_redirects=True, timeout=10.0)
-            resp.raise_for_status()
-            
-            return Response(
-                content=resp.content, 
-                media_type=resp.headers.get("content-type", "image/png"),
-                headers={
-                    "Access-Control-Allow-Origin": "*",
-                    "Cache-Control": "public, max-age=3600"
-                }
-            )
+        if stream or get_settings().proxy_mode == "stream":
+            return await _stream_upstream(url)
+        cached = await get_image_cache().get(url)
+    except ImageTooLarge as e:
+        logger.warning(f"Proxy rejected {url}: {e}")
+        raise HTTPException(status_code=413, detail="Image too large")
+    except UnsupportedContentType as e:
+        logger.warning(f"Proxy rejected {url}: {e}")
+        raise HTTPException(status_code=415, detail="Unsupported content type")
+    except httpx.TimeoutException:
+        logger.error(f"Proxy timeout for {url}")
+        raise HTTPException(status_code=504, detail="Upstream timeout")
     except Exception as e:
         logger.error(f"Proxy error for {url}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch image")
+
+    return file_response(request, cached.path, cached.content_type, cached.size, cached.etag, headers=PROXY_HEADERS)
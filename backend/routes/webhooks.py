@@ -1,10 +1,23 @@
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
-from models import WebhookPayload, Generation, Slide, THEME_COLORS
-from services.openai_service import OpenAIService
-from services.kie_service import KieService
+from fastapi import APIRouter, HTTPException, Depends
+from models import WebhookPayload, BatchTriggerPayload, Generation, Slide, THEME_COLORS
+from services.openai_service import OpenAIService, get_openai_service
+from services.kie_service import KieTaskFailed, is_kie_result_url, parse_task_record
+from services.kie_poller import get_kie_poller
 from database import db
-from datetime import datetime, timezone
+from services.job_queue import add_dead_letter_hook, get_job_queue
+from services.rate_limiter import current_tenant
+from services.events import get_event_bus
+from services.resilience import CircuitOpen
+from services.hero_image import ensure_hero_task
+from config import get_settings
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+import hashlib
+import hmac
+import time
 import uuid
 import logging
 
@@ -16,64 +29,123 @@ async def process_generation(generation_id: str, topic: str, count: int, context
     # ... (unchanged) ...
     pass # Placeholder for brevity, assume unchanged
 
-async def process_ai_viral_generation(generation_id: str, topic: str, count: int, theme: str, business_name: str = None, business_type: str = None):
+def _hero_slide(hero_data: dict, theme: str) -> dict:
+    theme_data = THEME_COLORS.get(theme, THEME_COLORS['trust_clarity'])
+    bg_color = theme_data['c1'] 
+    
+    # Specific Hero Prompt
+    hero_prompt = (
+        f"{bg_color} background\n\n"
+        f"You are an expert-level alex hormozi style designer.\n\n"
+        f"Based on principles of marketing, automatically choose the most perfect composition. "
+        f"The overall mood should feel immersive, captivating, interesting\n\n"
+        f"Choose the most stylish stylized font for this\n\n"
+        f"centered text: topheadline: \"{hero_data.get('topheadline')}\", \n\n"
+        f"bottomheadline: \"{hero_data.get('bottomheadline')}\", \n\n"
+    )
+    return Slide(
+        title="", 
+        content="",
+        background_prompt=hero_prompt,
+        type="hero",
+        theme=theme,
+        text_bg_enabled=False
+    ).model_dump()
+
+def _body_slide(s: dict, theme: str) -> dict:
+    return Slide(
+        title=s.get('title', ''),
+        content=s.get('content', ''),
+        type=s.get('type', 'body'), # LLM now decides if it's CTA or Body
+        background_prompt="Clean background derived from hero",
+        theme=theme
+    ).model_dump()
+
+async def _write_text_progress(generation_id: str, update: dict, fields: List[str], summary: Optional[dict] = None):
+    update.setdefault("$set", {})["updated_at"] = datetime.now(timezone.utc)
+    update["$inc"] = {"version": 1}
+    await db.generations.update_one({"id": generation_id}, update)
+    get_event_bus().notify(generation_id, fields=fields + ["updated_at"], summary=summary)
+
+async def _stream_viral_text(openai_service: OpenAIService, generation_id: str, topic: str, count: int, theme: str,
+                             business_name: str, business_type: str, use_cache: bool):
+    """
+    Streams the viral structure and persists each slide as soon as it is
+    complete: the hero first (replacing any slides from an earlier attempt),
+    then $push per body slide. With VIRAL_AUTO_VISUALS the hero image is
+    started early; its task id is stored on the generation for the visuals job.
+    """
+    start = time.monotonic()
+    hero_written = False
+    pending = []  # body slides that arrived before the hero
+
+    async for part, data in openai_service.stream_viral_structure(topic, count, business_name, business_type, use_cache=use_cache):
+        if part == "hero" and not hero_written:
+            hero = _hero_slide(data, theme)
+            if get_settings().viral_auto_visuals:
+                try:
+                    # Reuses the task an earlier attempt of this job already started
+                    await ensure_hero_task(generation_id, hero['background_prompt'])
+                except CircuitOpen as e:
+                    # The visuals job generates the hero itself (falling back to DALL-E)
+                    logger.warning(f"Not starting the hero image early: {e}")
+            await _write_text_progress(generation_id, {"$set": {"slides": [hero, *pending]}}, ["slides"])
+            hero_written, pending = True, []
+            logger.info(f"First slide for {generation_id} after {time.monotonic() - start:.2f}s")
+        elif part == "slide":
+            slide = _body_slide(data, theme)
+            if hero_written:
+                await _write_text_progress(generation_id, {"$push": {"slides": slide}}, ["slides"])
+            else:
+                pending.append(slide)
+
+    if not hero_written:
+        await _write_text_progress(generation_id, {"$set": {"slides": [_hero_slide({}, theme), *pending]}}, ["slides"])
+    logger.info(f"Viral text for {generation_id} streamed in {time.monotonic() - start:.2f}s")
+
+async def process_ai_viral_generation(generation_id: str, topic: str, count: int, theme: str, business_name: str = None, business_type: str = None,
+                                      use_cache: bool = True):
     """New Nano Banana Pro Flow - Text Phase"""
-    openai_service = OpenAIService()
+    openai_service = get_openai_service()
+    current_tenant.set(business_name or "default")
+    settings = get_settings()
     
     try:
-        # 1. Generate Content
-        content = await openai_service.generate_viral_structure(topic, count, business_name, business_type)
-        hero_data = content.get('hero', {})
-        body_slides_data = content.get('slides', [])
-        
-        theme_data = THEME_COLORS.get(theme, THEME_COLORS['trust_clarity'])
-        bg_color = theme_data['c1'] 
-        
-        # 2. Construct Specific Hero Prompt
-        hero_prompt = (
-            f"{bg_color} background\n\n"
-            f"You are an expert-level alex hormozi style designer.\n\n"
-            f"Based on principles of marketing, automatically choose the most perfect composition. "
-            f"The overall mood should feel immersive, captivating, interesting\n\n"
-            f"Choose the most stylish stylized font for this\n\n"
-            f"centered text: topheadline: \"{hero_data.get('topheadline')}\", \n\n"
-            f"bottomheadline: \"{hero_data.get('bottomheadline')}\", \n\n"
-        )
-        
-        # 3. Assemble Slides
-        slides = []
-        
-        # Slide 1: Hero
-        slides.append(Slide(
-            title="", 
-            content="",
-            background_prompt=hero_prompt,
-            type="hero",
-            theme=theme,
-            text_bg_enabled=False
-        ).model_dump())
-        
-        # Slide 2..N: Body/CTA
-        for s in body_slides_data:
-            slides.append(Slide(
-                title=s.get('title', ''),
-                content=s.get('content', ''),
-                type=s.get('type', 'body'), # LLM now decides if it's CTA or Body
-                background_prompt="Clean background derived from hero",
-                theme=theme
-            ).model_dump())
-            
-        await db.generations.update_one(
-            {"id": generation_id},
-            {"$set": {"status": "draft", "slides": slides, "updated_at": datetime.now(timezone.utc)}}
-        )
+        if settings.llm_streaming:
+            await _stream_viral_text(
+                openai_service, generation_id, topic, count, theme, business_name, business_type, use_cache
+            )
+            await _write_text_progress(generation_id, {"$set": {"status": "draft"}}, ["status"], {"status": "draft"})
+        else:
+            content = await openai_service.generate_viral_structure(topic, count, business_name, business_type, use_cache=use_cache)
+            slides = [_hero_slide(content.get('hero', {}), theme)]
+            slides += [_body_slide(s, theme) for s in content.get('slides', [])]
+            await _write_text_progress(generation_id, {"$set": {"status": "draft", "slides": slides}}, ["status", "slides"],
+                                       {"status": "draft"})
+
+        if settings.viral_auto_visuals:
+            await get_job_queue().enqueue("viral_visuals", {
+                "generation_id": generation_id, "use_cache": use_cache,
+            })
 
     except Exception as e:
         logger.error(f"Viral Text Phase Failed: {e}")
-        await db.generations.update_one({"id": generation_id}, {"$set": {"status": "failed"}})
+        # "failed" is only written once the queue gives up (see _mark_generation_failed)
+        await _set_status(generation_id, "retrying")
+        raise  # let the job queue retry / dead-letter
 
-@router.post("/trigger")
-async def trigger_generation(payload: WebhookPayload, background_tasks: BackgroundTasks):
+async def _set_status(generation_id: str, status: str):
+    await db.generations.update_one({"id": generation_id}, {"$set": {"status": status}, "$inc": {"version": 1}})
+    get_event_bus().notify(generation_id, fields=["status"], summary={"status": status})
+
+async def _mark_generation_failed(job: dict):
+    await _set_status(job["payload"]["generation_id"], "failed")
+
+for _kind in ("standard_generation", "ai_viral_generation"):
+    add_dead_letter_hook(_kind, _mark_generation_failed)
+
+def _new_generation(payload: WebhookPayload) -> Tuple[dict, str, dict]:
+    """Builds a generation document and the (job kind, job payload) that processes it"""
     count = payload.slide_count if payload.slide_count > 0 else 5
     is_viral_mode = payload.extra_context == 'viral'
     
@@ -84,18 +156,186 @@ async def trigger_generation(payload: WebhookPayload, background_tasks: Backgrou
         mode='viral' if is_viral_mode else 'standard',
         theme=payload.theme,
         business_name=payload.business_name,
-        business_type=payload.business_type
+        business_type=payload.business_type,
+        rss_source=payload.rss_source,
     )
     doc = gen.model_dump()
     doc['created_at'] = doc['created_at'].isoformat()
     doc['updated_at'] = doc['updated_at'].isoformat()
     
-    await db.generations.insert_one(doc)
-    
     if is_viral_mode:
-        background_tasks.add_task(process_ai_viral_generation, gen.id, payload.topic, count, payload.theme, payload.business_name, payload.business_type)
-    else:
-        # Legacy flow
-        background_tasks.add_task(process_generation, gen.id, payload.topic, count, "", payload.theme)
+        return doc, "ai_viral_generation", {
+            "generation_id": gen.id,
+            "topic": payload.topic,
+            "count": count,
+            "theme": payload.theme,
+            "business_name": payload.business_name,
+            "business_type": payload.business_type,
+            "use_cache": payload.use_cache,
+        }
+    # Legacy flow
+    return doc, "standard_generation", {
+        "generation_id": gen.id,
+        "topic": payload.topic,
+        "count": count,
+        "context": "",
+        "theme": payload.theme,
+    }
+
+@router.post("/trigger")
+async def trigger_generation(payload: WebhookPayload):
+    doc, kind, job_payload = _new_generation(payload)
+    await db.generations.insert_one(doc)
+    get_event_bus().notify(doc['id'], op="insert", summary=doc)
     
-    return {"status": "accepted", "id": gen.id}
+    job_id = await get_job_queue().enqueue(kind, job_payload)
+    return {"status": "accepted", "id": doc['id'], "job_id": job_id}
+
+def idempotency_key(payload: WebhookPayload) -> str:
+    """Explicit key if given, else the same topic from the same feed for the same business"""
+    if payload.idempotency_key:
+        return payload.idempotency_key
+    parts = [" ".join(payload.topic.lower().split()), payload.rss_source or "", payload.business_name or ""]
+    return hashlib.sha256("\x1f".join(p.strip().lower() for p in parts).encode()).hexdigest()
+
+async def _reserve_keys(keys: Dict[str, str], window: int) -> Dict[str, str]:
+    """
+    Claims idempotency keys (key -> new generation id) in db.ingest_keys.
+    Returns the keys already held within the window, mapped to the generation
+    that holds them. Held-but-expired keys (the TTL monitor only runs once a
+    minute) are taken over.
+    """
+    if not keys:
+        return {}
+    now = datetime.now(timezone.utc)
+    expires_at = now + timedelta(seconds=window)
+    docs = [{"_id": key, "generation_id": gen_id, "expires_at": expires_at} for key, gen_id in keys.items()]
+    try:
+        await db.ingest_keys.insert_many(docs, ordered=False)
+        return {}
+    except BulkWriteError as e:
+        conflicts = [docs[err["index"]]["_id"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000]
+        if len(conflicts) != len(e.details.get("writeErrors", [])):
+            raise
+
+    held = {}
+    async for existing in db.ingest_keys.find({"_id": {"$in": conflicts}}):
+        held[existing["_id"]] = existing
+    result = {}
+    for key in conflicts:
+        existing = held.get(key)
+        expired = existing is not None and _as_utc(existing["expires_at"]) <= now
+        if existing is None or expired:
+            try:
+                taken = await db.ingest_keys.update_one(
+                    {"_id": key, "expires_at": {"$lte": now}},
+                    {"$set": {"generation_id": keys[key], "expires_at": expires_at}},
+                    upsert=existing is None,
+                )
+                if taken.modified_count or taken.upserted_id is not None:
+                    continue
+            except DuplicateKeyError:
+                pass  # another request claimed it first
+            existing = await db.ingest_keys.find_one({"_id": key}) or existing
+        result[key] = existing["generation_id"] if existing else None
+    return result
+
+def _as_utc(value: datetime) -> datetime:
+    # Mongo hands back naive UTC datetimes unless the client is tz_aware
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+@router.post("/trigger/batch")
+async def trigger_generation_batch(body: BatchTriggerPayload):
+    """
+    Feed fan-in: validates every item, inserts the new generations with one
+    insert_many and enqueues their jobs with one more. Items whose idempotency
+    key was seen within INGEST_DEDUPE_WINDOW (or earlier in the same batch)
+    are reported as duplicates with the existing generation id.
+    """
+    settings = get_settings()
+    if len(body.items) > settings.ingest_max_batch:
+        raise HTTPException(status_code=413, detail=f"At most {settings.ingest_max_batch} items per batch")
+
+    results: List[dict] = [None] * len(body.items)
+    first_index: Dict[str, int] = {}
+    built: Dict[str, Tuple[dict, str, dict]] = {}
+    for i, raw in enumerate(body.items):
+        try:
+            payload = WebhookPayload.model_validate(raw)
+        except ValidationError as e:
+            errors = [{"loc": list(err["loc"]), "msg": err["msg"]} for err in e.errors()]
+            results[i] = {"index": i, "status": "invalid", "errors": errors}
+            continue
+        key = idempotency_key(payload)
+        if key in first_index:
+            results[i] = {"index": i, "status": "duplicate", "key": key}
+            continue
+        first_index[key] = i
+        built[key] = _new_generation(payload)
+
+    held = await _reserve_keys({key: doc['id'] for key, (doc, _, _) in built.items()}, settings.ingest_dedupe_window)
+    accepted = [key for key in built if key not in held]
+
+    job_ids = []
+    if accepted:
+        docs = [built[key][0] for key in accepted]
+        queue = get_job_queue()
+        try:
+            await db.generations.insert_many(docs)
+            job_ids = await queue.enqueue_many([(built[key][1], built[key][2]) for key in accepted])
+        except Exception:
+            # All or nothing: without its job a generation would stay pending forever.
+            # Roll back whatever got written and release the keys so the feed can retry.
+            gen_ids = [doc['id'] for doc in docs]
+            await queue.collection.delete_many({"payload.generation_id": {"$in": gen_ids}})
+            await db.generations.delete_many({"id": {"$in": gen_ids}})
+            await db.ingest_keys.delete_many({"_id": {"$in": accepted}})
+            raise
+        bus = get_event_bus()
+        for doc in docs:
+            bus.notify(doc['id'], op="insert", summary=doc)
+
+    for key, job_id in zip(accepted, job_ids):
+        results[first_index[key]] = {"index": first_index[key], "status": "accepted", "key": key,
+                                     "id": built[key][0]['id'], "job_id": job_id}
+    for key, gen_id in held.items():
+        results[first_index[key]] = {"index": first_index[key], "status": "duplicate", "key": key, "id": gen_id}
+    for result in results:
+        if result["status"] == "duplicate" and "id" not in result:
+            result["id"] = results[first_index[result["key"]]].get("id")
+
+    counts = {"accepted": 0, "duplicate": 0, "invalid": 0}
+    for result in results:
+        counts[result["status"]] += 1
+    logger.info(f"Batch trigger: {counts}")
+    return {**counts, "results": results}
+
+@router.post("/kie")
+async def kie_callback(payload: dict, token: str = ""):
+    """
+    Kie task completion callback (set KIE_CALLBACK_URL to this route with
+    ?token=<KIE_CALLBACK_TOKEN> appended). Without a token configured every
+    callback is rejected and tasks are resolved by polling.
+    """
+    expected = get_settings().kie_callback_token
+    if not expected:
+        raise HTTPException(status_code=403, detail="Kie callbacks are disabled (KIE_CALLBACK_TOKEN not set)")
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid callback token")
+
+    data = payload.get('data') or {}
+    task_id = data.get('taskId')
+    if not task_id:
+        raise HTTPException(status_code=400, detail="taskId required")
+    try:
+        _, url = parse_task_record(data)
+    except KieTaskFailed:
+        url = None
+    if not is_kie_result_url(url):
+        # The image mirror and proxy fetch this URL server-side
+        logger.warning(f"Kie callback for {task_id} rejected: result URL {url!r} is not on a Kie host")
+        raise HTTPException(status_code=400, detail="Result URL is not on a Kie host")
+
+    resolved = await get_kie_poller().callback(task_id, data)
+    logger.info(f"Kie callback for {task_id} (state={data.get('state')}, resolved={resolved})")
+    return {"status": "ok"}
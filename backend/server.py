@@ -4,7 +4,21 @@ from starlette.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 import logging
 from pathlib import Path
-from database import client
+from database import client, db
+from indexes import start_index_bootstrap, stop_index_bootstrap
+from services.http_client import start_http_client, close_http_client
+from services.kie_poller import start_kie_poller, stop_kie_poller
+from services.events import get_event_bus, start_event_bus, stop_event_bus
+from services.loop_monitor import start_loop_monitor, stop_loop_monitor
+from services.telemetry import TelemetryMiddleware, start_telemetry, stop_telemetry
+from services.openai_service import get_openai_service, close_openai_service
+from openai import OpenAIError
+from services.kie_service import get_kie_service
+from services.job_worker import JobWorker
+from services.process_pool import shutdown_process_pool
+from services.disk_lru import start_disk_rescans, stop_disk_rescans
+from services.lifecycle import on_drain
+from config import get_settings
 
 # Setup
 ROOT_DIR = Path(__file__).parent
@@ -24,7 +38,10 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Request latency by route and a server span per request
+app.add_middleware(TelemetryMiddleware)
 
 # Router
 api_router = APIRouter(prefix="/api")
@@ -34,13 +51,114 @@ async def health():
     return {"status": "ok"}
 
 # Include sub-routers
-from routes import webhooks, generations, proxy
+from routes import webhooks, generations, proxy, admin, jobs, images, metrics
 api_router.include_router(webhooks.router, prefix="/webhooks", tags=["webhooks"])
 api_router.include_router(generations.router, prefix="/generations", tags=["generations"])
 api_router.include_router(proxy.router, prefix="/proxy", tags=["proxy"])
+api_router.include_router(admin.router, prefix="/admin", tags=["admin"])
+api_router.include_router(jobs.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(images.router, prefix="/images", tags=["images"])
+api_router.include_router(metrics.router, tags=["metrics"])
 
 app.include_router(api_router)
 
+@app.on_event("startup")
+async def startup_loop_monitor():
+    await start_loop_monitor()
+
+@app.on_event("startup")
+async def startup_db_indexes():
+    start_index_bootstrap(db, get_settings().index_bootstrap_timeout)
+
+@app.on_event("startup")
+async def startup_http_client():
+    await start_http_client()
+
+@app.on_event("startup")
+async def startup_provider_services():
+    # One OpenAI client / connection pool and one KieService for the whole process
+    get_kie_service()
+    try:
+        get_openai_service()
+    except OpenAIError as e:
+        # Boot anyway (e.g. no OPENAI_API_KEY); LLM calls fail until it is configured
+        logger.warning(f"OpenAI client not started: {e}")
+
+@app.on_event("startup")
+async def startup_telemetry():
+    await start_telemetry()
+
+@app.on_event("startup")
+async def startup_kie_poller():
+    await start_kie_poller()
+
+@app.on_event("startup")
+async def startup_event_bus():
+    await start_event_bus()
+    on_drain(get_event_bus().close_subscribers)
+
+@app.on_event("startup")
+async def startup_disk_rescans():
+    # Other workers write to and evict from the same cache directories
+    settings = get_settings()
+    if settings.multi_worker:
+        await start_disk_rescans(settings.disk_cache_rescan_interval)
+
+# Embedded job worker: lets a single-process deployment run queued jobs.
+# Set EMBEDDED_WORKER=false when running dedicated `python worker.py` processes.
+embedded_worker = None
+
+@app.on_event("startup")
+async def startup_job_worker():
+    global embedded_worker
+    if get_settings().embedded_worker:
+        from worker import JOB_HANDLERS
+        embedded_worker = JobWorker(JOB_HANDLERS)
+        embedded_worker.start()
+        on_drain(embedded_worker.request_stop)
+
+@app.on_event("shutdown")
+async def shutdown_job_worker():
+    if embedded_worker:
+        await embedded_worker.stop()
+
+@app.on_event("shutdown")
+async def shutdown_event_bus():
+    await stop_event_bus()
+
+@app.on_event("shutdown")
+async def shutdown_kie_poller():
+    await stop_kie_poller()
+
+@app.on_event("shutdown")
+async def shutdown_disk_rescans():
+    await stop_disk_rescans()
+
+@app.on_event("shutdown")
+async def shutdown_provider_services():
+    await close_openai_service()
+
+@app.on_event("shutdown")
+async def shutdown_telemetry():
+    # Flushes queued spans to the OTLP endpoint, so before the HTTP client closes
+    await stop_telemetry()
+
+@app.on_event("shutdown")
+async def shutdown_http_client():
+    await close_http_client()
+
+@app.on_event("shutdown")
+async def shutdown_cpu_pool():
+    shutdown_process_pool()
+
+@app.on_event("shutdown")
+async def shutdown_loop_monitor():
+    await stop_loop_monitor()
+
+@app.on_event("shutdown")
+async def shutdown_db_indexes():
+    await stop_index_bootstrap()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -0,0 +1,123 @@
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class BlobStore:
+    """Minimal key/value blob storage used for mirrored generation images."""
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        raise NotImplementedError
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def local_path(self, key: str) -> Optional[Path]:
+        """Filesystem path when the blob can be served zero-copy, else None."""
+        return None
+
+    def public_url(self, key: str) -> Optional[str]:
+        """Direct URL when the store is publicly readable (e.g. a CDN in front of S3)."""
+        return None
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid blob key: {key}")
+        return path
+
+    def _write(self, path: Path, data: bytes):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(self._write, self._path(key), data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            return await asyncio.to_thread(path.read_bytes)
+        except FileNotFoundError:
+            return None
+
+    async def exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def local_path(self, key: str) -> Optional[Path]:
+        path = self._path(key)
+        return path if path.exists() else None
+
+
+class S3BlobStore(BlobStore):
+    """S3 or any S3-compatible store (MinIO, R2, ...). boto3 calls run in a thread."""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None, public_base_url: Optional[str] = None):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.public_base_url = (public_base_url or "").rstrip("/")
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    async def put(self, key: str, data: bytes, content_type: str):
+        await asyncio.to_thread(
+            self.client.put_object,
+            Bucket=self.bucket,
+            Key=self._key(key),
+            Body=data,
+            ContentType=content_type,
+            CacheControl="public, max-age=31536000, immutable",
+        )
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            obj = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self._key(key))
+        except self.client.exceptions.NoSuchKey:
+            return None
+        return await asyncio.to_thread(obj["Body"].read)
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self._key(key))
+            return True
+        except Exception:
+            return False
+
+    def public_url(self, key: str) -> Optional[str]:
+        if not self.public_base_url:
+            return None
+        return f"{self.public_base_url}/{self._key(key)}"
+
+
+_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    global _store
+    if _store is None:
+        settings = get_settings()
+        if settings.blob_store == "s3":
+            _store = S3BlobStore(settings.s3_bucket, settings.s3_prefix, settings.s3_endpoint_url, settings.s3_public_url)
+        else:
+            _store = LocalBlobStore(settings.blob_store_dir)
+    return _store
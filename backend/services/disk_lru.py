@@ -0,0 +1,184 @@
+
+import asyncio
+import logging
+import os
+import random
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".json"
+
+
+class DiskLRU:
+    """
+    Size-bounded LRU index over files stored as root/<key[:2]>/<key>. The
+    in-memory order is rebuilt from file mtimes on startup and mtimes are
+    bumped on access, so recency survives restarts. A `<key>.json` sidecar,
+    if present, is removed together with its entry.
+
+    Several processes may share one directory (multi-worker mode): a lookup
+    adopts files another process wrote and forgets ones it evicted, and
+    `reload()` re-syncs the whole index from disk now and then.
+
+    `lookup()`, `access()` and `record()` are the event-loop forms of `in`,
+    `touch()` and `add()`: the same index bookkeeping, with the stat, utime
+    and eviction unlinks run in a thread.
+    """
+
+    def __init__(self, root: Path, max_bytes: int, name: str = "cache"):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.name = name
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._index: "OrderedDict[str, int]" = OrderedDict()  # key -> size, oldest first
+        self.total = 0
+        self.evictions = 0
+        self._load()
+        _instances.add(self)
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def sidecar(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}{SIDECAR_SUFFIX}"
+
+    def scan(self) -> List[Tuple[str, int]]:
+        """(key, size) of every file on disk, oldest first. Blocking; run it in a thread."""
+        entries = []
+        for path in self.root.glob("*/*"):
+            if path.suffix in (SIDECAR_SUFFIX, ".tmp"):
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, path.name, st.st_size))
+        return [(key, size) for _, key, size in sorted(entries)]
+
+    def _load(self):
+        self.reload(self.scan())
+        if self._index:
+            logger.info(f"{self.name}: {len(self._index)} entries, {self.total / 1e6:.1f} MB on disk")
+
+    def reload(self, entries: List[Tuple[str, int]]):
+        """Replaces the index with a scan() result, then evicts down to max_bytes."""
+        self._remove(self._reindex(entries))
+
+    def _reindex(self, entries: List[Tuple[str, int]]) -> List[str]:
+        self._index = OrderedDict(entries)
+        self.total = sum(self._index.values())
+        return self._evict()
+
+    def _size_on_disk(self, key: str) -> Optional[int]:
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def _sync(self, key: str, size: Optional[int]) -> Tuple[bool, List[str]]:
+        """Index side of a lookup given the file's size on disk; returns (present, keys to evict)."""
+        if size is None:
+            if key in self._index:
+                # Evicted by another process sharing the directory
+                self.total -= self._index.pop(key)
+            return False, []
+        if key in self._index:
+            return True, []
+        # Written by another process
+        return True, self._record(key, size)
+
+    def __contains__(self, key: str) -> bool:
+        present, evicted = self._sync(key, self._size_on_disk(key))
+        self._remove(evicted)
+        return present
+
+    async def lookup(self, key: str) -> bool:
+        present, evicted = self._sync(key, await asyncio.to_thread(self._size_on_disk, key))
+        if evicted:
+            await asyncio.to_thread(self._remove, evicted)
+        return present
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _utime(self, key: str):
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def touch(self, key: str):
+        if key in self._index:
+            self._index.move_to_end(key)
+            self._utime(key)
+
+    async def access(self, key: str):
+        if key in self._index:
+            self._index.move_to_end(key)
+            await asyncio.to_thread(self._utime, key)
+
+    def add(self, key: str, size: int):
+        """Records a file that was just written at path(key), then evicts down to max_bytes."""
+        self._remove(self._record(key, size))
+
+    async def record(self, key: str, size: int):
+        evicted = self._record(key, size)
+        if evicted:
+            await asyncio.to_thread(self._remove, evicted)
+
+    def _record(self, key: str, size: int) -> List[str]:
+        self.total += size - self._index.pop(key, 0)
+        self._index[key] = size
+        return self._evict()
+
+    def _evict(self) -> List[str]:
+        """Drops the oldest entries from the index down to max_bytes; returns their keys for _remove()."""
+        evicted = []
+        while self.total > self.max_bytes and len(self._index) > 1:
+            old_key, old_size = self._index.popitem(last=False)
+            self.total -= old_size
+            self.evictions += 1
+            evicted.append(old_key)
+        return evicted
+
+    def _remove(self, keys: List[str]):
+        for key in keys:
+            self.path(key).unlink(missing_ok=True)
+            self.sidecar(key).unlink(missing_ok=True)
+
+
+_instances: "weakref.WeakSet[DiskLRU]" = weakref.WeakSet()
+_rescan_task: Optional[asyncio.Task] = None
+
+
+async def _rescan_loop(interval: float):
+    while True:
+        await asyncio.sleep(interval * random.uniform(0.8, 1.2))
+        for lru in list(_instances):
+            try:
+                evicted = lru._reindex(await asyncio.to_thread(lru.scan))
+                await asyncio.to_thread(lru._remove, evicted)
+            except OSError as e:
+                logger.warning(f"{lru.name}: rescan failed: {e}")
+
+
+async def start_disk_rescans(interval: float):
+    """Periodically re-syncs every cache's index with the directory shared by all workers"""
+    global _rescan_task
+    if _rescan_task is None:
+        _rescan_task = asyncio.create_task(_rescan_loop(interval))
+
+
+async def stop_disk_rescans():
+    global _rescan_task
+    if _rescan_task is not None:
+        _rescan_task.cancel()
+        try:
+            await _rescan_task
+        except asyncio.CancelledError:
+            pass
+        _rescan_task = None
@@ -0,0 +1,203 @@
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Deque, List, Optional, Set
+
+from pymongo.errors import OperationFailure, PyMongoError
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Fields worth forwarding to list views without a refetch
+SUMMARY_FIELDS = ("status", "mode", "topic", "updated_at", "version")
+
+
+class Subscription:
+    def __init__(self, generation_id: Optional[str], maxsize: int = 256):
+        self.generation_id = generation_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.closed = False
+
+    def matches(self, event: dict) -> bool:
+        return self.generation_id is None or event["generation_id"] == self.generation_id
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop and tell it to resync instead of buffering without bound
+            self.overflowed = True
+
+    def close(self):
+        """Ends the stream; a None wakes the consumer (a full queue is checked for `closed` anyway)"""
+        self.closed = True
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class GenerationEventBus:
+    """
+    Fan-out of generation changes to SSE subscribers.
+
+    Source of truth is a MongoDB change stream on `generations` (needs a
+    replica set). On a standalone mongod the watch fails and the bus falls back
+    to in-process pub/sub fed by `notify()` calls from the write paths; in that
+    mode only changes made by this process are seen.
+
+    Every event gets an id "<boot>-<seq>". A reconnecting client sends it back
+    as Last-Event-ID and is replayed everything after it from a ring buffer;
+    if the id is unknown (another process, or too old) it gets a `reset` and
+    should refetch.
+    """
+
+    def __init__(self, collection=None, history: int = 1000):
+        self.collection = collection
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.mode = "local"
+        self._seq = 0
+        self._history: Deque[dict] = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+        self._watch_task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self.counters = {"published": 0, "change_stream_events": 0, "watch_restarts": 0}
+
+    # Lifecycle
+
+    def start(self):
+        if self.collection is not None and self._watch_task is None:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+
+    async def _watch(self):
+        backoff = 1
+        while True:
+            try:
+                async with self.collection.watch(
+                    full_document="updateLookup", resume_after=self._resume_token
+                ) as stream:
+                    if self.mode != "change_stream":
+                        logger.info("Generation events: using MongoDB change stream")
+                    self.mode = "change_stream"
+                    backoff = 1
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self.counters["change_stream_events"] += 1
+                        self._publish(self._from_change(change))
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                # 40573: change streams need a replica set / sharded cluster
+                if e.code in (40573, 40324) or "replica set" in str(e).lower():
+                    logger.info("Generation events: change streams unavailable, using in-process pub/sub")
+                    if get_settings().multi_worker:
+                        logger.warning("Generation events: with several workers each SSE client only sees "
+                                       "changes made by its own worker; run MongoDB as a replica set")
+                    self.mode = "local"
+                    return
+                logger.warning(f"Generation change stream failed: {e}")
+            except PyMongoError as e:
+                logger.warning(f"Generation change stream interrupted: {e}")
+            self.counters["watch_restarts"] += 1
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    @staticmethod
+    def _from_change(change: dict) -> dict:
+        doc = change.get("fullDocument") or {}
+        key = change.get("documentKey") or {}
+        fields: List[str] = list((change.get("updateDescription") or {}).get("updatedFields", {}).keys())
+        return {
+            "generation_id": doc.get("id") or str(key.get("_id")),
+            "op": change.get("operationType"),
+            "fields": sorted({f.split(".")[0] for f in fields}),
+            **{f: doc.get(f) for f in SUMMARY_FIELDS if f in doc},
+        }
+
+    # Publishing
+
+    def notify(self, generation_id: str, op: str = "update", fields: Optional[List[str]] = None,
+               summary: Optional[dict] = None):
+        """Called by write paths. A no-op when the change stream already reports the write."""
+        if self.mode == "change_stream":
+            return
+        self._publish({
+            "generation_id": generation_id,
+            "op": op,
+            "fields": sorted(fields or []),
+            **{k: v for k, v in (summary or {}).items() if k in SUMMARY_FIELDS},
+        })
+
+    def _publish(self, event: dict):
+        self._seq += 1
+        event["event_id"] = f"{self.boot_id}-{self._seq}"
+        event["ts"] = time.time()
+        self._history.append(event)
+        self.counters["published"] += 1
+        for sub in list(self._subscribers):
+            if sub.matches(event):
+                sub.offer(event)
+
+    # Subscribing
+
+    def subscribe(self, generation_id: Optional[str] = None) -> Subscription:
+        sub = Subscription(generation_id)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        self._subscribers.discard(sub)
+
+    def close_subscribers(self):
+        """Ends every open stream so a draining worker can exit; clients reconnect elsewhere"""
+        for sub in list(self._subscribers):
+            sub.close()
+
+    def replay(self, sub: Subscription, last_event_id: str) -> bool:
+        """Queues events after last_event_id. Returns False if the id can't be resumed."""
+        boot, _, seq = last_event_id.partition("-")
+        if boot != self.boot_id or not seq.isdigit():
+            return False
+        seq = int(seq)
+        if self._history and int(self._history[0]["event_id"].split("-")[1]) > seq + 1:
+            return False  # fell out of the ring buffer
+        for event in self._history:
+            if int(event["event_id"].split("-")[1]) > seq and sub.matches(event):
+                sub.offer(event)
+        return True
+
+    def stats(self) -> dict:
+        return {**self.counters, "mode": self.mode, "subscribers": len(self._subscribers)}
+
+
+_bus: Optional[GenerationEventBus] = None
+
+
+def get_event_bus() -> GenerationEventBus:
+    global _bus
+    if _bus is None:
+        from database import db
+        _bus = GenerationEventBus(db.generations)
+    return _bus
+
+
+async def start_event_bus():
+    get_event_bus().start()
+
+
+async def stop_event_bus():
+    if _bus is not None:
+        await _bus.stop()
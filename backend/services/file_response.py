@@ -0,0 +1,59 @@
+
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+async def _iter_file(path: Path, start: int, length: int):
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request: Request, path: Path, media_type: str, size: int, etag: str,
+                  headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Serves a cached file with conditional GET (If-None-Match -> 304) and single
+    byte-range (Range -> 206) support. Full responses use FileResponse so the
+    server can use sendfile where available.
+    """
+    headers = {**(headers or {}), "ETag": etag, "Accept-Ranges": "bytes"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    match = _RANGE_RE.match(request.headers.get("range", "").strip())
+    if match and size > 0:
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        elif last:
+            start = max(size - int(last), 0)
+            end = size - 1
+        else:
+            start, end = 0, size - 1
+        if start > end or start >= size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        length = end - start + 1
+        return StreamingResponse(
+            _iter_file(path, start, length),
+            status_code=206,
+            media_type=media_type,
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(length)},
+        )
+
+    return FileResponse(path, media_type=media_type, headers=headers)
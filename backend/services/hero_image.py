@@ -0,0 +1,50 @@
+
+import logging
+from typing import Optional
+
+from services.kie_service import HERO_MODEL, KieTaskFailed, get_kie_service
+
+logger = logging.getLogger(__name__)
+
+
+def _generations():
+    from database import db
+    return db.generations
+
+
+async def ensure_hero_task(generation_id: str, prompt: str) -> str:
+    """
+    The generation's Kie hero task id, starting the task only when none is
+    stored. The id is saved on the generation (`hero_task_id`) so job retries
+    of the text phase and of viral visuals reuse the task instead of paying
+    for a new one and orphaning the old.
+    """
+    doc = await _generations().find_one({"id": generation_id}, {"_id": 0, "hero_task_id": 1})
+    if doc and doc.get("hero_task_id"):
+        return doc["hero_task_id"]
+    task_id = await get_kie_service().start_hero_image(prompt)
+    await _generations().update_one({"id": generation_id}, {"$set": {"hero_task_id": task_id}})
+    return task_id
+
+
+async def clear_hero_task(generation_id: str, task_id: Optional[str] = None):
+    query = {"id": generation_id}
+    if task_id:
+        query["hero_task_id"] = task_id
+    await _generations().update_one(query, {"$unset": {"hero_task_id": ""}})
+
+
+async def wait_for_hero(generation_id: str, prompt: str) -> Optional[str]:
+    """
+    Waits for the stored hero task (starting it if needed). A task that
+    failed or timed out is cleared and the hero is generated from scratch.
+    CircuitOpen propagates so the caller can fall back to another provider.
+    """
+    kie_service = get_kie_service()
+    task_id = await ensure_hero_task(generation_id, prompt)
+    try:
+        return await kie_service.poll_task(task_id, HERO_MODEL)
+    except (KieTaskFailed, TimeoutError) as e:
+        logger.warning(f"Hero task {task_id} for {generation_id} did not complete ({e}); starting over")
+        await clear_hero_task(generation_id, task_id)
+    return await kie_service.generate_hero_image(prompt)
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Optional
+
+import httpx
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Holds the per-host slot until the response body is fully consumed or closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class PerHostLimitTransport(httpx.AsyncBaseTransport):
+    """
+    Wraps the pooled transport and caps in-flight requests per host so a slow
+    upstream (e.g. an image CDN) can't starve Kie/OpenAI of pool connections.
+    A host's semaphore is dropped once nothing holds or waits on it, since the
+    image proxy can be pointed at any number of hosts.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_per_host: int):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._users: Dict[str, int] = {}  # requests holding or waiting on each host's semaphore
+
+    def _leave(self, host: str):
+        self._users[host] -= 1
+        if not self._users[host]:
+            del self._users[host], self._semaphores[host]
+
+    def _release(self, host: str):
+        self._semaphores[host].release()
+        self._leave(host)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        sem = self._semaphores.get(host)
+        if sem is None:
+            sem = self._semaphores[host] = asyncio.Semaphore(self._max_per_host)
+        self._users[host] = self._users.get(host, 0) + 1
+        try:
+            await sem.acquire()
+        except BaseException:
+            self._leave(host)
+            raise
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._release(host)
+            raise
+        response.stream = _ReleasingStream(response.stream, lambda: self._release(host))
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_http_client() -> httpx.AsyncClient:
+    settings = get_settings()
+
+    http2 = settings.http2_enabled
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        settings.http_read_timeout,
+        connect=settings.http_connect_timeout,
+        pool=settings.http_pool_timeout,
+    )
+    transport = PerHostLimitTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits, retries=1),
+        max_per_host=settings.http_max_connections_per_host,
+    )
+    return httpx.AsyncClient(transport=transport, timeout=timeout, follow_redirects=True)
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_http_client()
+        logger.info("Shared HTTP client started")
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Shared HTTP client closed")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled client. Started at app startup; scripts that
+    import services directly get one lazily created on first use.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_http_client()
+    return _client
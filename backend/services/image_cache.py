@@ -0,0 +1,201 @@
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import get_settings
+from services.disk_lru import DiskLRU
+from services.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+class UnsupportedContentType(Exception):
+    pass
+
+
+def check_content_type(content_type: str) -> str:
+    """Returns the bare media type, or raises if it isn't in PROXY_ALLOWED_CONTENT_TYPES."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type not in get_settings().proxy_allowed_content_types:
+        raise UnsupportedContentType(f"content-type {media_type or 'missing'} not allowed")
+    return media_type
+
+
+@dataclass
+class CachedImage:
+    key: str
+    path: Path
+    content_type: str
+    size: int
+    etag: str
+
+
+def url_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+class ImageCache:
+    """
+    Content-addressed (by URL hash) on-disk cache for proxied images.
+
+    - size-bounded LRU eviction (in-memory index rebuilt from disk on startup)
+    - upstream ETag / Last-Modified revalidation once an entry is older than ttl
+    - single-flight: concurrent misses for the same URL share one download
+    - bodies are streamed straight to disk, never buffered whole in memory
+    """
+
+    def __init__(self, root: Optional[str] = None, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        settings = get_settings()
+        self.root = Path(root or settings.image_cache_dir)
+        self.max_bytes = max_bytes or settings.image_cache_max_bytes
+        self.ttl = ttl if ttl is not None else settings.image_cache_ttl
+        self.max_object_bytes = settings.proxy_max_image_bytes
+        self.upstream_timeout = settings.proxy_upstream_timeout
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self.lru = DiskLRU(self.root, self.max_bytes, name="Image cache")
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {"hits": 0, "misses": 0, "revalidated": 0, "refreshed": 0, "coalesced": 0, "stale_served": 0}
+
+    def _paths(self, key: str):
+        return self.lru.path(key), self.lru.sidecar(key)
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        _, meta_path = self._paths(key)
+        try:
+            return json.loads(meta_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _entry(self, key: str, meta: dict) -> CachedImage:
+        data_path, _ = self._paths(key)
+        # Content hash, so a changed upstream image of the same size gets a new ETag
+        digest = meta.get("sha256") or f'{key[:16]}-{meta["size"]}-{int(meta.get("fetched_at", 0))}'
+        return CachedImage(
+            key=key,
+            path=data_path,
+            content_type=meta.get("content_type", "image/png"),
+            size=meta["size"],
+            etag=f'"{digest[:32]}"',
+        )
+
+    async def get(self, url: str) -> CachedImage:
+        key = url_key(url)
+        meta = await asyncio.to_thread(self._read_meta, key) if await self.lru.lookup(key) else None
+        if meta and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            self.counters["hits"] += 1
+            await self.lru.access(key)
+            return self._entry(key, meta)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["misses"] += 1
+            task = self._inflight[key] = asyncio.create_task(self._fetch_or_stale(url, key, meta))
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _fetch_or_stale(self, url: str, key: str, meta: Optional[dict]) -> CachedImage:
+        try:
+            return await self._fetch(url, key, meta)
+        except Exception as e:
+            # Revalidation failed: an expired copy beats an error
+            if meta and await asyncio.to_thread(self.lru.path(key).exists):
+                self.counters["stale_served"] += 1
+                logger.warning(f"Refreshing {url} failed ({e}); serving the cached copy")
+                return self._entry(key, meta)
+            raise
+
+    async def _fetch(self, url: str, key: str, meta: Optional[dict]) -> CachedImage:
+        data_path, meta_path = self._paths(key)
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        client = get_http_client()
+        async with client.stream("GET", url, headers=headers, timeout=self.upstream_timeout) as resp:
+            if resp.status_code == 304 and meta:
+                self.counters["revalidated"] += 1
+                meta["fetched_at"] = time.time()
+                await asyncio.to_thread(meta_path.write_text, json.dumps(meta))
+                await self.lru.access(key)
+                return self._entry(key, meta)
+            resp.raise_for_status()
+            content_type = check_content_type(resp.headers.get("content-type"))
+
+            declared = int(resp.headers.get("content-length") or 0)
+            if declared > self.max_object_bytes:
+                raise ImageTooLarge(f"{declared} bytes exceeds {self.max_object_bytes}")
+
+            # Disk I/O goes through threads so a large body doesn't stall the event loop
+            await asyncio.to_thread(data_path.parent.mkdir, parents=True, exist_ok=True)
+            tmp_path = data_path.with_name(f"{key}.{os.getpid()}.tmp")
+            size = 0
+            digest = hashlib.sha256()
+            try:
+                f = await asyncio.to_thread(open, tmp_path, "wb")
+                try:
+                    async for chunk in resp.aiter_bytes(64 * 1024):
+                        size += len(chunk)
+                        digest.update(chunk)
+                        if size > self.max_object_bytes:
+                            raise ImageTooLarge(f"body exceeds {self.max_object_bytes} bytes")
+                        await asyncio.to_thread(f.write, chunk)
+                finally:
+                    await asyncio.to_thread(f.close)
+                await asyncio.to_thread(os.replace, tmp_path, data_path)
+            finally:
+                await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+
+            new_meta = {
+                "url": url,
+                "content_type": content_type,
+                "etag": resp.headers.get("etag"),
+                "last_modified": resp.headers.get("last-modified"),
+                "size": size,
+                "sha256": digest.hexdigest(),
+                "fetched_at": time.time(),
+            }
+        await asyncio.to_thread(meta_path.write_text, json.dumps(new_meta))
+
+        if meta:
+            self.counters["refreshed"] += 1
+        await self.lru.record(key, size)
+        return self._entry(key, new_meta)
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        return {
+            **self.counters,
+            "hit_rate": (self.counters["hits"] / lookups) if lookups else None,
+            "evictions": self.lru.evictions,
+            "entries": len(self.lru),
+            "bytes": self.lru.total,
+            "max_bytes": self.max_bytes,
+            "inflight": len(self._inflight),
+        }
+
+
+_cache: Optional[ImageCache] = None
+
+
+def get_image_cache() -> ImageCache:
+    global _cache
+    if _cache is None:
+        _cache = ImageCache()
+    return _cache
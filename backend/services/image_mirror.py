@@ -0,0 +1,110 @@
+
+import asyncio
+import hashlib
+import json
+import logging
+from typing import Optional, Tuple
+
+from config import get_settings
+from services.blob_store import BlobStore, get_blob_store
+from services.http_client import get_http_client
+from services.image_cache import check_content_type, ImageTooLarge
+from services.image_variants import FORMATS, image_size, make_variant, variants_available
+from services.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMAT = "webp"
+
+
+def original_key(digest: str) -> str:
+    return f"images/{digest}/original"
+
+
+def variant_key(digest: str, width: int, fmt: str) -> str:
+    return f"images/{digest}/w{width}.{fmt}"
+
+
+def manifest_key(digest: str) -> str:
+    return f"images/{digest}/manifest.json"
+
+
+def image_url(digest: str) -> str:
+    """Stable URL slides reference; served by routes/images.py"""
+    return f"{get_settings().public_base_url.rstrip('/')}/api/images/{digest}"
+
+
+async def load_manifest(digest: str, store: Optional[BlobStore] = None) -> Optional[dict]:
+    raw = await (store or get_blob_store()).get(manifest_key(digest))
+    return json.loads(raw) if raw else None
+
+
+class ImageMirror:
+    """
+    Copies provider image URLs (Kie, DALL·E) into our blob store right after
+    generation, so slides reference stable URLs instead of expiring third-party
+    ones. Images are content-addressed (sha256 of the bytes) so re-mirroring
+    the same image is a no-op, and resized WebP variants are written alongside
+    the original.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None):
+        settings = get_settings()
+        self.store = store or get_blob_store()
+        self.enabled = settings.mirror_generated_images
+        self.variant_widths = settings.image_variant_widths
+        self.max_bytes = settings.proxy_max_image_bytes
+        self.timeout = settings.proxy_upstream_timeout
+
+    async def mirror(self, url: Optional[str]) -> Optional[str]:
+        """Returns the mirrored URL, or the original URL if mirroring is off or fails."""
+        if not url or not self.enabled or url.startswith(image_url("")):
+            return url
+        try:
+            return image_url(await self.mirror_digest(url))
+        except Exception as e:
+            logger.warning(f"Image mirror failed for {url}: {e}")
+            return url
+
+    async def mirror_digest(self, url: str) -> str:
+        data, content_type = await self._download(url)
+        digest = hashlib.sha256(data).hexdigest()
+        if await self.store.exists(manifest_key(digest)):
+            logger.info(f"Image {digest[:12]} already mirrored")
+            return digest
+
+        await self.store.put(original_key(digest), data, content_type)
+        manifest = {
+            "source_url": url,
+            "content_type": content_type,
+            "size": len(data),
+            "variants": {},
+        }
+        if variants_available():
+            size = await asyncio.to_thread(image_size, data)
+            manifest["width"], manifest["height"] = size
+            for width in self.variant_widths:
+                if width >= size[0]:
+                    continue
+                encoded = await run_in_process(make_variant, data, width, VARIANT_FORMAT)
+                key = variant_key(digest, width, VARIANT_FORMAT)
+                await self.store.put(key, encoded, FORMATS[VARIANT_FORMAT][1])
+                manifest["variants"][str(width)] = {"key": key, "format": VARIANT_FORMAT, "size": len(encoded)}
+
+        # Manifest goes last: its presence marks the mirror as complete
+        await self.store.put(manifest_key(digest), json.dumps(manifest).encode(), "application/json")
+        logger.info(f"Mirrored {url} as {digest[:12]} ({len(data)} bytes, {len(manifest['variants'])} variants)")
+        return digest
+
+    async def _download(self, url: str) -> Tuple[bytes, str]:
+        client = get_http_client()
+        async with client.stream("GET", url, timeout=self.timeout) as resp:
+            resp.raise_for_status()
+            content_type = check_content_type(resp.headers.get("content-type"))
+            chunks, size = [], 0
+            async for chunk in resp.aiter_bytes(64 * 1024):
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise ImageTooLarge(f"body exceeds {self.max_bytes} bytes")
+                chunks.append(chunk)
+        return b"".join(chunks), content_type
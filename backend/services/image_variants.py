@@ -0,0 +1,56 @@
+
+import io
+import logging
+from typing import Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional for mirroring; variants are skipped without it
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "avif": ("AVIF", "image/avif"),
+}
+
+
+def variants_available() -> bool:
+    return Image is not None
+
+
+def format_supported(fmt: str) -> bool:
+    if Image is None or fmt not in FORMATS:
+        return False
+    from PIL import features
+    return fmt != "avif" or bool(features.check("avif"))
+
+
+def image_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if Image is None:
+        return None
+    with Image.open(io.BytesIO(data)) as img:
+        return img.size
+
+
+def make_variant(data: bytes, width: Optional[int], fmt: str, quality: int = 80) -> bytes:
+    """
+    Resizes (never upscales) and re-encodes an image. Pure and picklable so it
+    can run in a worker thread or process.
+    """
+    pil_format, _ = FORMATS[fmt]
+    with Image.open(io.BytesIO(data)) as img:
+        img.load()
+        if width and img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        if pil_format == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        save_kwargs = {"quality": quality} if pil_format in ("WEBP", "JPEG", "AVIF") else {"optimize": True}
+        img.save(out, format=pil_format, **save_kwargs)
+        return out.getvalue()
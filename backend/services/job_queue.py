@@ -0,0 +1,242 @@
+
+import contextvars
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING, ReturnDocument
+from config import get_settings
+from services.telemetry import current_traceparent
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle: queued -> running -> succeeded
+#                           |-> queued (retry with backoff) -> ... -> dead (dead-letter)
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+DEAD = "dead"
+
+
+# Id of the job the current task is running, set by JobWorker; lets handlers report progress
+current_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_job_id", default=None)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# kind -> hooks awaited with the job document once a job of that kind is dead-lettered
+_dead_letter_hooks: Dict[str, List[Callable[[dict], Awaitable]]] = {}
+
+
+def add_dead_letter_hook(kind: str, hook: Callable[[dict], Awaitable]):
+    """E.g. marks the job's generation failed once no retry is left"""
+    _dead_letter_hooks.setdefault(kind, []).append(hook)
+
+
+async def _run_dead_letter_hooks(job: dict):
+    for hook in _dead_letter_hooks.get(job["kind"], []):
+        try:
+            await hook(job)
+        except Exception as e:
+            logger.error(f"Dead-letter hook for job {job['id']} ({job['kind']}) failed: {e}")
+
+
+class JobQueue:
+    """
+    Mongo-backed durable job queue.
+
+    Workers claim jobs atomically with find_one_and_update and hold a lease
+    that they extend with heartbeats. A job whose lease expires (worker crashed
+    or was killed) becomes claimable again. Failed jobs are retried with
+    exponential backoff until max_attempts, then parked as `dead`.
+    """
+
+    def __init__(self, collection=None):
+        settings = get_settings()
+        if collection is None:
+            from database import db
+            collection = db.jobs
+        self.collection = collection
+        self.lease_seconds = settings.job_lease_seconds
+        self.max_attempts = settings.job_max_attempts
+        self.retry_base_delay = settings.job_retry_base_delay
+        self.retry_max_delay = settings.job_retry_max_delay
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """callback() is invoked after every enqueue from this process (wakes local workers)."""
+        self._listeners.append(callback)
+
+    def _notify(self):
+        for callback in self._listeners:
+            callback()
+
+    def _new_job(self, kind: str, payload: dict, max_attempts: Optional[int] = None, run_at: Optional[datetime] = None) -> dict:
+        now = _now()
+        return {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "payload": payload,
+            "status": QUEUED,
+            "attempts": 0,
+            "max_attempts": max_attempts or self.max_attempts,
+            "run_at": run_at or now,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "last_error": None,
+            "progress": None,
+            "result": None,
+            "traceparent": current_traceparent(),  # the job's span continues the enqueuing request's trace
+            "created_at": now,
+            "updated_at": now,
+        }
+
+    async def enqueue(self, kind: str, payload: dict, max_attempts: Optional[int] = None, run_at: Optional[datetime] = None) -> str:
+        job = self._new_job(kind, payload, max_attempts, run_at)
+        await self.collection.insert_one(job)
+        self._notify()
+        return job["id"]
+
+    async def enqueue_many(self, jobs: Iterable[tuple]) -> List[str]:
+        """jobs: iterable of (kind, payload) pairs, inserted with one insert_many"""
+        docs = [self._new_job(kind, payload) for kind, payload in jobs]
+        if docs:
+            await self.collection.insert_many(docs)
+            self._notify()
+        return [d["id"] for d in docs]
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": job_id}, {"_id": 0})
+
+    async def _dead_letter_expired(self, now: datetime):
+        """Jobs whose worker died or hung on their last attempt: dead-letter instead of reclaiming forever"""
+        query = {"status": RUNNING, "lease_expires_at": {"$lt": now}, "$expr": {"$gte": ["$attempts", "$max_attempts"]}}
+        while True:
+            job = await self.collection.find_one_and_update(query, {"$set": {
+                "status": DEAD,
+                "last_error": "lease expired on the final attempt (worker crashed or hung)",
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "finished_at": now,
+                "updated_at": now,
+            }}, projection={"_id": 0})
+            if job is None:
+                return
+            logger.error(f"Job {job['id']} ({job['kind']}) dead-lettered: lease expired on attempt {job['attempts']}")
+            await _run_dead_letter_hooks(job)
+
+    async def claim(self, worker_id: str, kinds: Optional[List[str]] = None) -> Optional[dict]:
+        now = _now()
+        await self._dead_letter_expired(now)
+        query = {
+            "$or": [
+                {"status": QUEUED, "run_at": {"$lte": now}},
+                {"status": RUNNING, "lease_expires_at": {"$lt": now}, "$expr": {"$lt": ["$attempts", "$max_attempts"]}},
+            ]
+        }
+        if kinds:
+            query["kind"] = {"$in": kinds}
+        job = await self.collection.find_one_and_update(
+            query,
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "lease_owner": worker_id,
+                    "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if job:
+            job.pop("_id", None)
+        return job
+
+    async def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extends the lease. Returns False if the lease was lost to another worker."""
+        now = _now()
+        result = await self.collection.update_one(
+            {"id": job_id, "status": RUNNING, "lease_owner": worker_id},
+            {"$set": {"lease_expires_at": now + timedelta(seconds=self.lease_seconds), "updated_at": now}},
+        )
+        return result.matched_count == 1
+
+    async def set_progress(self, job_id: str, progress: dict):
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$set": {"progress": progress, "updated_at": _now()}},
+        )
+
+    async def complete(self, job_id: str, worker_id: str, result: Optional[dict] = None):
+        await self.collection.update_one(
+            {"id": job_id, "lease_owner": worker_id},
+            {"$set": {
+                "status": SUCCEEDED,
+                "result": result,
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "finished_at": _now(),
+                "updated_at": _now(),
+            }},
+        )
+
+    def retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_base_delay * (2 ** max(attempts - 1, 0)), self.retry_max_delay)
+        return delay * random.uniform(0.5, 1.0)
+
+    async def fail(self, job: dict, worker_id: str, error: str):
+        """Schedules a retry, or dead-letters the job once attempts are exhausted."""
+        now = _now()
+        update = {
+            "last_error": error,
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "updated_at": now,
+        }
+        if job["attempts"] >= job["max_attempts"]:
+            update.update({"status": DEAD, "finished_at": now})
+            logger.error(f"Job {job['id']} ({job['kind']}) dead-lettered after {job['attempts']} attempts: {error}")
+        else:
+            update.update({"status": QUEUED, "run_at": now + timedelta(seconds=self.retry_delay(job["attempts"]))})
+            logger.warning(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed, retrying: {error}")
+        result = await self.collection.update_one({"id": job["id"], "lease_owner": worker_id}, {"$set": update})
+        if update["status"] == DEAD and result.matched_count:
+            await _run_dead_letter_hooks(job)
+
+    async def requeue(self, job_id: str, worker_id: str):
+        """Hands a running job back immediately (used on graceful shutdown) without counting the attempt."""
+        await self.collection.update_one(
+            {"id": job_id, "lease_owner": worker_id, "status": RUNNING},
+            {"$set": {"status": QUEUED, "run_at": _now(), "lease_owner": None, "lease_expires_at": None, "updated_at": _now()},
+             "$inc": {"attempts": -1}},
+        )
+
+    async def depth(self) -> dict:
+        counts = {}
+        async for row in self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["count"]
+        return counts
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+async def report_progress(progress: dict):
+    """Records progress on the running job; a no-op when not called from a job handler"""
+    job_id = current_job_id.get()
+    if job_id:
+        await get_job_queue().set_progress(job_id, progress)
@@ -0,0 +1,136 @@
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from pymongo.errors import PyMongoError
+from config import get_settings
+from services.job_queue import JobQueue, current_job_id, get_job_queue
+from services.telemetry import get_metrics, start_span
+
+logger = logging.getLogger(__name__)
+
+JOB_DURATION = get_metrics().histogram(
+    "job_duration_seconds", "Job handler run time by kind", ("kind", "outcome"),
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+
+class JobWorker:
+    """
+    Claims jobs from the JobQueue and runs the matching handler, keeping the
+    lease alive with heartbeats. Several workers (threads of control in one
+    process, or separate processes/machines) can share one queue; claims are
+    atomic so every job runs on exactly one worker at a time.
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[..., Awaitable]], queue: Optional[JobQueue] = None,
+                 concurrency: Optional[int] = None, worker_id: Optional[str] = None):
+        settings = get_settings()
+        self.handlers = handlers
+        self.queue = queue or get_job_queue()
+        self.concurrency = concurrency or settings.job_worker_concurrency
+        self.poll_interval = settings.job_poll_interval
+        self.drain_timeout = settings.job_drain_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._active: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+        self._wakeup = asyncio.Event()
+        self._run_task: Optional[asyncio.Task] = None
+        self.queue.add_listener(self.notify)
+
+    def notify(self):
+        """Wakes the claim loop early (e.g. right after the API enqueued a job in this process)."""
+        self._wakeup.set()
+
+    def start(self):
+        if self._run_task is None or self._run_task.done():
+            self._run_task = asyncio.create_task(self.run())
+
+    async def run(self):
+        logger.info(f"Job worker {self.worker_id} started (concurrency={self.concurrency})")
+        kinds = list(self.handlers.keys())
+        while not self._stopping.is_set():
+            claimed = False
+            while len(self._active) < self.concurrency and not self._stopping.is_set():
+                try:
+                    job = await self.queue.claim(self.worker_id, kinds)
+                except Exception as e:
+                    logger.error(f"Job claim failed: {e}")
+                    job = None
+                if not job:
+                    break
+                claimed = True
+                task = asyncio.create_task(self._execute(job))
+                self._active[job["id"]] = task
+                task.add_done_callback(lambda _t, job_id=job["id"]: self._active.pop(job_id, None))
+
+            if claimed and len(self._active) < self.concurrency:
+                continue
+            # Sleep until a slot frees up, a local enqueue wakes us, or the poll interval passes
+            self._wakeup.clear()
+            signals = [asyncio.create_task(self._wakeup.wait()), asyncio.create_task(self._stopping.wait())]
+            await asyncio.wait(signals + list(self._active.values()), timeout=self.poll_interval,
+                               return_when=asyncio.FIRST_COMPLETED)
+            for s in signals:
+                s.cancel()
+
+    async def _heartbeat(self, job: dict, runner: asyncio.Task):
+        interval = max(self.queue.lease_seconds / 3, 1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await self.queue.heartbeat(job["id"], self.worker_id)
+            except PyMongoError as e:
+                # Keep the job running and try again; only a lease taken by someone else stops it
+                logger.warning(f"Heartbeat for job {job['id']} failed: {e}")
+                continue
+            if not renewed:
+                logger.warning(f"Lost lease on job {job['id']}, cancelling")
+                runner.cancel()
+                return
+
+    async def _execute(self, job: dict):
+        handler = self.handlers[job["kind"]]
+        runner = asyncio.current_task()
+        heartbeat = asyncio.create_task(self._heartbeat(job, runner))
+        start = time.perf_counter()
+        outcome = "cancelled"
+        try:
+            logger.info(f"Running job {job['id']} ({job['kind']}), attempt {job['attempts']}")
+            current_job_id.set(job["id"])
+            with start_span(f"job {job['kind']}", {"job.id": job["id"], "job.attempt": job["attempts"]},
+                            kind="consumer", traceparent=job.get("traceparent")):
+                result = await handler(**job["payload"])
+            outcome = "succeeded"
+            await self.queue.complete(job["id"], self.worker_id, result if isinstance(result, dict) else None)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            outcome = "failed"
+            await self.queue.fail(job, self.worker_id, f"{type(e).__name__}: {e}")
+        finally:
+            heartbeat.cancel()
+            JOB_DURATION.observe(time.perf_counter() - start, kind=job["kind"], outcome=outcome)
+
+    def request_stop(self):
+        self._stopping.set()
+
+    async def stop(self):
+        """Stops claiming, lets in-flight jobs finish for up to drain_timeout, then hands the rest back."""
+        self.request_stop()
+        if self._run_task:
+            await self._run_task
+        if self._active:
+            logger.info(f"Draining {len(self._active)} in-flight jobs")
+            tasks: Set[asyncio.Task] = set(self._active.values())
+            _, pending = await asyncio.wait(tasks, timeout=self.drain_timeout)
+            for job_id, task in list(self._active.items()):
+                if task in pending:
+                    task.cancel()
+                    await self.queue.requeue(job_id, self.worker_id)
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info(f"Job worker {self.worker_id} stopped")
@@ -0,0 +1,92 @@
+
+import json
+from typing import Any, List, Sequence, Tuple
+
+WILDCARD = "*"
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "start", "index", "key", "expect_key")
+
+    def __init__(self, kind: str, path: tuple, start: int):
+        self.kind = kind  # "object" or "array"
+        self.path = path
+        self.start = start
+        self.index = 0
+        self.key = None
+        self.expect_key = kind == "object"
+
+
+class IncrementalJSONParser:
+    """
+    Pulls completed objects/arrays out of a JSON document while it is still
+    being streamed. `paths` are the containers to report, e.g.
+    ("hero",) or ("slides", "*") for every element of "slides"; `feed()`
+    returns (path, value) for each one that closed in the new chunk.
+
+    Only tracks structure (strings, escapes, nesting, keys); values are
+    decoded with json.loads once their container closes, so malformed output
+    surfaces as a JSONDecodeError on that value. The full text is kept, so
+    `result()` parses the whole document at the end.
+    """
+
+    def __init__(self, paths: Sequence[tuple]):
+        self.paths = [tuple(p) for p in paths]
+        self.buffer = ""
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+
+    def _watched(self, path: tuple) -> bool:
+        return any(
+            len(p) == len(path) and all(a == WILDCARD or a == b for a, b in zip(p, path))
+            for p in self.paths
+        )
+
+    def _child_path(self) -> tuple:
+        if not self._stack:
+            return ()
+        parent = self._stack[-1]
+        return parent.path + ((parent.key,) if parent.kind == "object" else (parent.index,))
+
+    def feed(self, chunk: str) -> List[Tuple[tuple, Any]]:
+        self.buffer += chunk
+        done = []
+        buf = self.buffer
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    top = self._stack[-1] if self._stack else None
+                    if top is not None and top.kind == "object" and top.expect_key:
+                        top.key = json.loads(buf[self._string_start:i + 1])
+                        top.expect_key = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch in "{[":
+                self._stack.append(_Frame("object" if ch == "{" else "array", self._child_path(), i))
+            elif ch in "}]":
+                frame = self._stack.pop()
+                if self._watched(frame.path):
+                    done.append((frame.path, json.loads(buf[frame.start:i + 1])))
+            elif ch == "," and self._stack:
+                top = self._stack[-1]
+                if top.kind == "array":
+                    top.index += 1
+                else:
+                    top.expect_key = True
+        self._pos = len(buf)
+        return done
+
+    def result(self) -> Any:
+        return json.loads(self.buffer)
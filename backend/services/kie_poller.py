@@ -0,0 +1,379 @@
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from config import get_settings
+from services.kie_service import KieService, KieTaskFailed, get_kie_service, parse_task_record
+from services.leader import LeaderLease, get_lease
+from services.telemetry import get_metrics
+from services.resilience import CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+KIE_TASK_POLLS = get_metrics().histogram(
+    "kie_task_polls", "recordInfo polls per finished Kie task (0 = resolved by callback alone)", ("outcome",),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34))
+KIE_TASK_SECONDS = get_metrics().histogram(
+    "kie_task_duration_seconds", "Time from tracking a Kie task to its completion", ("outcome",),
+    buckets=(1, 2.5, 5, 10, 20, 30, 60, 120, 300))
+
+
+@dataclass
+class _PendingTask:
+    task_id: str
+    future: asyncio.Future
+    submitted_at: float
+    next_poll_at: float
+    delay: float
+    waiters: int = 0
+    polls: int = 0
+
+
+def _percentile(values: list, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class KieTaskPoller:
+    """
+    Single background loop that owns every outstanding Kie task id.
+
+    Callers `wait()` on a future; the future is resolved either by the
+    /api/webhooks/kie callback or by this loop. Each tick the loop polls only
+    the tasks whose backoff has expired, capped by a global per-second request
+    budget, so outbound recordInfo traffic is bounded by the tick cadence
+    instead of growing with the number of pending tasks. Tasks submitted
+    together share a schedule and get polled in the same tick.
+    """
+
+    def __init__(self, kie_service: Optional[KieService] = None):
+        settings = get_settings()
+        self.kie_service = kie_service or get_kie_service()
+        self.tick = settings.kie_poll_tick
+        self.budget_per_tick = max(1, int(settings.kie_poll_budget_per_second * settings.kie_poll_tick))
+        # With callbacks enabled polling is only a safety net, so start slower
+        self.initial_delay = settings.kie_poll_initial_delay * (3 if settings.kie_callback_url else 1)
+        self.max_delay = settings.kie_poll_max_delay
+
+        self._pending: Dict[str, _PendingTask] = {}
+        self._loop_task: Optional[asyncio.Task] = None
+        self._completion_times = deque(maxlen=1000)
+        self._counters = {"polls": 0, "poll_errors": 0, "poll_skipped": 0, "completed": 0, "failed": 0, "timeouts": 0, "callbacks": 0}
+
+    # Lifecycle
+
+    def start(self):
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info("Kie task poller started")
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        for entry in self._pending.values():
+            if not entry.future.done():
+                entry.future.set_exception(RuntimeError("Kie task poller stopped"))
+        self._pending.clear()
+        logger.info("Kie task poller stopped")
+
+    # Waiting
+
+    def track(self, task_id: str) -> _PendingTask:
+        entry = self._pending.get(task_id)
+        if entry is None:
+            now = time.monotonic()
+            entry = self._pending[task_id] = _PendingTask(
+                task_id=task_id,
+                future=asyncio.get_running_loop().create_future(),
+                submitted_at=now,
+                next_poll_at=now + self.initial_delay,
+                delay=self.initial_delay,
+            )
+        return entry
+
+    async def wait(self, task_id: str, timeout: float) -> Optional[str]:
+        self.start()
+        entry = self.track(task_id)
+        entry.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(entry.future), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise TimeoutError(f"Kie task {task_id} did not finish within {timeout}s")
+        finally:
+            entry.waiters -= 1
+            if entry.waiters <= 0:
+                self._pending.pop(task_id, None)
+
+    def resolve(self, task_id: str, data: dict) -> bool:
+        """Completes a task from a callback record. Returns False if nobody is waiting."""
+        entry = self._pending.get(task_id)
+        if entry is None or entry.future.done():
+            return False
+        try:
+            done, url = parse_task_record(data)
+        except KieTaskFailed as e:
+            self._counters["callbacks"] += 1
+            self._finish(entry, error=e)
+            return True
+        if not done:
+            return False
+        self._counters["callbacks"] += 1
+        self._finish(entry, result=url)
+        return True
+
+    async def callback(self, task_id: str, data: dict) -> bool:
+        """Entry point for /api/webhooks/kie. Returns whether the record was taken."""
+        return self.resolve(task_id, data)
+
+    def _finish(self, entry: _PendingTask, result: Optional[str] = None, error: Optional[Exception] = None):
+        if entry.future.done():
+            return
+        elapsed = time.monotonic() - entry.submitted_at
+        self._completion_times.append(elapsed)
+        outcome = "failed" if error is not None else "completed"
+        KIE_TASK_POLLS.observe(entry.polls, outcome=outcome)
+        KIE_TASK_SECONDS.observe(elapsed, outcome=outcome)
+        if error is not None:
+            self._counters["failed"] += 1
+            entry.future.set_exception(error)
+        else:
+            self._counters["completed"] += 1
+            entry.future.set_result(result)
+
+    # Polling loop
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self._poll_due()
+            except Exception as e:
+                logger.error(f"Kie poller tick failed: {e}")
+
+    async def _poll_due(self):
+        now = time.monotonic()
+        due = [e for e in self._pending.values() if e.next_poll_at <= now and not e.future.done()]
+        if not due:
+            return
+        due.sort(key=lambda e: e.next_poll_at)
+        await asyncio.gather(*(self._poll_one(e) for e in due[:self.budget_per_tick]))
+
+    async def _fetch(self, task_id: str, attempt: int) -> Tuple[bool, Optional[str]]:
+        """One recordInfo poll: (done, url), raising KieTaskFailed. Other errors count as not done yet."""
+        self._counters["polls"] += 1
+        try:
+            return await self.kie_service.fetch_task(task_id)
+        except KieTaskFailed:
+            raise
+        except CircuitOpen:
+            # recordInfo is failing; keep backing off without adding to the load (callbacks still resolve tasks)
+            self._counters["poll_skipped"] += 1
+        except Exception as e:
+            self._counters["poll_errors"] += 1
+            logger.warning(f"Kie poll for {task_id} failed (attempt {attempt}): {e}")
+        return False, None
+
+    def _next_delay(self, delay: float) -> Tuple[float, float]:
+        """Backed-off delay and the jittered wait until the next poll"""
+        delay = min(delay * 2, self.max_delay)
+        return delay, delay * random.uniform(0.8, 1.2)
+
+    async def _poll_one(self, entry: _PendingTask):
+        entry.polls += 1
+        try:
+            done, url = await self._fetch(entry.task_id, entry.polls)
+        except KieTaskFailed as e:
+            self._finish(entry, error=e)
+            return
+
+        if done:
+            self._finish(entry, result=url)
+            return
+        entry.delay, wait = self._next_delay(entry.delay)
+        entry.next_poll_at = time.monotonic() + wait
+
+    # Metrics
+
+    def stats(self) -> dict:
+        times = list(self._completion_times)
+        return {
+            "queue_depth": len(self._pending),
+            "running": self._loop_task is not None and not self._loop_task.done(),
+            **self._counters,
+            "time_to_completion_p50": _percentile(times, 50),
+            "time_to_completion_p95": _percentile(times, 95),
+            "time_to_completion_max": max(times) if times else None,
+        }
+
+
+PENDING, COMPLETED, FAILED = "pending", "completed", "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class SharedKieTaskPoller(KieTaskPoller):
+    """
+    Multi-worker variant. Task state lives in `kie_tasks`, so the Kie
+    callback can land on any worker, and only the holder of the `kie-poller`
+    lease polls recordInfo: one schedule and one per-second budget for the
+    whole deployment instead of one per process. Every process still owns
+    its waiters' futures and each tick looks up its pending ids in
+    `kie_tasks` to resolve the ones another process finished.
+    """
+
+    def __init__(self, kie_service: Optional[KieService] = None, collection=None, lease: Optional[LeaderLease] = None):
+        super().__init__(kie_service)
+        if collection is None:
+            from database import db
+            collection = db.kie_tasks
+        self.collection = collection
+        self.lease = lease or get_lease("kie-poller")
+        self.task_timeout = get_settings().kie_task_timeout
+
+    def start(self):
+        super().start()
+        self.lease.start()
+
+    async def stop(self):
+        await self.lease.stop()
+        await super().stop()
+
+    async def wait(self, task_id: str, timeout: float) -> Optional[str]:
+        if task_id not in self._pending:
+            await self._register(task_id)
+        return await super().wait(task_id, timeout)
+
+    def _expires_at(self, now: datetime) -> datetime:
+        return now + timedelta(seconds=self.task_timeout + 3600)
+
+    async def _register(self, task_id: str):
+        # $setOnInsert: a callback that beat us here has already written the result
+        now = _now()
+        await self.collection.update_one({"_id": task_id}, {"$setOnInsert": {
+            "status": PENDING,
+            "created_at": now,
+            "next_poll_at": now + timedelta(seconds=self.initial_delay),
+            "delay": self.initial_delay,
+            "polls": 0,
+            "expires_at": self._expires_at(now),
+        }}, upsert=True)
+
+    async def _store(self, task_id: str, url: Optional[str] = None, error: Optional[str] = None, polled: bool = False):
+        now = _now()
+        update = {
+            "$set": {"status": FAILED if error else COMPLETED, "url": url, "error": error, "finished_at": now},
+            "$setOnInsert": {"created_at": now, "expires_at": self._expires_at(now)},
+        }
+        if polled:
+            update["$inc"] = {"polls": 1}
+        await self.collection.update_one({"_id": task_id}, update, upsert=True)
+
+    async def callback(self, task_id: str, data: dict) -> bool:
+        try:
+            done, url = parse_task_record(data)
+            error = None
+        except KieTaskFailed as e:
+            done, url, error = True, None, str(e)
+        if not done:
+            return False
+        await self._store(task_id, url=url, error=error)
+        if not self.resolve(task_id, data):
+            self._counters["callbacks"] += 1
+        return True
+
+    async def _poll_due(self):
+        if self._pending:
+            await self._collect_finished()
+        if self.lease.is_leader:
+            await self._poll_shared()
+
+    def _finish_from(self, doc: dict):
+        entry = self._pending.get(doc["_id"])
+        if entry is None:
+            return
+        entry.polls = doc.get("polls", entry.polls)
+        if doc["status"] == FAILED:
+            self._finish(entry, error=KieTaskFailed(doc.get("error") or "Kie task failed"))
+        else:
+            self._finish(entry, result=doc.get("url"))
+
+    async def _collect_finished(self):
+        ids = [task_id for task_id, entry in self._pending.items() if not entry.future.done()]
+        if not ids:
+            return
+        async for doc in self.collection.find({"_id": {"$in": ids}, "status": {"$ne": PENDING}}):
+            self._finish_from(doc)
+
+    async def _poll_shared(self):
+        now = _now()
+        due = await self.collection.find({
+            "status": PENDING,
+            "next_poll_at": {"$lte": now},
+            # Nobody waits past the task timeout; the TTL index removes the rest
+            "created_at": {"$gte": now - timedelta(seconds=self.task_timeout)},
+        }).sort("next_poll_at", 1).limit(self.budget_per_tick).to_list(self.budget_per_tick)
+        # One task's failure (e.g. a Mongo write) must not abandon the others mid-poll
+        results = await asyncio.gather(*(self._poll_doc(doc) for doc in due), return_exceptions=True)
+        for doc, result in zip(due, results):
+            if isinstance(result, Exception):
+                logger.error(f"Shared Kie poll for {doc['_id']} failed: {result}")
+
+    async def _poll_doc(self, doc: dict):
+        task_id = doc["_id"]
+        polls = doc.get("polls", 0) + 1
+        try:
+            done, url = await self._fetch(task_id, polls)
+        except KieTaskFailed as e:
+            await self._store(task_id, error=str(e), polled=True)
+            self._finish_from({"_id": task_id, "status": FAILED, "error": str(e), "polls": polls})
+            return
+
+        if done:
+            await self._store(task_id, url=url, polled=True)
+            self._finish_from({"_id": task_id, "status": COMPLETED, "url": url, "polls": polls})
+            return
+        delay, wait = self._next_delay(doc.get("delay") or self.initial_delay)
+        await self.collection.update_one({"_id": task_id, "status": PENDING}, {
+            "$set": {"delay": delay, "next_poll_at": _now() + timedelta(seconds=wait)},
+            "$inc": {"polls": 1},
+        })
+
+    def stats(self) -> dict:
+        return {**super().stats(), "mode": "shared", "leader": self.lease.is_leader}
+
+
+_poller: Optional[KieTaskPoller] = None
+
+
+def get_kie_poller() -> KieTaskPoller:
+    global _poller
+    if _poller is None:
+        _poller = SharedKieTaskPoller() if get_settings().multi_worker else KieTaskPoller()
+    return _poller
+
+
+async def start_kie_poller():
+    get_kie_poller().start()
+
+
+async def stop_kie_poller():
+    global _poller
+    if _poller is not None:
+        await _poller.stop()
+        _poller = None
@@ -1,17 +1,78 @@
 
-import httpx
 import asyncio
 import json
 import logging
 import os
-from tenacity import retry, stop_after_attempt, wait_fixed
+import time
+from typing import Optional
+from urllib.parse import urlparse
+from config import get_settings
+from services.http_client import get_http_client
+from services.rate_limiter import PROVIDER_LATENCY, call_with_limits
+from services.resilience import get_breaker, is_provider_failure
 
 logger = logging.getLogger(__name__)
 
+HERO_MODEL = "nano-banana-pro"
+EDIT_MODEL = "google/nano-banana-edit"
+
+
+class KieTaskFailed(Exception):
+    pass
+
+
+class KieAPIError(Exception):
+    def __init__(self, message: str, status_code: int, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def is_task_failure(error: BaseException) -> bool:
+    """Breaker classification for whole tasks: failed or timed-out tasks count against the model"""
+    return isinstance(error, KieTaskFailed) or is_provider_failure(error)
+
+
+def parse_task_record(data: dict) -> tuple:
+    """
+    Interprets a Kie job record (recordInfo `data` or callback `data`).
+    Returns (done, result_url) and raises KieTaskFailed for failed tasks.
+    """
+    state = data.get('state')
+    if state == 'success':
+        result_json = data.get('resultJson')
+        if result_json:
+            try:
+                res = json.loads(result_json)
+                return True, res.get('resultUrls', [])[0]
+            except:
+                return True, result_json
+        return True, None
+    elif state == 'fail':
+        raise KieTaskFailed(f"Task state: fail ({data.get('failMsg') or 'no reason given'})")
+    return False, None
+
+
+def is_kie_result_url(url: Optional[str]) -> bool:
+    """Whether a result URL points at Kie's file hosts (KIE_RESULT_HOSTS); callbacks are untrusted input"""
+    if not url:
+        return True
+    parsed = urlparse(url)
+    host = (parsed.hostname or "").lower()
+    return parsed.scheme == "https" and any(host == h or host.endswith(f".{h}") for h in get_settings().kie_result_hosts)
+
+
 class KieService:
     def __init__(self):
+        settings = get_settings()
         self.api_key = os.environ.get("KIE_AI_API_KEY")
-        self.base_url = "https://api.kie.ai"
+        self.base_url = settings.kie_base_url
+        self.callback_url = settings.kie_callback_url
+        if self.callback_url and not settings.kie_callback_token:
+            # The route rejects unauthenticated callbacks, so don't ask Kie to send them
+            logger.error("KIE_CALLBACK_URL is set without KIE_CALLBACK_TOKEN; callbacks disabled, polling only")
+            self.callback_url = ""
+        self.task_timeout = settings.kie_task_timeout
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
@@ -23,59 +84,106 @@ class KieService:
             "model": model,
             "input": input_data
         }
+        if self.callback_url:
+            payload["callBackUrl"] = self.callback_url
         
-        async with httpx.AsyncClient() as client:
+        async def post():
+            client = get_http_client()
             resp = await client.post(url, json=payload, headers=self.headers, timeout=30.0)
             if resp.status_code != 200:
                 logger.error(f"Kie Create Failed: {resp.text}")
-                raise Exception(f"Kie Create Failed: {resp.status_code}")
-            
-            data = resp.json()
-            return data.get('data', {}).get('taskId')
+                raise KieAPIError(f"Kie Create Failed: {resp.status_code}", resp.status_code, resp.headers.get("retry-after"))
+            return resp.json()
+
+        # Breakers track whole tasks (run_task / poll_task), not just the create request
+        data = await call_with_limits("kie", model, post, circuit=False)
+        return data.get('data', {}).get('taskId')
 
-    @retry(stop=stop_after_attempt(30), wait=wait_fixed(5))
-    async def poll_task(self, task_id: str) -> str:
+    async def fetch_task(self, task_id: str) -> tuple:
+        """Single recordInfo request. Returns (done, result_url)."""
         url = f"{self.base_url}/api/v1/jobs/recordInfo"
-        
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(url, params={"taskId": task_id}, headers=self.headers, timeout=30.0)
+
+        async def get():
+            client = get_http_client()
+            start = time.perf_counter()
+            try:
+                resp = await client.get(url, params={"taskId": task_id}, headers=self.headers, timeout=30.0)
+            except Exception:
+                PROVIDER_LATENCY.observe(time.perf_counter() - start, provider="kie", model="recordInfo", outcome="error")
+                raise
+            PROVIDER_LATENCY.observe(time.perf_counter() - start, provider="kie", model="recordInfo",
+                                     outcome="ok" if resp.status_code == 200 else str(resp.status_code))
             if resp.status_code != 200:
                 logger.warning(f"Kie Poll Error: {resp.status_code}")
-                raise Exception("Poll failed")
-            
-            data = resp.json().get('data', {})
-            state = data.get('state')
-            
-            if state == 'success':
-                result_json = data.get('resultJson')
-                if result_json:
-                    try:
-                        res = json.loads(result_json)
-                        return res.get('resultUrls', [])[0]
-                    except:
-                        return result_json 
-                return None
-            elif state == 'fail':
-                raise Exception("Task state: fail")
-            
-            raise Exception("Task still processing")
+                raise KieAPIError(f"Kie Poll Failed: {resp.status_code}", resp.status_code, resp.headers.get("retry-after"))
+            return resp.json().get('data') or {}
 
-    async def generate_hero_image(self, prompt: str) -> str:
+        return parse_task_record(await get_breaker("kie", "recordInfo").call(get))
+
+    async def poll_task(self, task_id: str, model: Optional[str] = None) -> Optional[str]:
+        """
+        Waits for a task to finish. Completion normally arrives through the Kie
+        callback (see routes/webhooks.py::kie_callback); the shared KieTaskPoller
+        polls recordInfo with backoff as the fallback. With `model`, the outcome
+        counts towards that model's circuit breaker, and an open breaker fails
+        fast instead of waiting out the task timeout.
+        """
+        from services.kie_poller import get_kie_poller
+
+        def wait():
+            return get_kie_poller().wait(task_id, timeout=self.task_timeout)
+
+        if model is None:
+            return await wait()
+        return await get_breaker("kie", model).call(wait, is_failure=is_task_failure)
+
+    async def run_task(self, model: str, input_data: dict) -> Optional[str]:
+        """Creates a task and waits for its result, as one circuit breaker observation for the model"""
+        async def run():
+            return await self.poll_task(await self.create_task(model, input_data))
+
+        return await get_breaker("kie", model).call(run, is_failure=is_task_failure)
+
+    async def start_hero_image(self, prompt: str) -> str:
+        """Creates the hero task without waiting for it; returns the task id for poll_task"""
+        get_breaker("kie", HERO_MODEL).raise_if_open()
         logger.info(f"Generating Hero Image with prompt: {prompt}")
-        task_id = await self.create_task("nano-banana-pro", {
+        return await self.create_task(HERO_MODEL, self._hero_input(prompt))
+
+    @staticmethod
+    def _hero_input(prompt: str) -> dict:
+        return {
             "prompt": prompt,
             "aspect_ratio": "1:1",
             "resolution": "1K",
             "output_format": "png"
-        })
-        return await self.poll_task(task_id)
+        }
+
+    async def generate_hero_image(self, prompt: str) -> str:
+        logger.info(f"Generating Hero Image with prompt: {prompt}")
+        return await self.run_task(HERO_MODEL, self._hero_input(prompt))
 
     async def remove_text(self, image_url: str) -> str:
         logger.info(f"Removing text from: {image_url}")
-        task_id = await self.create_task("google/nano-banana-edit", {
+        return await self.run_task(EDIT_MODEL, {
             "prompt": "give me this image with no text, erase text",
             "image_urls": [image_url],
             "output_format": "png",
             "image_size": "1:1"
         })
-        return await self.poll_task(task_id)
+
+
+_service: Optional[KieService] = None
+
+
+def get_kie_service() -> KieService:
+    """Process-wide KieService (requests go through the shared HTTP client); see get_openai_service"""
+    global _service
+    if _service is None:
+        _service = KieService()
+    return _service
+
+
+def set_kie_service(service: Optional[KieService]):
+    global _service
+    _service = service
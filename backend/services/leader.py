@@ -0,0 +1,123 @@
+
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# One id per process, shared by every lease it holds
+HOLDER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderLease:
+    """
+    Leader election for singleton loops across worker processes. The leader
+    holds a document in `leases` ({_id: name, holder, expires_at}) and renews
+    it every ttl/3; everyone else retries on the same cadence and takes over
+    once it expires. Acquire and renew are one atomic upsert: the filter only
+    matches an expired lease or our own, so a live lease held by someone else
+    makes the upsert collide on _id and we stay a follower.
+
+    `is_leader` also goes false locally once our last successful renewal is
+    older than the ttl, so a process cut off from Mongo stops acting as leader
+    before anyone else can take over.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, collection=None):
+        self.name = name
+        self.ttl = ttl or get_settings().leader_lease_seconds
+        if collection is None:
+            from database import db
+            collection = db.leases
+        self.collection = collection
+        self.holder = HOLDER_ID
+        self._valid_until = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"acquired": 0, "lost": 0, "renew_errors": 0}
+
+    @property
+    def is_leader(self) -> bool:
+        return time.monotonic() < self._valid_until
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            # Hand over now instead of making the next leader wait out the ttl
+            try:
+                await self.collection.update_one({"_id": self.name, "holder": self.holder},
+                                                 {"$set": {"expires_at": datetime.now(timezone.utc)}})
+            except PyMongoError as e:
+                logger.warning(f"Could not release lease {self.name}: {e}")
+        self._valid_until = 0.0
+
+    async def _run(self):
+        while True:
+            await self.try_acquire()
+            await asyncio.sleep(self.ttl / 3)
+
+    async def try_acquire(self) -> bool:
+        was_leader = self.is_leader
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=self.ttl), "renewed_at": now}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            doc = None
+        except PyMongoError as e:
+            # Keep leading until the lease we already hold runs out
+            self.counters["renew_errors"] += 1
+            logger.warning(f"Lease {self.name} renewal failed: {e}")
+            return self.is_leader
+
+        if doc is not None and doc.get("holder") == self.holder:
+            self._valid_until = started + self.ttl
+            if not was_leader:
+                self.counters["acquired"] += 1
+                logger.info(f"Became leader for {self.name} ({self.holder})")
+            return True
+        self._valid_until = 0.0
+        if was_leader:
+            self.counters["lost"] += 1
+            logger.warning(f"Lost leadership of {self.name}")
+        return False
+
+    def stats(self) -> dict:
+        return {**self.counters, "holder": self.holder, "leader": self.is_leader, "ttl": self.ttl}
+
+
+_leases: Dict[str, LeaderLease] = {}
+
+
+def get_lease(name: str) -> LeaderLease:
+    lease = _leases.get(name)
+    if lease is None:
+        lease = _leases[name] = LeaderLease(name)
+    return lease
+
+
+def lease_stats() -> dict:
+    return {name: lease.stats() for name, lease in _leases.items()}
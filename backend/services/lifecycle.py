@@ -0,0 +1,35 @@
+
+import logging
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+_draining = False
+_drain_callbacks: List[Callable[[], None]] = []
+
+
+def on_drain(callback: Callable[[], None]):
+    """callback() runs once when this process starts draining (it must not block)"""
+    _drain_callbacks.append(callback)
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def begin_drain():
+    """
+    Called as soon as the worker is told to stop (SIGTERM via gunicorn_worker),
+    before uvicorn waits for open connections: ends SSE streams and stops
+    claiming jobs, so in-flight work finishes while requests drain.
+    """
+    global _draining
+    if _draining:
+        return
+    _draining = True
+    logger.info("Draining: no new jobs, closing event streams")
+    for callback in _drain_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Drain callback {callback} failed: {e}")
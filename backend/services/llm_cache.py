@@ -0,0 +1,199 @@
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(value):
+    # Prompts are built from indented triple-quoted strings; whitespace changes shouldn't miss the cache
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value).strip()
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def cache_key(kind: str, model: str, request: dict) -> str:
+    raw = json.dumps({"kind": kind, "model": model, "request": _normalize(request)}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent cache of parsed LLM responses in db.llm_cache, keyed by a hash
+    of call kind + model + normalized request (prompt and inputs).
+
+    - entries expire via a TTL index on expires_at
+    - size-bounded: past max_entries the least recently used entries are
+      deleted (checked every `evict_every` stores, not on each write)
+    - single-flight: concurrent identical calls in this process share one request
+    - cache errors never fail the call; it just goes to the API
+    """
+
+    def __init__(self, collection=None, ttl: Optional[int] = None, max_entries: Optional[int] = None,
+                 enabled: Optional[bool] = None, evict_every: int = 50):
+        settings = get_settings()
+        if collection is None:
+            from database import db
+            collection = db.llm_cache
+        self.collection = collection
+        self.ttl = ttl if ttl is not None else settings.llm_cache_ttl
+        self.max_entries = max_entries if max_entries is not None else settings.llm_cache_max_entries
+        self.enabled = settings.llm_cache_enabled if enabled is None else enabled
+        self.evict_every = evict_every
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._stores_since_evict = 0
+        self.counters = {"hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0, "errors": 0,
+                         "tokens_saved": 0}
+        self.by_kind: Dict[str, Dict[str, int]] = {}
+
+    async def cached(self, kind: str, model: str, request: dict, compute: Callable[[], Awaitable],
+                     use_cache: bool = True, tokens: int = 0):
+        """
+        Returns the cached response for (kind, model, request) or runs
+        `compute()` and stores its result. `tokens` is the call's estimated
+        cost, used for the tokens_saved metric.
+        """
+        kind_stats = self.by_kind.setdefault(kind, {"hits": 0, "misses": 0})
+        if not (self.enabled and use_cache):
+            self.counters["bypassed"] += 1
+            return await compute()
+
+        key = cache_key(kind, model, request)
+        entry = await self._get(key)
+        if entry is not None:
+            self.counters["hits"] += 1
+            self.counters["tokens_saved"] += tokens
+            kind_stats["hits"] += 1
+            return entry
+
+        if key in self._inflight:
+            self.counters["hits"] += 1
+            kind_stats["hits"] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        self.counters["misses"] += 1
+        kind_stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await compute()
+            future.set_result(value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        await self._put(key, kind, model, value)
+        return value
+
+    async def lookup(self, kind: str, model: str, request: dict, use_cache: bool = True, tokens: int = 0):
+        """Cached value or None, for callers that can't wrap the call in `cached` (e.g. streaming)"""
+        kind_stats = self.by_kind.setdefault(kind, {"hits": 0, "misses": 0})
+        if not (self.enabled and use_cache):
+            self.counters["bypassed"] += 1
+            return None
+        value = await self._get(cache_key(kind, model, request))
+        hit = "hits" if value is not None else "misses"
+        self.counters[hit] += 1
+        kind_stats[hit] += 1
+        if value is not None:
+            self.counters["tokens_saved"] += tokens
+        return value
+
+    async def store(self, kind: str, model: str, request: dict, value, use_cache: bool = True):
+        if self.enabled and use_cache:
+            await self._put(cache_key(kind, model, request), kind, model, value)
+
+    async def _get(self, key: str):
+        now = datetime.now(timezone.utc)
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": key, "expires_at": {"$gt": now}},
+                {"$set": {"last_used_at": now}, "$inc": {"hits": 1}},
+                projection={"value": 1},
+            )
+        except PyMongoError as e:
+            self.counters["errors"] += 1
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+        return doc["value"] if doc else None
+
+    async def _put(self, key: str, kind: str, model: str, value):
+        now = datetime.now(timezone.utc)
+        try:
+            await self.collection.replace_one({"_id": key}, {
+                "kind": kind,
+                "model": model,
+                "value": value,
+                "hits": 0,
+                "created_at": now,
+                "last_used_at": now,
+                "expires_at": now + timedelta(seconds=self.ttl),
+            }, upsert=True)
+            self.counters["stores"] += 1
+            self._stores_since_evict += 1
+            if self._stores_since_evict >= self.evict_every:
+                self._stores_since_evict = 0
+                await self.evict()
+        except PyMongoError as e:
+            self.counters["errors"] += 1
+            logger.warning(f"LLM cache write failed: {e}")
+
+    async def evict(self) -> int:
+        """Deletes least recently used entries beyond max_entries"""
+        excess = await self.collection.estimated_document_count() - self.max_entries
+        if excess <= 0:
+            return 0
+        cursor = self.collection.find({}, {"_id": 1}).sort("last_used_at", ASCENDING).limit(excess)
+        ids = [doc["_id"] async for doc in cursor]
+        if ids:
+            result = await self.collection.delete_many({"_id": {"$in": ids}})
+            self.counters["evictions"] += result.deleted_count
+            logger.info(f"LLM cache evicted {result.deleted_count} entries")
+        return len(ids)
+
+    async def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        try:
+            entries = await self.collection.estimated_document_count()
+        except PyMongoError:
+            entries = None
+        return {
+            **self.counters,
+            "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "enabled": self.enabled,
+            "by_kind": self.by_kind,
+        }
+
+
+_cache: Optional[LLMCache] = None
+
+
+def get_llm_cache() -> LLMCache:
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
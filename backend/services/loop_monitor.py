@@ -0,0 +1,271 @@
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from config import get_settings
+from services.telemetry import get_metrics
+
+logger = logging.getLogger(__name__)
+
+BLOCKS = get_metrics().counter("event_loop_blocks_total", "Times the event loop was held longer than the block threshold")
+BLOCK_SECONDS = get_metrics().histogram(
+    "event_loop_block_duration_seconds", "How long each detected block held the event loop",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_STACK_FRAMES = 30
+MAX_OFFENDERS = 200
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile of an unsorted sequence (0 for none)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def _is_app_frame(filename: str) -> bool:
+    return filename.startswith(APP_ROOT) and "site-packages" not in filename
+
+
+def _where(filename: str, lineno: int, name: str) -> str:
+    if _is_app_frame(filename):
+        filename = os.path.relpath(filename, APP_ROOT)
+    return f"{filename}:{lineno} in {name}"
+
+
+def _format_stack(frame) -> List[str]:
+    return [_where(f.filename, f.lineno, f.name) for f in traceback.extract_stack(frame)[-MAX_STACK_FRAMES:]]
+
+
+def _culprit(frame) -> str:
+    """Innermost frame in our own code (the thing to fix), else the innermost frame"""
+    innermost = None
+    while frame is not None:
+        where = _where(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+        innermost = innermost or where
+        if _is_app_frame(frame.f_code.co_filename):
+            return where
+        frame = frame.f_back
+    return innermost or "unknown"
+
+
+class _Block:
+    def __init__(self, due: float):
+        self.due = due
+        self.started_at = datetime.now(timezone.utc)
+        self.stacks: Dict[str, dict] = {}
+        self.samples = 0
+        self.duration = 0.0
+
+    def sample(self, frame):
+        self.samples += 1
+        culprit = _culprit(frame)
+        entry = self.stacks.get(culprit)
+        if entry is None:
+            self.stacks[culprit] = {"culprit": culprit, "samples": 1, "stack": _format_stack(frame)}
+        else:
+            entry["samples"] += 1
+
+    def to_dict(self) -> dict:
+        stacks = sorted(self.stacks.values(), key=lambda s: -s["samples"])
+        return {
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round(self.duration * 1000, 1),
+            "samples": self.samples,
+            "culprit": stacks[0]["culprit"] if stacks else None,
+            "stacks": stacks,
+        }
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Collects asyncio debug-mode "Executing <Task ...> took 0.250 seconds" warnings"""
+
+    def __init__(self, records: deque):
+        super().__init__(logging.WARNING)
+        self.records = records
+
+    def emit(self, record):
+        if isinstance(record.msg, str) and record.msg.startswith("Executing") and len(record.args or ()) == 2:
+            callback, seconds = record.args
+            self.records.append({"at": datetime.now(timezone.utc).isoformat(), "callback": str(callback)[:500],
+                                 "duration_ms": round(seconds * 1000, 1)})
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how much later than asked a sleep(interval)
+    wakes up. Anything blocking the loop (sync I/O, CPU work, a huge
+    json.dumps) shows up here as lag for every other request.
+
+    A watchdog thread catches the blocks themselves: when the loop misses
+    its wake-up by more than `block_threshold` it samples the loop thread's
+    stack until the loop gets going again, then records the block with the
+    stacks seen, grouped by the innermost frame in our code. Code holding
+    the GIL inside one C call (e.g. json.loads on a huge string) can't be
+    sampled until it returns. With debug=True asyncio's debug mode also
+    names each callback or task step slower than the threshold.
+    """
+
+    def __init__(self, interval: Optional[float] = None, window: int = 3000, block_threshold: Optional[float] = None,
+                 watchdog: Optional[bool] = None, debug: Optional[bool] = None):
+        settings = get_settings()
+        self.interval = interval or settings.loop_lag_interval
+        self.block_threshold = block_threshold or settings.loop_block_threshold
+        self.watchdog = settings.loop_watchdog if watchdog is None else watchdog
+        self.debug = settings.loop_debug if debug is None else debug
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self.blocks = deque(maxlen=100)
+        self.slow_callbacks = deque(maxlen=100)
+        self.offenders: Dict[str, dict] = {}
+        self.block_count = 0
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._due = 0.0
+        self._last_wake = (0.0, 0.0)  # (due, lag) of the most recent wake-up
+        self._debug_handler: Optional[_SlowCallbackHandler] = None
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._due = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._run())
+        if self.watchdog:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+        if self.debug:
+            loop = asyncio.get_running_loop()
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.block_threshold
+            self._debug_handler = _SlowCallbackHandler(self.slow_callbacks)
+            logging.getLogger("asyncio").addHandler(self._debug_handler)
+            logger.info(f"asyncio debug mode on, reporting callbacks slower than {self.block_threshold * 1000:.0f}ms")
+
+    async def stop(self):
+        if self._thread:
+            self._stop.set()
+            self._thread.join(timeout=1)
+            self._thread = None
+        if self._debug_handler:
+            logging.getLogger("asyncio").removeHandler(self._debug_handler)
+            self._debug_handler = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._due)
+            self._last_wake = (self._due, lag)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    # Watchdog thread
+
+    def _watch(self):
+        check_every = max(min(self.block_threshold / 2, 0.05), 0.005)
+        block: Optional[_Block] = None
+        while not self._stop.wait(check_every):
+            due = self._due
+            stalled = time.monotonic() - due
+            if block is not None and (due != block.due or stalled < self.block_threshold):
+                wake_due, lag = self._last_wake
+                block.duration = lag if wake_due == block.due else max(block.duration, stalled)
+                self._record(block)
+                block = None
+            if stalled >= self.block_threshold:
+                if block is None:
+                    block = _Block(due)
+                block.duration = stalled
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    block.sample(frame)
+
+    def _record(self, block: _Block):
+        self.block_count += 1
+        BLOCKS.inc()
+        BLOCK_SECONDS.observe(block.duration)
+        info = block.to_dict()
+        self.blocks.append(info)
+        culprit = info["culprit"] or "unknown"
+        offender = self.offenders.get(culprit)
+        if offender is None and len(self.offenders) < MAX_OFFENDERS:
+            offender = self.offenders[culprit] = {"culprit": culprit, "blocks": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                  "stack": info["stacks"][0]["stack"] if info["stacks"] else []}
+        if offender is not None:
+            offender["blocks"] += 1
+            offender["total_ms"] = round(offender["total_ms"] + info["duration_ms"], 1)
+            offender["max_ms"] = max(offender["max_ms"], info["duration_ms"])
+        logger.warning(f"Event loop blocked for {info['duration_ms']:.0f}ms in {culprit}")
+
+    def reset(self):
+        self.samples.clear()
+        self.max_lag = 0.0
+        self.blocks.clear()
+        self.slow_callbacks.clear()
+        self.offenders.clear()
+        self.block_count = 0
+
+    def stats(self) -> dict:
+        samples = list(self.samples)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+            "current_ms": round(samples[-1] * 1000, 2) if samples else 0.0,
+            "p50_ms": round(percentile(samples, 50) * 1000, 2),
+            "p95_ms": round(percentile(samples, 95) * 1000, 2),
+            "p99_ms": round(percentile(samples, 99) * 1000, 2),
+            "max_ms": round(self.max_lag * 1000, 2),
+            "watchdog": self._thread is not None,
+            "debug": self.debug,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "blocks": self.block_count,
+        }
+
+    def blocking_report(self, limit: int = 20) -> dict:
+        """Worst offenders by total time blocked, plus the most recent blocks and slow callbacks"""
+        offenders = sorted(list(self.offenders.values()), key=lambda o: -o["total_ms"])
+        return {
+            "offenders": offenders[:limit],
+            "recent_blocks": list(self.blocks)[-limit:][::-1],
+            "slow_callbacks": list(self.slow_callbacks)[-limit:][::-1],
+        }
+
+
+_monitor: Optional[LoopLagMonitor] = None
+
+
+def get_loop_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor()
+    return _monitor
+
+
+async def start_loop_monitor():
+    get_loop_monitor().start()
+
+
+async def stop_loop_monitor():
+    if _monitor is not None:
+        await _monitor.stop()
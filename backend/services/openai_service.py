@@ -1,31 +1,56 @@
 
 from openai import AsyncOpenAI
 from config import get_settings
+from services.rate_limiter import call_with_limits, estimate_tokens, stream_with_limits
+from services.resilience import hedged
+from services.llm_cache import get_llm_cache
+from services.json_stream import IncrementalJSONParser, WILDCARD
+from typing import AsyncIterator, Optional, Tuple
+import httpx
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
+def build_openai_client() -> AsyncOpenAI:
+    settings = get_settings()
+    timeout = httpx.Timeout(settings.openai_timeout, connect=settings.openai_connect_timeout)
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        max_retries=0,  # retries (Retry-After aware) are handled by call_with_limits
+        timeout=timeout,
+        http_client=httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=settings.openai_max_connections,
+                max_keepalive_connections=settings.openai_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+        ),
+    )
+
 class OpenAIService:
-    def __init__(self):
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
         settings = get_settings()
-        self.client = AsyncOpenAI(
-            api_key=settings.openai_api_key,
-            base_url=settings.openai_base_url
-        )
+        self.client = client or build_openai_client()
         self.model = settings.openai_model
         self.dalle_model = settings.dalle_model
+        self.design_timeout = settings.design_analysis_timeout
+        self.design_hedge_delay = settings.design_hedge_delay
 
-    async def generate_viral_structure(self, topic: str, count: int = 5, business_name: str = None, business_type: str = None) -> dict:
-        """Generates content specifically for the 'AI Viral' mode"""
-        
+    async def close(self):
+        await self.client.close()
+
+    @staticmethod
+    def _viral_structure_prompt(topic: str, count: int, business_name: str = None, business_type: str = None) -> str:
         biz_context = ""
         if business_name:
             biz_context += f"\nBrand Name: {business_name}"
         if business_type:
             biz_context += f"\nBusiness Type: {business_type}"
             
-        system_prompt = f"""You are a viral social media expert. 
+        return f"""You are a viral social media expert. 
         Generate content for a {count}-slide carousel about '{topic}'. 
         
         The body paragraphs must be narrative based, with the second to last slide being a conclusion/engagement/comment bait. 
@@ -47,21 +72,85 @@ class OpenAIService:
             - 'content': Body text (max 300 characters). For the CTA slide, the 'content' must be 10 words or less, relevant to the narrative, and entertaining.
             - 'type': 'body' or 'cta'
         """
-        
-        try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "system", "content": system_prompt}],
-                response_format={"type": "json_object"}
+
+    async def generate_viral_structure(self, topic: str, count: int = 5, business_name: str = None, business_type: str = None,
+                                       use_cache: bool = True) -> dict:
+        """Generates content specifically for the 'AI Viral' mode. Cached unless use_cache=False."""
+        system_prompt = self._viral_structure_prompt(topic, count, business_name, business_type)
+        messages = [{"role": "system", "content": system_prompt}]
+        tokens = estimate_tokens(system_prompt, completion_tokens=150 * count)
+
+        async def request():
+            response = await call_with_limits(
+                "openai", self.model,
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    response_format={"type": "json_object"}
+                ),
+                tokens=tokens
             )
             return json.loads(response.choices[0].message.content)
+
+        try:
+            return await get_llm_cache().cached(
+                "viral_structure", self.model, {"messages": messages, "response_format": "json_object"},
+                request, use_cache=use_cache, tokens=tokens,
+            )
         except Exception as e:
             logger.error(f"LLM Error: {e}")
             raise
 
-    async def analyze_design_from_image(self, image_url: str) -> dict:
+    async def stream_viral_structure(self, topic: str, count: int = 5, business_name: str = None, business_type: str = None,
+                                     use_cache: bool = True) -> AsyncIterator[Tuple[str, dict]]:
+        """
+        Streaming generate_viral_structure: yields ("hero", {...}) and then
+        ("slide", {...}) for each body/CTA slide as soon as it is complete in
+        the token stream. Shares the response cache with the non-streaming call.
+        """
+        system_prompt = self._viral_structure_prompt(topic, count, business_name, business_type)
+        messages = [{"role": "system", "content": system_prompt}]
+        tokens = estimate_tokens(system_prompt, completion_tokens=150 * count)
+        request = {"messages": messages, "response_format": "json_object"}
+        cache = get_llm_cache()
+
+        content = await cache.lookup("viral_structure", self.model, request, use_cache=use_cache, tokens=tokens)
+        if content is not None:
+            yield "hero", content.get('hero', {})
+            for slide in content.get('slides', []):
+                yield "slide", slide
+            return
+
+        try:
+            # The concurrency slot stays taken while the body streams, not just until it opens
+            async with stream_with_limits(
+                "openai", self.model,
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    stream=True
+                ),
+                tokens=tokens
+            ) as stream:
+                parser = IncrementalJSONParser([("hero",), ("slides", WILDCARD)])
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    for path, value in parser.feed(delta):
+                        yield ("hero" if path[0] == "hero" else "slide"), value
+                content = parser.result()
+        except Exception as e:
+            logger.error(f"LLM Stream Error: {e}")
+            raise
+        await cache.store("viral_structure", self.model, request, content, use_cache=use_cache)
+
+    async def analyze_design_from_image(self, image_url: str, use_cache: bool = True) -> dict:
         """
         Uses GPT-4o Vision to analyze the background image and recommend design settings.
+        Cached per image URL unless use_cache=False; the fallback design is never cached.
+        With DESIGN_HEDGE_DELAY set, a second request races the first once it runs long.
         """
         system_prompt = """You are an expert UI/UX designer. 
         Analyze this background image for a social media slide.
@@ -79,22 +168,41 @@ class OpenAIService:
         }
         """
         
-        try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o", 
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": system_prompt},
-                            {"type": "image_url", "image_url": {"url": image_url}}
-                        ]
-                    }
-                ],
-                response_format={"type": "json_object"},
-                max_tokens=300
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": system_prompt},
+                    {"type": "image_url", "image_url": {"url": image_url}}
+                ]
+            }
+        ]
+        # 1024x1024 image input is ~765 tokens
+        tokens = estimate_tokens(system_prompt, completion_tokens=300 + 765)
+
+        def attempt():
+            return call_with_limits(
+                "openai", "gpt-4o",
+                lambda: self.client.chat.completions.create(
+                    model="gpt-4o", 
+                    messages=messages,
+                    response_format={"type": "json_object"},
+                    max_tokens=300,
+                    timeout=self.design_timeout
+                ),
+                tokens=tokens
             )
+
+        async def request():
+            # Vision latency has a long tail; a hedged second request caps it
+            response = await hedged(attempt, self.design_hedge_delay, "design_analysis")
             return json.loads(response.choices[0].message.content)
+
+        try:
+            return await get_llm_cache().cached(
+                "design_analysis", "gpt-4o", {"messages": messages, "max_tokens": 300},
+                request, use_cache=use_cache, tokens=tokens,
+            )
         except Exception as e:
             logger.error(f"Vision Analysis Error: {e}")
             return {
@@ -114,13 +222,17 @@ class OpenAIService:
         """
         user_prompt = f"Topic: {topic}\nSlide Count: {count}\nContext: {context}"
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                response_format={"type": "json_object"}
+            response = await call_with_limits(
+                "openai", self.model,
+                lambda: self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    response_format={"type": "json_object"}
+                ),
+                tokens=estimate_tokens(system_prompt, user_prompt, completion_tokens=150 * count)
             )
             return json.loads(response.choices[0].message.content).get("slides", [])
         except Exception:
@@ -128,13 +240,44 @@ class OpenAIService:
 
     async def generate_image(self, prompt: str) -> str:
         try:
-            response = await self.client.images.generate(
-                model=self.dalle_model,
-                prompt=prompt,
-                size="1024x1024",
-                quality="standard",
-                n=1
+            response = await call_with_limits(
+                "openai", self.dalle_model,
+                lambda: self.client.images.generate(
+                    model=self.dalle_model,
+                    prompt=prompt,
+                    size="1024x1024",
+                    quality="standard",
+                    n=1
+                )
             )
             return response.data[0].url
         except Exception:
             raise
+
+
+_service: Optional[OpenAIService] = None
+
+
+def get_openai_service() -> OpenAIService:
+    """
+    Process-wide service (one AsyncOpenAI client and connection pool).
+    Routes take it via Depends(get_openai_service), so tests can use
+    app.dependency_overrides; job handlers call it directly and tests swap
+    it with set_openai_service().
+    """
+    global _service
+    if _service is None:
+        _service = OpenAIService()
+    return _service
+
+
+def set_openai_service(service: Optional[OpenAIService]):
+    global _service
+    _service = service
+
+
+async def close_openai_service():
+    global _service
+    if _service is not None:
+        await _service.close()
+        _service = None
@@ -0,0 +1,114 @@
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional
+
+from services.telemetry import get_metrics, start_span
+
+logger = logging.getLogger(__name__)
+
+STAGE_DURATION = get_metrics().histogram(
+    "pipeline_stage_duration_seconds", "Pipeline stage run time", ("pipeline", "stage", "status"))
+
+
+class StageSkipped(Exception):
+    pass
+
+
+class PipelineFailed(Exception):
+    def __init__(self, failures: Dict[str, BaseException]):
+        self.failures = failures
+        super().__init__("; ".join(f"{name}: {e}" for name, e in failures.items()))
+
+
+class Stage:
+    """
+    One node of a pipeline. `run` gets a dict of its dependencies' results.
+    A failing optional stage is recorded but doesn't fail the pipeline;
+    stages depending on it are skipped either way.
+    """
+
+    def __init__(self, name: str, run: Callable[[dict], Awaitable], after: Iterable[str] = (), required: bool = True):
+        self.name = name
+        self.run = run
+        self.after = tuple(after)
+        self.required = required
+
+
+def _check_graph(stages: List[Stage]):
+    names = {s.name for s in stages}
+    deps = {s.name: set(s.after) for s in stages}
+    for name, after in deps.items():
+        unknown = after - names
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stage(s) {sorted(unknown)}")
+    # Kahn's algorithm: anything left over is on a cycle
+    ready = [n for n, d in deps.items() if not d]
+    while ready:
+        done = ready.pop()
+        for name, after in deps.items():
+            if done in after:
+                after.discard(done)
+                if not after:
+                    ready.append(name)
+        deps = {n: d for n, d in deps.items() if n != done}
+    if deps:
+        raise ValueError(f"Pipeline has a cycle through {sorted(deps)}")
+
+
+async def run_pipeline(stages: List[Stage], on_stage: Optional[Callable[[str, dict], Awaitable]] = None,
+                       name: str = "pipeline", attributes: Optional[dict] = None) -> Dict[str, object]:
+    """
+    Runs every stage as soon as its dependencies are done, so independent
+    stages overlap. `on_stage(name, timing)` is awaited after each stage
+    finishes (or is skipped) -- the place to persist progress. Returns the
+    results of the stages that succeeded; raises PipelineFailed afterwards if
+    a required stage failed. Each stage runs in its own span under one
+    `name` span.
+    """
+    _check_graph(stages)
+    loop = asyncio.get_running_loop()
+    futures = {s.name: loop.create_future() for s in stages}
+    failures: Dict[str, BaseException] = {}
+
+    async def run(stage: Stage):
+        future = futures[stage.name]
+        try:
+            deps = {name: await asyncio.shield(futures[name]) for name in stage.after}
+        except Exception:
+            timing = {"status": "skipped"}
+            future.set_exception(StageSkipped(stage.name))
+            future.exception()  # mark retrieved; dependents still see it
+        else:
+            started_at = datetime.now(timezone.utc)
+            start = time.monotonic()
+            try:
+                with start_span(f"{name}.{stage.name}", {"pipeline": name, "stage": stage.name, "required": stage.required}):
+                    result = await stage.run(deps)
+            except Exception as e:
+                logger.warning(f"Stage {stage.name} failed: {e}")
+                if stage.required:
+                    failures[stage.name] = e
+                future.set_exception(e)
+                future.exception()
+                timing = {"status": "failed", "error": str(e)[:500]}
+            else:
+                future.set_result(result)
+                timing = {"status": "succeeded"}
+            elapsed = time.monotonic() - start
+            STAGE_DURATION.observe(elapsed, pipeline=name, stage=stage.name, status=timing["status"])
+            timing.update(started_at=started_at, duration_ms=round(elapsed * 1000))
+        if on_stage:
+            try:
+                await on_stage(stage.name, timing)
+            except Exception as e:
+                logger.warning(f"Recording stage {stage.name} failed: {e}")
+
+    with start_span(name, attributes) as span:
+        await asyncio.gather(*(run(s) for s in stages))
+        if failures:
+            span.set_attribute("failed_stages", ",".join(failures))
+            raise PipelineFailed(failures)
+    return {name: f.result() for name, f in futures.items() if f.exception() is None}
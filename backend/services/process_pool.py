@@ -0,0 +1,43 @@
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Optional
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Shared pool for CPU-heavy work (image encoding, slide rendering) kept off the event loop."""
+    global _pool
+    if _pool is None:
+        workers = get_settings().cpu_workers
+        # spawn: forking a process that already runs an event loop and Motor threads is unsafe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        logger.info(f"Process pool started with {workers} workers")
+    return _pool
+
+
+async def run_in_process(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        # A worker died (OOM, segfault in a codec); replace the pool and retry once
+        logger.error("Process pool broken, restarting it")
+        shutdown_process_pool()
+        return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+
+def shutdown_process_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,271 @@
+
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+from config import get_settings
+from services.telemetry import get_metrics, start_span
+from services.resilience import CircuitOpen, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# Tenant used for fair queueing; pipelines set it to the generation's business
+current_tenant: contextvars.ContextVar[str] = contextvars.ContextVar("current_tenant", default="default")
+
+DEFAULT_LIMITS = {
+    "openai": {"rpm": 500, "tpm": 150000, "concurrency": 16},
+    "kie": {"rpm": 120, "tpm": 0, "concurrency": 8},
+}
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Per attempt, so retries show up as separate observations; outcome is "ok", the HTTP status or "error"
+PROVIDER_LATENCY = get_metrics().histogram(
+    "provider_request_duration_seconds", "Outbound OpenAI/Kie call latency", ("provider", "model", "outcome"))
+
+
+class TokenBucket:
+    """Refills `per_minute` tokens per minute up to `capacity`. per_minute=0 disables the bucket."""
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def take(self, amount: float = 1):
+        if not self.rate:
+            return
+        # A single request larger than the bucket may still go through once it is full
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class ProviderLimiter:
+    """
+    Limits one provider/model: a semaphore caps in-flight calls, token buckets
+    enforce RPM and TPM budgets, and waiters are admitted round-robin across
+    tenants so one noisy tenant can't starve the rest.
+    """
+
+    def __init__(self, key: str, rpm: float, tpm: float, concurrency: int):
+        self.key = key
+        self.requests = TokenBucket(rpm)
+        self.token_budget = TokenBucket(tpm)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.blocked_until = 0.0
+
+        self._queues: "OrderedDict[str, deque]" = OrderedDict()
+        self._gate_busy = False
+        self._wait_times = deque(maxlen=1000)
+        self.stats_counters = {"calls": 0, "waiting": 0, "in_flight": 0, "rate_limited": 0, "wait_seconds_total": 0.0}
+
+    def _dispatch(self):
+        while not self._gate_busy and self._queues:
+            tenant, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            if queue:
+                self._queues.move_to_end(tenant)
+            else:
+                del self._queues[tenant]
+            if future.done():
+                continue
+            self._gate_busy = True
+            future.set_result(None)
+
+    def _release_gate(self):
+        self._gate_busy = False
+        self._dispatch()
+
+    async def _admit(self, tenant: str):
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(tenant, deque()).append(future)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release_gate()
+            raise
+
+    def penalize(self, seconds: float):
+        """Blocks new admissions for `seconds` (provider answered 429 / Retry-After)."""
+        self.stats_counters["rate_limited"] += 1
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    @asynccontextmanager
+    async def acquire(self, tokens: float = 1, tenant: str = "default"):
+        started = time.monotonic()
+        self.stats_counters["waiting"] += 1
+        acquired = False
+        try:
+            await self._admit(tenant)
+            try:
+                await self.semaphore.acquire()
+                acquired = True
+                pause = self.blocked_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                await self.requests.take(1)
+                await self.token_budget.take(tokens)
+            finally:
+                self._release_gate()
+        except BaseException:
+            if acquired:
+                self.semaphore.release()
+            raise
+        finally:
+            self.stats_counters["waiting"] -= 1
+
+        waited = time.monotonic() - started
+        self._wait_times.append(waited)
+        self.stats_counters["wait_seconds_total"] += waited
+        self.stats_counters["calls"] += 1
+        if waited > 1:
+            logger.info(f"Rate limiter {self.key}: waited {waited:.2f}s (tenant={tenant})")
+
+        self.stats_counters["in_flight"] += 1
+        try:
+            yield
+        finally:
+            self.stats_counters["in_flight"] -= 1
+            self.semaphore.release()
+
+    def stats(self) -> dict:
+        waits = sorted(self._wait_times)
+        return {
+            **self.stats_counters,
+            "queued_tenants": len(self._queues),
+            "wait_p50": waits[len(waits) // 2] if waits else None,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else None,
+            "wait_max": waits[-1] if waits else None,
+        }
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+
+
+def get_limiter(provider: str, model: Optional[str] = None) -> ProviderLimiter:
+    """RATE_LIMITS entries may target "provider:model" or just "provider"."""
+    key = f"{provider}:{model}" if model else provider
+    limiter = _limiters.get(key)
+    if limiter is None:
+        settings = get_settings()
+        configured = settings.rate_limits
+        limits = {**DEFAULT_LIMITS.get(provider, DEFAULT_LIMITS["openai"]),
+                  **configured.get(provider, {}), **configured.get(key, {})}
+        # Limits are per deployment: with N workers each process gets 1/N of them
+        workers = max(1, settings.web_concurrency) if settings.multi_worker else 1
+        limiter = _limiters[key] = ProviderLimiter(key, limits["rpm"] / workers, limits["tpm"] / workers,
+                                                   max(1, -(-limits["concurrency"] // workers)))
+    return limiter
+
+
+def limiter_stats() -> dict:
+    return {key: limiter.stats() for key, limiter in _limiters.items()}
+
+
+def estimate_tokens(*texts: str, completion_tokens: int = 500) -> int:
+    """Rough TPM estimate (~4 chars per token) used before the real usage is known."""
+    return sum(len(t or "") for t in texts) // 4 + completion_tokens
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    header = None
+    if response is not None and getattr(response, "headers", None) is not None:
+        header = response.headers.get("retry-after")
+    header = header or getattr(error, "retry_after", None)
+    if header is None:
+        return None
+    try:
+        return max(float(header), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max((parsedate_to_datetime(header) - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@asynccontextmanager
+async def stream_with_limits(provider: str, model: Optional[str], call: Callable[[], Awaitable],
+                             tokens: float = 1, max_attempts: Optional[int] = None, circuit: bool = True):
+    """
+    Runs `call` under the provider/model limiter. 429s and 5xx are retried with
+    backoff; a Retry-After header (or KieAPIError.retry_after) wins over the
+    computed delay, and a 429 pauses every caller on the same limiter.
+    Attempts also go through the provider/model circuit breaker, which raises
+    CircuitOpen straight away while the provider is failing; circuit=False
+    leaves that to the caller.
+
+    Yields the result with the limiter's concurrency slot still held until the
+    block exits, for streamed responses that are read after `call` returns.
+    Only opening the call is retried.
+    """
+    settings = get_settings()
+    max_attempts = max_attempts or settings.rate_limit_max_attempts
+    limiter = get_limiter(provider, model)
+    breaker = get_breaker(provider, model) if circuit else None
+    attempt = 0
+    with start_span(f"{provider} call", {"provider": provider, "model": model or ""}, kind="client") as span:
+        while True:
+            attempt += 1
+            if breaker:
+                # Fail fast instead of queueing on the limiter for a provider that is down
+                breaker.raise_if_open()
+            async with limiter.acquire(tokens=tokens, tenant=current_tenant.get()):
+                start = time.perf_counter()
+                try:
+                    result = await (breaker.call(call) if breaker else call())
+                except CircuitOpen:
+                    raise
+                except Exception as e:
+                    status = getattr(e, "status_code", None)
+                    PROVIDER_LATENCY.observe(time.perf_counter() - start, provider=provider, model=model or "",
+                                             outcome=str(status or "error"))
+                    transient = isinstance(e, (openai.APIConnectionError, httpx.TransportError))
+                    if (status not in RETRYABLE_STATUS and not transient) or attempt >= max_attempts:
+                        span.set_attribute("attempts", attempt)
+                        raise
+                    delay = _retry_after(e)
+                    if delay is None:
+                        delay = min(settings.rate_limit_backoff_base * (2 ** (attempt - 1)), 60) * random.uniform(0.5, 1.0)
+                    logger.warning(f"{limiter.key} returned {status}, retrying in {delay:.1f}s (attempt {attempt})")
+                    span.add_event("retry", {"status": str(status), "delay_s": round(delay, 2)})
+                    if status == 429:
+                        limiter.penalize(delay)
+                else:
+                    PROVIDER_LATENCY.observe(time.perf_counter() - start, provider=provider, model=model or "", outcome="ok")
+                    span.set_attribute("attempts", attempt)
+                    yield result
+                    return
+            if status != 429:
+                await asyncio.sleep(delay)
+
+
+async def call_with_limits(provider: str, model: Optional[str], call: Callable[[], Awaitable],
+                           tokens: float = 1, max_attempts: Optional[int] = None, circuit: bool = True):
+    """stream_with_limits for calls whose result is complete when `call` returns"""
+    async with stream_with_limits(provider, model, call, tokens=tokens, max_attempts=max_attempts,
+                                  circuit=circuit) as result:
+        return result
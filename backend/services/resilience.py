@@ -0,0 +1,207 @@
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+import httpx
+import openai
+from config import get_settings
+from services.telemetry import current_span, get_metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+TRANSITIONS = get_metrics().counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes", ("breaker", "state"))
+HEDGES = get_metrics().counter(
+    "hedged_requests_total", "Hedged calls by which attempt won (primary, hedge) or failed", ("call", "winner"))
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a provider whose breaker is open"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Circuit for {key} is open (retry in {retry_after:.0f}s)")
+        self.key = key
+        self.retry_after = retry_after
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy: 5xx, 408, timeouts and
+    connection errors. 4xx (bad request, content policy, 429) mean it is up.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status >= 500 or status == 408
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, TimeoutError, asyncio.TimeoutError))
+
+
+class CircuitBreaker:
+    """
+    Fails fast while a provider is unhealthy. Opens after `failure_threshold`
+    consecutive failures, or when at least `failure_rate` of the calls in the
+    last `window` seconds failed (given `min_calls`). After `reset_timeout`
+    one trial call is let through (half-open): success closes the breaker,
+    failure re-opens it for twice as long (capped at max_reset_timeout).
+    """
+
+    def __init__(self, key: str, failure_threshold: Optional[int] = None, failure_rate: Optional[float] = None,
+                 min_calls: Optional[int] = None, window: Optional[float] = None, reset_timeout: Optional[float] = None,
+                 max_reset_timeout: float = 300):
+        settings = get_settings()
+        self.key = key
+        self.failure_threshold = failure_threshold or settings.breaker_failure_threshold
+        self.failure_rate = failure_rate or settings.breaker_failure_rate
+        self.min_calls = min_calls or settings.breaker_min_calls
+        self.window = window or settings.breaker_window
+        self.reset_timeout = reset_timeout or settings.breaker_reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self._open_for = self.reset_timeout
+        self._consecutive = 0
+        self._outcomes = deque()  # (time, failed)
+        self._trial_in_flight = False
+        self.counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def _transition(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(f"Circuit {self.key}: {self.state} -> {state}")
+        self.state = state
+        TRANSITIONS.inc(breaker=self.key, state=state)
+
+    def _open(self):
+        self.counters["opened"] += 1
+        self.opened_until = time.monotonic() + self._open_for
+        self._transition(OPEN)
+
+    def raise_if_open(self):
+        """Cheap pre-check (e.g. before queueing on a rate limiter); doesn't claim the half-open trial"""
+        if self.state == OPEN and time.monotonic() < self.opened_until:
+            self.counters["rejected"] += 1
+            raise CircuitOpen(self.key, self.opened_until - time.monotonic())
+
+    def _before_call(self) -> bool:
+        """Raises CircuitOpen, or returns True if this call is the half-open trial"""
+        self.raise_if_open()
+        if self.state == OPEN:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self._trial_in_flight:
+                self.counters["rejected"] += 1
+                raise CircuitOpen(self.key, 1)
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+        if not failed:
+            self.counters["successes"] += 1
+            self._consecutive = 0
+            return
+        self.counters["failures"] += 1
+        self._consecutive += 1
+        failures = sum(1 for _, f in self._outcomes if f)
+        if self._consecutive >= self.failure_threshold or (
+                len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate):
+            self._open()
+
+    async def call(self, fn: Callable[[], Awaitable], is_failure: Callable[[BaseException], bool] = is_provider_failure):
+        trial = self._before_call()
+        try:
+            result = await fn()
+        except BaseException as e:
+            failed = isinstance(e, Exception) and is_failure(e)
+            if trial:
+                self._trial_in_flight = False
+                if failed:
+                    self._open_for = min(self._open_for * 2, self.max_reset_timeout)
+                    self._open()
+                elif isinstance(e, Exception):
+                    # The provider answered; it's healthy even if this request was bad
+                    self._close()
+            elif failed:
+                self._record(True)
+            raise
+        if trial:
+            self._trial_in_flight = False
+            self._close()
+        else:
+            self._record(False)
+        return result
+
+    def _close(self):
+        self._open_for = self.reset_timeout
+        self._consecutive = 0
+        self._outcomes.clear()
+        self._transition(CLOSED)
+
+    def stats(self) -> dict:
+        failures = sum(1 for _, f in self._outcomes if f)
+        return {
+            **self.counters,
+            "state": self.state,
+            "retry_in": round(max(self.opened_until - time.monotonic(), 0), 1) if self.state == OPEN else 0,
+            "window_calls": len(self._outcomes),
+            "window_failure_rate": round(failures / len(self._outcomes), 3) if self._outcomes else None,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(provider: str, model: Optional[str] = None) -> CircuitBreaker:
+    """One breaker per provider:model, keyed like the rate limiters"""
+    key = f"{provider}:{model}" if model else provider
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(key)
+    return breaker
+
+
+def breaker_stats() -> dict:
+    return {key: breaker.stats() for key, breaker in _breakers.items()}
+
+
+async def hedged(call: Callable[[], Awaitable], delay: float, name: str, max_attempts: int = 2):
+    """
+    Runs `call`; if it hasn't finished after `delay` seconds (or failed), starts
+    another attempt, up to `max_attempts`. The first success wins and the
+    rest are cancelled. Trims tail latency at the cost of duplicate requests,
+    so use it only for idempotent calls.
+    """
+    if delay <= 0 or max_attempts < 2:
+        return await call()
+    attempts = {asyncio.create_task(call()): 0}
+    launched, last_error = 1, None
+    try:
+        while attempts:
+            done, _ = await asyncio.wait(attempts, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = attempts.pop(task)
+                if task.exception() is None:
+                    HEDGES.inc(call=name, winner="hedge" if index else "primary")
+                    if index:
+                        current_span().add_event("hedge won", {"call": name, "attempt": index})
+                    return task.result()
+                last_error = task.exception()
+            # Still waiting (or the only attempt failed): launch the next one
+            if launched < max_attempts:
+                attempts[asyncio.create_task(call())] = launched
+                launched += 1
+        HEDGES.inc(call=name, winner="none")
+        raise last_error
+    finally:
+        for task in attempts:
+            task.cancel()
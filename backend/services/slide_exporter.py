@@ -0,0 +1,137 @@
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config import get_settings
+from models import THEME_COLORS
+from services.blob_store import get_blob_store
+from services.disk_lru import DiskLRU
+from services.image_cache import get_image_cache
+from services.image_mirror import original_key
+from services.process_pool import run_in_process
+from services.slide_renderer import RENDERER_VERSION, bundle_pdf, bundle_zip, render_slide
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "png": "image/png",
+    "jpeg": "image/jpeg",
+    "zip": "application/zip",
+    "pdf": "application/pdf",
+}
+
+# Slide fields that affect the rendered pixels; anything else (ids, prompts) is ignored in the cache key
+RENDER_FIELDS = (
+    "title", "content", "background_url", "type", "layout", "variant", "font", "text_effect", "theme",
+    "arrow_color", "font_color", "headline_color", "text_position", "text_align", "text_width",
+    "text_bg_enabled", "container_opacity", "glass_intensity", "theme_mode", "text_shadow",
+)
+
+_MIRRORED_RE = re.compile(r"/api/images/([0-9a-f]{64})")
+
+
+class BackgroundUnavailable(Exception):
+    """A slide background couldn't be fetched; the export is not rendered or cached"""
+
+
+def export_key(slides: List[dict], fmt: str) -> str:
+    payload = [{k: s.get(k) for k in RENDER_FIELDS} for s in slides]
+    raw = json.dumps({"v": RENDERER_VERSION, "fmt": fmt, "slides": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class SlideExporter:
+    """
+    Renders generations server-side (Pillow, in the shared process pool) into
+    PNG/JPEG, ZIP or PDF. Results are cached on disk keyed by a hash of the
+    render-relevant slide fields, so unchanged carousels are served instantly.
+    """
+
+    def __init__(self):
+        settings = get_settings()
+        self.lru = DiskLRU(Path(settings.export_cache_dir), settings.export_cache_max_bytes, name="Export cache")
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "slides_rendered": 0}
+
+    async def _load_background(self, url: Optional[str]) -> Optional[bytes]:
+        """Raises BackgroundUnavailable rather than rendering (and caching) a slide without its background"""
+        if not url:
+            return None
+        try:
+            match = _MIRRORED_RE.search(url)
+            if match:
+                data = await get_blob_store().get(original_key(match.group(1)))
+                if data is None:
+                    raise FileNotFoundError(f"mirrored original {match.group(1)} is missing")
+                return data
+            cached = await get_image_cache().get(url)
+            return await asyncio.to_thread(cached.path.read_bytes)
+        except Exception as e:
+            logger.warning(f"Export background fetch failed for {url}: {e}")
+            raise BackgroundUnavailable(f"Could not load slide background {url}") from e
+
+    async def render_slides(self, slides: List[dict], fmt: str) -> List[bytes]:
+        backgrounds = await asyncio.gather(*(self._load_background(s.get("background_url")) for s in slides))
+        images = await asyncio.gather(*(
+            run_in_process(render_slide, s, bg, THEME_COLORS.get(s.get("theme"), THEME_COLORS["trust_clarity"])["c1"], fmt)
+            for s, bg in zip(slides, backgrounds)
+        ))
+        self.counters["slides_rendered"] += len(images)
+        return images
+
+    async def export(self, slides: List[dict], fmt: str) -> Path:
+        key = f"{export_key(slides, fmt)}.{fmt}"
+        if key in self.lru:
+            self.counters["hits"] += 1
+            self.lru.touch(key)
+            return self.lru.path(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["misses"] += 1
+            task = self._inflight[key] = asyncio.create_task(self._export(key, slides, fmt))
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _export(self, key: str, slides: List[dict], fmt: str) -> Path:
+        image_fmt = "jpeg" if fmt in ("jpeg", "pdf") else "png"
+        images = await self.render_slides(slides, image_fmt)
+        if fmt == "pdf":
+            data = await run_in_process(bundle_pdf, images)
+        elif len(images) == 1 and fmt in ("png", "jpeg"):
+            data = images[0]
+        else:
+            data = await asyncio.to_thread(bundle_zip, images, "jpg" if image_fmt == "jpeg" else "png")
+
+        path = self.lru.path(key)
+        tmp = path.with_name(f"{key}.{os.getpid()}.tmp")
+
+        def write():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+
+        await asyncio.to_thread(write)
+        self.lru.add(key, len(data))
+        return path
+
+    def stats(self) -> dict:
+        return {**self.counters, "evictions": self.lru.evictions, "entries": len(self.lru), "bytes": self.lru.total}
+
+
+_exporter: Optional[SlideExporter] = None
+
+
+def get_slide_exporter() -> SlideExporter:
+    global _exporter
+    if _exporter is None:
+        _exporter = SlideExporter()
+    return _exporter
@@ -0,0 +1,223 @@
+
+import io
+import logging
+import os
+import zipfile
+from functools import lru_cache
+from typing import List, Optional
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Pure rendering functions: everything here takes plain dicts/bytes and returns
+# bytes so it can run inside the process pool (see services/slide_exporter.py).
+# Layout mirrors frontend/src/components/SlideCanvas.jsx at 1080x1080.
+
+CANVAS = 1080
+RENDERER_VERSION = "3"
+
+POSITIONS = {
+    "top_left": ("left", "top"), "top_center": ("center", "top"), "top_right": ("right", "top"),
+    "middle_left": ("left", "middle"), "middle_center": ("center", "middle"), "middle_right": ("right", "middle"),
+    "bottom_left": ("left", "bottom"), "bottom_center": ("center", "bottom"), "bottom_right": ("right", "bottom"),
+}
+TEXT_WIDTHS = {"narrow": 500, "medium": 800, "wide": 1000}
+GLASS_BLUR = {"none": 0, "low": 8, "medium": 16, "high": 24}
+
+# Font keys from Slide.font -> candidate TTF files (RENDER_FONT_DIR is searched first)
+FONT_FILES = {
+    "modern": ["Inter-Bold.ttf", "DejaVuSans-Bold.ttf"],
+    "serif": ["PlayfairDisplay-Bold.ttf", "DejaVuSerif-Bold.ttf"],
+    "mono": ["JetBrainsMono-Bold.ttf", "DejaVuSansMono-Bold.ttf"],
+    "bold": ["Inter-Black.ttf", "DejaVuSans-Bold.ttf"],
+    "handwritten": ["Caveat-Bold.ttf", "DejaVuSans-Bold.ttf"],
+    "futuristic": ["Orbitron-Bold.ttf", "DejaVuSans-Bold.ttf"],
+    "editorial": ["PlayfairDisplay-Black.ttf", "DejaVuSerif-Bold.ttf"],
+    "body": ["Inter-Regular.ttf", "DejaVuSans.ttf"],
+}
+
+
+@lru_cache(maxsize=64)
+def _font(key: str, size: int) -> ImageFont.FreeTypeFont:
+    font_dir = os.environ.get("RENDER_FONT_DIR", "")
+    for name in FONT_FILES.get(key, FONT_FILES["modern"]):
+        for candidate in ([os.path.join(font_dir, name)] if font_dir else []) + [name]:
+            try:
+                return ImageFont.truetype(candidate, size)
+            except OSError:
+                continue
+    return ImageFont.load_default(size=size)
+
+
+def _rgb(color: Optional[str], default: str) -> tuple:
+    value = (color or default).lstrip("#")
+    if len(value) == 3:
+        value = "".join(c * 2 for c in value)
+    try:
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        return _rgb(default, "#FFFFFF")
+
+
+def _wrap(draw: ImageDraw.ImageDraw, text: str, font, max_width: int) -> List[str]:
+    lines = []
+    for paragraph in (text or "").split("\n"):
+        words, line = paragraph.split(), ""
+        for word in words:
+            trial = f"{line} {word}".strip()
+            if draw.textlength(trial, font=font) <= max_width or not line:
+                line = trial
+            else:
+                lines.append(line)
+                line = word
+        lines.append(line)
+    return lines
+
+
+class _TextBlock:
+    def __init__(self, draw, text: str, font, color: tuple, max_width: int, line_height: float):
+        self.font = font
+        self.color = color
+        self.lines = _wrap(draw, text, font, max_width) if text else []
+        self.line_px = int(font.size * line_height)
+        self.width = max((int(draw.textlength(l, font=font)) for l in self.lines), default=0)
+        self.height = self.line_px * len(self.lines)
+
+    def draw(self, draw, x: int, y: int, box_width: int, align: str, shadow: bool):
+        for line in self.lines:
+            line_w = draw.textlength(line, font=self.font)
+            lx = x + {"left": 0, "center": (box_width - line_w) / 2, "right": box_width - line_w}.get(align, 0)
+            if shadow:
+                draw.text((lx + 3, y + 4), line, font=self.font, fill=(0, 0, 0, 160))
+            draw.text((lx, y), line, font=self.font, fill=self.color + (255,))
+            y += self.line_px
+
+
+def _background(data: Optional[bytes], fallback: tuple) -> Image.Image:
+    if data:
+        try:
+            img = Image.open(io.BytesIO(data)).convert("RGB")
+            scale = CANVAS / min(img.width, img.height)
+            img = img.resize((max(CANVAS, round(img.width * scale)), max(CANVAS, round(img.height * scale))), Image.LANCZOS)
+            left, top = (img.width - CANVAS) // 2, (img.height - CANVAS) // 2
+            return img.crop((left, top, left + CANVAS, top + CANVAS)).convert("RGBA")
+        except Exception as e:
+            logger.warning(f"Background decode failed, using theme color: {e}")
+    return Image.new("RGBA", (CANVAS, CANVAS), fallback + (255,))
+
+
+def _glass(canvas: Image.Image, box: tuple, slide: dict):
+    """Frosted container: blurred background region + tinted rounded rectangle."""
+    if not slide.get("text_bg_enabled", True):
+        return
+    box = tuple(int(v) for v in box)
+    blur = GLASS_BLUR.get(slide.get("glass_intensity", "high"), 16)
+    if blur:
+        region = canvas.crop(box).filter(ImageFilter.GaussianBlur(blur / 2))
+        mask = Image.new("L", region.size, 0)
+        ImageDraw.Draw(mask).rounded_rectangle((0, 0, region.width - 1, region.height - 1), radius=24, fill=255)
+        canvas.paste(region, box[:2], mask)
+    dark = slide.get("theme_mode", "dark") == "dark"
+    base = (15, 23, 42) if dark else (255, 255, 255)
+    alpha = int(255 * float(slide.get("container_opacity", 0.6)))
+    overlay = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+    ImageDraw.Draw(overlay).rounded_rectangle(
+        box, radius=24, fill=base + (alpha,),
+        outline=(255, 255, 255, 26) if dark else (0, 0, 0, 26), width=1,
+    )
+    canvas.alpha_composite(overlay)
+
+
+def _anchor(position: str, width: int, height: int) -> tuple:
+    horizontal, vertical = POSITIONS.get(position, POSITIONS["middle_center"])
+    margin = CANVAS * 0.1
+    x = {"left": margin, "center": (CANVAS - width) / 2, "right": CANVAS - margin - width}[horizontal]
+    y = {"top": margin, "middle": (CANVAS - height) / 2, "bottom": CANVAS - margin - height}[vertical]
+    return int(x), int(y)
+
+
+def _arrow(canvas: Image.Image, color: tuple):
+    overlay = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+    d = ImageDraw.Draw(overlay)
+    cx, cy, r = CANVAS - 48 - 48, CANVAS - 48 - 48, 48
+    d.ellipse((cx - r, cy - r, cx + r, cy + r), fill=(255, 255, 255, 26), outline=(255, 255, 255, 26))
+    d.line((cx - 22, cy, cx + 22, cy), fill=color + (255,), width=6)
+    d.line((cx + 4, cy - 18, cx + 22, cy, cx + 4, cy + 18), fill=color + (255,), width=6, joint="curve")
+    canvas.alpha_composite(overlay)
+
+
+def render_slide(slide: dict, background: Optional[bytes], theme_color: str = "#0F172A", fmt: str = "png") -> bytes:
+    canvas = _background(background, _rgb(theme_color, "#0F172A"))
+    canvas.alpha_composite(Image.new("RGBA", canvas.size, (0, 0, 0, 51)))  # bg-black/20
+
+    text_layer = Image.new("RGBA", canvas.size, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(text_layer)
+    headline = _rgb(slide.get("headline_color"), "#FACC15")
+    body = _rgb(slide.get("font_color"), "#FFFFFF")
+    font_key = slide.get("font", "modern")
+    align = slide.get("text_align", "center")
+    shadow = bool(slide.get("text_shadow"))
+    kind = slide.get("type", "body")
+    box_w = TEXT_WIDTHS.get(slide.get("text_width", "medium"), 800)
+
+    if kind == "cta":
+        pad = 64
+        inner = min(CANVAS - 2 * 64, 896) - 2 * pad
+        title = _TextBlock(draw, (slide.get("title") or "").upper(), _font(font_key, 96), headline, inner, 1.0)
+        pill = _TextBlock(draw, slide.get("content") or "", _font("body", 48), (0, 0, 0), inner - 96, 1.2)
+        height = pad * 2 + title.height + 32 + pill.height + 64
+        x, y = (CANVAS - inner - 2 * pad) // 2, (CANVAS - height) // 2
+        _glass(canvas, (x, y, x + inner + 2 * pad, y + height), slide)
+        title.draw(draw, x + pad, y + pad, inner, "center", shadow)
+        py = y + pad + title.height + 32
+        pw = pill.width + 96
+        px = x + pad + (inner - pw) // 2
+        draw.rounded_rectangle((px, py, px + pw, py + pill.height + 64), radius=min(48, (pill.height + 64) // 2), fill=headline + (255,))
+        pill.draw(draw, px + 48, py + 32, pill.width, "center", False)
+    elif kind == "hero":
+        pad = 48
+        title = _TextBlock(draw, (slide.get("title") or "").upper(), _font(font_key, 128), headline, box_w - 2 * pad, 0.85)
+        content = _TextBlock(draw, slide.get("content") or "", _font("body", 48), body, box_w - 2 * pad, 1.25)
+        height = pad * 2 + title.height + (32 + content.height if content.lines else 0)
+        x, y = _anchor(slide.get("text_position", "middle_center"), box_w, height)
+        _glass(canvas, (x, y, x + box_w, y + height), slide)
+        title.draw(draw, x + pad, y + pad, box_w - 2 * pad, align, shadow)
+        content.draw(draw, x + pad, y + pad + title.height + 32, box_w - 2 * pad, align, shadow)
+    else:
+        pad = 40
+        title = _TextBlock(draw, (slide.get("title") or "").upper(), _font(font_key, 96), headline, box_w, 0.9)
+        content = _TextBlock(draw, slide.get("content") or "", _font("body", 48), body, box_w - 2 * pad, 1.6)
+        container_h = content.height + 2 * pad
+        height = title.height + 24 + container_h
+        x, y = _anchor(slide.get("text_position", "middle_center"), box_w, height)
+        cy = y + title.height + 24
+        _glass(canvas, (x, cy, x + box_w, cy + container_h), slide)
+        title.draw(draw, x, y, box_w, align, True)  # headline always has drop-shadow-2xl
+        content.draw(draw, x + pad, cy + pad, box_w - 2 * pad, align, shadow)
+
+    canvas.alpha_composite(text_layer)
+    if kind != "cta":
+        _arrow(canvas, headline)
+
+    out = io.BytesIO()
+    if fmt == "jpeg":
+        canvas.convert("RGB").save(out, format="JPEG", quality=92)
+    else:
+        canvas.save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+def bundle_zip(images: List[bytes], ext: str) -> bytes:
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as zf:
+        for i, data in enumerate(images, start=1):
+            zf.writestr(f"slide-{i:02d}.{ext}", data)
+    return out.getvalue()
+
+
+def bundle_pdf(images: List[bytes]) -> bytes:
+    pages = [Image.open(io.BytesIO(data)).convert("RGB") for data in images]
+    out = io.BytesIO()
+    pages[0].save(out, format="PDF", save_all=True, append_images=pages[1:], resolution=144)
+    return out.getvalue()
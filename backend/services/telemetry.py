@@ -0,0 +1,573 @@
+
+import asyncio
+import bisect
+import contextvars
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from pymongo import monitoring
+
+from config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+# Metrics
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        # Mongo command events arrive on driver threads, not the event loop
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels))
+
+    def lines(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in list(self._values.items())]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (last is +Inf), sum, count]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def value(self, **labels) -> Optional[dict]:
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return None
+        return {"count": state[2], "sum": state[1], "buckets": dict(zip(self.buckets + (float("inf"),), state[0]))}
+
+    def lines(self) -> List[str]:
+        out = []
+        for key, (counts, total, count) in list(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = 'le="' + _number(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return out
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text format. Instruments
+    are cheap dict updates; component state that already has a stats()
+    (caches, poller, limiter...) is read by collectors at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable] = []
+        self.collect_timeout = 5.0
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs) -> _Metric:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+        elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered as a different {metric.kind}")
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collect: Callable):
+        """
+        collect() (sync or async) returns (name, kind, help, [(labels, value), ...])
+        families, read on every scrape.
+        """
+        self._collectors.append(collect)
+
+    async def render(self) -> str:
+        out = []
+        for metric in list(self._metrics.values()):
+            out.append(f"# HELP {metric.name} {metric.documentation}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.lines())
+        # Collectors may contribute to the same family; each family is written once
+        collected: Dict[str, tuple] = {}
+        for collect in self._collectors:
+            try:
+                families = collect()
+                if asyncio.iscoroutine(families):
+                    # A Mongo outage shouldn't hang the scrape
+                    families = await asyncio.wait_for(families, timeout=self.collect_timeout)
+            except Exception as e:
+                logger.warning(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e!r}")
+                continue
+            for name, kind, documentation, samples in families:
+                collected.setdefault(name, (kind, documentation, []))[2].extend(samples)
+        for name, (kind, documentation, samples) in collected.items():
+            out.append(f"# HELP {name} {documentation}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is not None:
+                    out.append(f"{name}{_labels(list(labels), list(labels.values()))} {_number(value)}")
+        return "\n".join(out) + "\n"
+
+
+_registry: Optional[MetricsRegistry] = None
+
+
+def get_metrics() -> MetricsRegistry:
+    global _registry
+    if _registry is None:
+        _registry = MetricsRegistry()
+    return _registry
+
+
+# Tracing (span model, ids and traceparent follow OpenTelemetry / W3C Trace Context)
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3, "producer": 4, "consumer": 5}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: dict) -> list:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "sampled", "attributes", "events",
+                 "status", "status_message", "start_time_ns", "end_time_ns")
+
+    def __init__(self, name: str, trace_id: str, span_id: str, parent_id: Optional[str], kind: str,
+                 sampled: bool, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def add_event(self, name: str, attributes: Optional[dict] = None):
+        self.events.append((name, time.time_ns(), attributes or {}))
+
+    def record_exception(self, error: BaseException):
+        self.add_event("exception", {"exception.type": type(error).__name__, "exception.message": str(error)[:500]})
+        self.status, self.status_message = STATUS_ERROR, str(error)[:500]
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_time_ns is None:
+            return None
+        return (self.end_time_ns - self.start_time_ns) / 1e6
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        """OTLP/JSON span"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or 0),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [{"name": n, "timeUnixNano": str(t), "attributes": _otlp_attributes(a)} for n, t, a in self.events],
+            "status": {"code": self.status, "message": self.status_message} if self.status else {},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _NoopSpan:
+    """Yielded when tracing is disabled so call sites never branch"""
+
+    name = trace_id = span_id = parent_id = None
+    sampled = False
+
+    def set_attribute(self, key, value):
+        pass
+
+    def add_event(self, name, attributes=None):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+    def traceparent(self) -> Optional[str]:
+        return None
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class InMemorySpanExporter:
+    """Keeps the most recent finished spans (GET /api/admin/traces, tests)"""
+
+    def __init__(self, max_spans: int = 5000):
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, spans: Iterable[Span]):
+        self._spans.extend(spans)
+
+    def get_finished_spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        spans = list(self._spans)
+        return [s for s in spans if s.trace_id == trace_id] if trace_id else spans
+
+    def clear(self):
+        self._spans.clear()
+
+
+class OTLPHTTPExporter:
+    """Batches spans and POSTs them as OTLP/JSON to <endpoint>/v1/traces"""
+
+    def __init__(self, endpoint: str, service_name: str, interval: float = 5.0, max_queue: int = 20000, max_batch: int = 512):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.interval = interval
+        self.max_batch = max_batch
+        self._queue = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {"exported": 0, "dropped": 0, "errors": 0}
+
+    def export(self, spans: Iterable[Span]):
+        for span in spans:
+            if len(self._queue) == self._queue.maxlen:
+                self.counters["dropped"] += 1
+            self._queue.append(span)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        from services.http_client import get_http_client
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            body = {"resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+                "scopeSpans": [{"scope": {"name": "backend"}, "spans": [s.to_dict() for s in batch]}],
+            }]}
+            try:
+                resp = await get_http_client().post(self.url, json=body, timeout=10.0)
+                resp.raise_for_status()
+                self.counters["exported"] += len(batch)
+            except Exception as e:
+                self.counters["errors"] += 1
+                logger.warning(f"OTLP export of {len(batch)} spans failed: {e}")
+                return
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header"""
+    match = _TRACEPARENT.match((header or "").strip().lower())
+    if not match or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2), int(match.group(3), 16) & 1 == 1
+
+
+class Tracer:
+    def __init__(self, enabled: bool = True, sample_rate: float = 1.0, exporters: Sequence = ()):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporters = list(exporters)
+
+    @contextmanager
+    def start_span(self, name: str, attributes: Optional[dict] = None, kind: str = "internal",
+                   traceparent: Optional[str] = None):
+        """
+        Starts a span as a child of the current one (or of `traceparent` from
+        another process), making it current for the block; asyncio tasks
+        created inside inherit it. Exceptions are recorded and re-raised.
+        """
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, random.random() < self.sample_rate
+        span = Span(name, trace_id, os.urandom(8).hex(), parent_id, kind, sampled, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, (asyncio.CancelledError, GeneratorExit)):
+                span.record_exception(e)
+            raise
+        finally:
+            span.end_time_ns = time.time_ns()
+            _current_span.reset(token)
+            if span.sampled:
+                for exporter in self.exporters:
+                    exporter.export((span,))
+
+
+_tracer: Optional[Tracer] = None
+_memory_exporter: Optional[InMemorySpanExporter] = None
+_otlp_exporter: Optional[OTLPHTTPExporter] = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer, _memory_exporter, _otlp_exporter
+    if _tracer is None:
+        settings = get_settings()
+        _memory_exporter = InMemorySpanExporter(settings.trace_buffer_spans)
+        exporters = [_memory_exporter]
+        if settings.otel_exporter_otlp_endpoint:
+            _otlp_exporter = OTLPHTTPExporter(settings.otel_exporter_otlp_endpoint, settings.otel_service_name)
+            exporters.append(_otlp_exporter)
+        _tracer = Tracer(settings.tracing_enabled, settings.trace_sample_rate, exporters)
+    return _tracer
+
+
+def get_span_exporter() -> InMemorySpanExporter:
+    get_tracer()
+    return _memory_exporter
+
+
+def start_span(name: str, attributes: Optional[dict] = None, kind: str = "internal", traceparent: Optional[str] = None):
+    return get_tracer().start_span(name, attributes, kind, traceparent)
+
+
+def current_span():
+    return _current_span.get() or _NOOP_SPAN
+
+
+def current_traceparent() -> Optional[str]:
+    """Header value for propagating the current trace (e.g. into a queued job)"""
+    span = _current_span.get()
+    return span.traceparent() if span is not None else None
+
+
+async def start_telemetry():
+    get_tracer()
+    if _otlp_exporter is not None:
+        _otlp_exporter.start()
+
+
+async def stop_telemetry():
+    if _otlp_exporter is not None:
+        await _otlp_exporter.stop()
+
+
+# Instrumentation
+
+HTTP_LATENCY = get_metrics().histogram(
+    "http_request_duration_seconds", "API request latency by route template", ("method", "route", "status"))
+MONGO_LATENCY = get_metrics().histogram(
+    "mongo_command_duration_seconds", "Mongo command latency", ("command", "collection", "outcome"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+# Probes and scrapes would otherwise dominate the trace buffer
+UNTRACED_PATHS = {"/api/metrics", "/api/health"}
+
+
+class TelemetryMiddleware:
+    """
+    ASGI middleware recording request latency by route template (never the
+    raw path, to keep label cardinality bounded) and a server span per
+    request that continues an incoming traceparent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        method = scope["method"]
+        traceparent = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"traceparent"), None)
+        tracer = get_tracer()
+        start = time.perf_counter()
+        with (tracer.start_span(f"{method} {scope['path']}", kind="server", traceparent=traceparent)
+              if scope["path"] not in UNTRACED_PATHS else _untraced()) as span:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                # FastAPI leaves the matched route in the scope
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                HTTP_LATENCY.observe(time.perf_counter() - start, method=method, route=route, status=status)
+                if span is not _NOOP_SPAN:
+                    span.name = f"{method} {route}"
+                    span.set_attribute("http.method", method)
+                    span.set_attribute("http.route", route)
+                    span.set_attribute("http.status_code", status)
+                    if status >= 500:
+                        span.status = STATUS_ERROR
+
+
+@contextmanager
+def _untraced():
+    yield _NOOP_SPAN
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """pymongo command monitoring -> mongo_command_duration_seconds"""
+
+    IGNORED = {"hello", "ismaster", "isMaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+    # Commands in flight at once; past this the oldest entries (whose completion was never reported) are dropped
+    MAX_IN_FLIGHT = 10000
+
+    def __init__(self):
+        # Events arrive on driver threads as well as the loop thread
+        self._lock = threading.Lock()
+        self._collections: "OrderedDict[tuple, str]" = OrderedDict()
+
+    def started(self, event):
+        if event.command_name in self.IGNORED:
+            return
+        target = event.command.get("collection" if event.command_name == "getMore" else event.command_name)
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+            while len(self._collections) > self.MAX_IN_FLIGHT:
+                self._collections.popitem(last=False)
+
+    def _record(self, event, outcome: str):
+        with self._lock:
+            collection = self._collections.pop((event.connection_id, event.request_id), None)
+        if collection is not None:
+            MONGO_LATENCY.observe(event.duration_micros / 1e6, command=event.command_name,
+                                  collection=collection, outcome=outcome)
+
+    def succeeded(self, event):
+        self._record(event, "ok")
+
+    def failed(self, event):
+        self._record(event, "error")
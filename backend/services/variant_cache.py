@@ -0,0 +1,86 @@
+
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from config import get_settings
+from services.blob_store import BlobStore, get_blob_store
+from services.disk_lru import DiskLRU
+from services.image_mirror import original_key
+from services.image_variants import make_variant
+from services.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+MIN_WIDTH = 16
+WIDTH_STEP = 32
+
+
+def snap_width(width: int) -> int:
+    """Rounds requested widths up to a fixed grid so arbitrary ?w= values can't blow up the cache."""
+    width = max(MIN_WIDTH, min(width, get_settings().variant_max_width))
+    return -(-width // WIDTH_STEP) * WIDTH_STEP
+
+
+class VariantCache:
+    """
+    On-demand resized/re-encoded variants of mirrored images. Encoding runs in
+    the shared process pool; results are memoized on disk with LRU eviction and
+    concurrent requests for the same variant share one encode.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None):
+        settings = get_settings()
+        self.store = store or get_blob_store()
+        self.lru = DiskLRU(Path(settings.variant_cache_dir), settings.variant_cache_max_bytes, name="Variant cache")
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    async def get(self, digest: str, width: int, fmt: str) -> Path:
+        key = f"{digest}-w{width}.{fmt}"
+        if key in self.lru:
+            self.counters["hits"] += 1
+            self.lru.touch(key)
+            return self.lru.path(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.counters["misses"] += 1
+            task = self._inflight[key] = asyncio.create_task(self._render(key, digest, width, fmt))
+            task.add_done_callback(lambda _t: self._inflight.pop(key, None))
+        else:
+            self.counters["coalesced"] += 1
+        return await asyncio.shield(task)
+
+    async def _render(self, key: str, digest: str, width: int, fmt: str) -> Path:
+        data = await self.store.get(original_key(digest))
+        if data is None:
+            raise FileNotFoundError(digest)
+        encoded = await run_in_process(make_variant, data, width, fmt)
+
+        path = self.lru.path(key)
+        tmp = path.with_name(f"{key}.{os.getpid()}.tmp")
+
+        def write():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(encoded)
+            os.replace(tmp, path)
+
+        await asyncio.to_thread(write)
+        self.lru.add(key, len(encoded))
+        return path
+
+    def stats(self) -> dict:
+        return {**self.counters, "evictions": self.lru.evictions, "entries": len(self.lru), "bytes": self.lru.total}
+
+
+_cache: Optional[VariantCache] = None
+
+
+def get_variant_cache() -> VariantCache:
+    global _cache
+    if _cache is None:
+        _cache = VariantCache()
+    return _cache
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Standalone job worker. Run any number of these next to (or instead of) the
+API's embedded worker:
+
+    cd backend && python worker.py --concurrency 8
+"""
+
+import argparse
+import asyncio
+import logging
+import signal
+from dotenv import load_dotenv
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from database import client, db
+from indexes import start_index_bootstrap, stop_index_bootstrap
+from routes.webhooks import process_generation, process_ai_viral_generation
+from routes.generations import process_viral_visuals, process_export, process_generate_images
+from services.http_client import start_http_client, close_http_client
+from services.kie_poller import start_kie_poller, stop_kie_poller
+from services.openai_service import close_openai_service
+from services.job_queue import get_job_queue
+from services.job_worker import JobWorker
+from services.telemetry import start_telemetry, stop_telemetry
+from services.loop_monitor import start_loop_monitor, stop_loop_monitor
+from services.disk_lru import start_disk_rescans, stop_disk_rescans
+from config import get_settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_HANDLERS = {
+    "standard_generation": process_generation,
+    "ai_viral_generation": process_ai_viral_generation,
+    "viral_visuals": process_viral_visuals,
+    "export_generation": process_export,
+    "generate_images": process_generate_images,
+}
+
+
+async def main(concurrency: int = None):
+    await start_loop_monitor()
+    await start_http_client()
+    await start_kie_poller()
+    await start_telemetry()
+    settings = get_settings()
+    start_index_bootstrap(db, settings.index_bootstrap_timeout)
+    if settings.multi_worker:
+        await start_disk_rescans(settings.disk_cache_rescan_interval)
+    queue = get_job_queue()
+
+    worker = JobWorker(JOB_HANDLERS, queue=queue, concurrency=concurrency)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.request_stop)
+
+    try:
+        await worker.run()
+        await worker.stop()
+    finally:
+        await stop_index_bootstrap()
+        await stop_kie_poller()
+        await stop_disk_rescans()
+        await close_openai_service()
+        await stop_telemetry()
+        await close_http_client()
+        await stop_loop_monitor()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
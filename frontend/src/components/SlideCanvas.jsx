@@ -45,8 +45,12 @@ const widthClasses = {
 export const SlideCanvas = ({ slide, id }) => {
   if (!slide) return null;
 
+  // Mirrored images ("/api/images/...") are served by the backend directly; anything else goes through the proxy
+  const backendUrl = process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001';
   const bgUrl = slide.background_url 
-    ? `${process.env.REACT_APP_BACKEND_URL || 'http://localhost:8001'}/api/proxy/image?url=${encodeURIComponent(slide.background_url)}`
+    ? (slide.background_url.startsWith('/api/')
+        ? `${backendUrl}${slide.background_url}`
+        : `${backendUrl}/api/proxy/image?url=${encodeURIComponent(slide.background_url)}`)
     : null;
 
   const font = fontMap[slide.font] || fontMap.modern;
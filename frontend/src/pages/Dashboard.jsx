@@ -1,7 +1,7 @@
 
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
-import { getGenerations, triggerGeneration } from '../services/api';
+import { getGenerations, triggerGeneration, subscribeGenerations } from '../services/api';
 import { Plus, Loader2, Image as ImageIcon, Zap, Palette, Building2 } from 'lucide-react';
 import { Button } from '@/components/ui/button';
 import { Card } from '@/components/ui/card';
@@ -27,9 +27,17 @@ const themeOptions = [
   { id: "sunset_corporate", name: "Sunset Corporate", color: "#7C2D12" },
 ];
 
+const PAGE_SIZE = 60;
+
+// Newest first, the same (created_at, id) order the API pages in
+const isOlder = (a, b) => a.created_at < b.created_at || (a.created_at === b.created_at && a.id < b.id);
+
 const Dashboard = () => {
   const [generations, setGenerations] = useState([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  const loadedMore = useRef(false);
   const [newTopic, setNewTopic] = useState('');
   const [slideCount, setSlideCount] = useState(5);
   const [creating, setCreating] = useState(false);
@@ -42,8 +50,17 @@ const Dashboard = () => {
 
   const load = async () => {
     try {
-      const data = await getGenerations();
-      setGenerations(data);
+      const { items, nextCursor: cursor } = await getGenerations({ limit: PAGE_SIZE });
+      if (loadedMore.current && cursor) {
+        // Refreshes re-read the first page; keep the older pages already loaded below it
+        const last = items[items.length - 1];
+        const ids = new Set(items.map(g => g.id));
+        setGenerations(prev => [...items, ...prev.filter(g => !ids.has(g.id) && isOlder(g, last))]);
+      } else {
+        loadedMore.current = false;
+        setGenerations(items);
+        setNextCursor(cursor);
+      }
     } catch (e) {
       toast.error("Failed to load generations");
     } finally {
@@ -53,10 +70,38 @@ const Dashboard = () => {
 
   useEffect(() => {
     load();
-    const interval = setInterval(load, 5000);
-    return () => clearInterval(interval);
+    // Refetch when the server reports a change (bursts coalesced); slow poll as a safety net
+    let pending;
+    const unsubscribe = subscribeGenerations(null, () => {
+      clearTimeout(pending);
+      pending = setTimeout(load, 300);
+    });
+    const interval = setInterval(load, 60000);
+    return () => {
+      unsubscribe();
+      clearTimeout(pending);
+      clearInterval(interval);
+    };
   }, []);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const { items, nextCursor: cursor } = await getGenerations({ cursor: nextCursor, limit: PAGE_SIZE });
+      loadedMore.current = true;
+      setGenerations(prev => {
+        const ids = new Set(prev.map(g => g.id));
+        return [...prev, ...items.filter(g => !ids.has(g.id))];
+      });
+      setNextCursor(cursor);
+    } catch (e) {
+      toast.error("Failed to load more generations");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCreate = async (e) => {
     e.preventDefault();
     if (!newTopic) return;
@@ -178,13 +223,20 @@ const Dashboard = () => {
                         <h3 className="text-xl font-bold text-white mb-2 group-hover:text-primary truncate">{gen.topic}</h3>
                         <div className="mt-auto flex items-center gap-2 text-muted-foreground">
                             <ImageIcon size={16} />
-                            <span>{gen.slides?.length || 0} Slides</span>
+                            <span>{gen.slide_total ?? gen.slides?.length ?? 0} Slides</span>
                         </div>
                     </Card>
                 </Link>
             ))}
         </div>
       )}
+      {!loading && nextCursor && (
+        <div className="flex justify-center mt-8">
+            <Button onClick={loadMore} disabled={loadingMore} variant="outline" className="border-border text-white">
+                {loadingMore && <Loader2 className="animate-spin mr-2" />} Load more
+            </Button>
+        </div>
+      )}
     </div>
   );
 };
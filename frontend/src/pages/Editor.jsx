@@ -1,7 +1,7 @@
 
 import React, { useEffect, useState, useRef } from 'react';
 import { useParams, Link } from 'react-router-dom';
-import { getGeneration, updateGeneration, generateImage } from '../services/api';
+import { getGeneration, updateGeneration, patchSlides, generateImage, generateImages, getJob, subscribeGenerations } from '../services/api';
 import { SlideCanvas } from '@/components/SlideCanvas';
 import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
@@ -40,7 +40,12 @@ const Editor = () => {
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [generatingImage, setGeneratingImage] = useState(false);
-  const [polling, setPolling] = useState(false); // New state for polling visuals
+  const [polling, setPolling] = useState(null); // job id of the viral visuals run being watched
+  // Unsaved edits: per-slide changed fields, or a structural change (slides added/removed)
+  const dirty = useRef({ slides: {}, structural: false });
+  const hasUnsavedEdits = () => dirty.current.structural || Object.keys(dirty.current.slides).length > 0;
+  // A background write landed while there were unsaved edits; shown instead of overwriting them
+  const [changedElsewhere, setChangedElsewhere] = useState(false);
 
   const activeSlide = generation?.slides?.[activeSlideIndex];
 
@@ -48,32 +53,42 @@ const Editor = () => {
     loadGeneration();
   }, [id]);
 
-  // Polling Effect
+  // Viral visuals arrive stage by stage: show each write as it lands, stop once the job finishes.
+  // The job's status is the signal, so a run that is over between two refreshes or a job that
+  // dies before its pipeline starts still ends the spinner.
   useEffect(() => {
-    let interval;
-    if (polling) {
-        interval = setInterval(async () => {
-            try {
-                const data = await getGeneration(id);
-                // Check if hero slide has background url
-                if (data.slides && data.slides.length > 0 && data.slides[0].background_url) {
-                    setGeneration(data);
-                    setPolling(false);
-                    setGeneratingImage(false);
-                    toast.success("Viral Visuals Generated!");
-                }
-            } catch (e) {
-                console.error("Polling error", e);
+    if (!polling) return;
+    const refresh = async () => {
+        try {
+            const [data, job] = await Promise.all([getGeneration(id), getJob(polling)]);
+            if (hasUnsavedEdits()) setChangedElsewhere(true);
+            else setGeneration(data);
+            if (job.status === 'succeeded' || job.status === 'dead') {
+                setPolling(null);
+                setGeneratingImage(false);
+                if (job.status === 'succeeded') toast.success("Viral Visuals Generated!");
+                else toast.error("Some visuals failed to generate");
             }
-        }, 3000); // Poll every 3 seconds
-    }
-    return () => clearInterval(interval);
+        } catch (e) {
+            console.error("Refresh error", e);
+        }
+    };
+    const unsubscribe = subscribeGenerations(id, (event) => {
+        if (!event || event.fields.includes('slides') || event.fields.includes('pipeline')) refresh();
+    });
+    // Safety poll: with a standalone worker and no change streams, its writes never reach this stream
+    const interval = setInterval(refresh, 15000);
+    return () => {
+        unsubscribe();
+        clearInterval(interval);
+    };
   }, [polling, id]);
 
   const loadGeneration = async () => {
     try {
       const data = await getGeneration(id);
       setGeneration(data);
+      setChangedElsewhere(false);
       if (!data.slides || data.slides.length === 0) {
         toast.error("No slides found");
         return;
@@ -90,23 +105,46 @@ const Editor = () => {
     
     let updatedSlides = [...generation.slides];
     
+    const edits = dirty.current.slides;
     if (field === 'theme') {
         updatedSlides = updatedSlides.map(slide => ({ ...slide, theme: value }));
+        updatedSlides.forEach(slide => { edits[slide.id] = { ...edits[slide.id], theme: value }; });
         toast.info("Theme updated for all slides");
     } else {
         updatedSlides[activeSlideIndex] = { ...activeSlide, [field]: value };
+        edits[activeSlide.id] = { ...edits[activeSlide.id], [field]: value };
     }
 
     setGeneration({ ...generation, slides: updatedSlides });
   };
 
+  const discardAndReload = () => {
+    dirty.current = { slides: {}, structural: false };
+    loadGeneration();
+  };
+
   const handleSave = async () => {
     setSaving(true);
     try {
-      await updateGeneration(id, generation);
+      const { slides: edits, structural } = dirty.current;
+      let res;
+      if (structural) {
+        res = await updateGeneration(id, generation);
+      } else if (Object.keys(edits).length) {
+        // Only the changed fields go over the wire, so background writes to other fields survive.
+        // No version: pipeline writes bump it on every stage and would turn each save into a 409.
+        res = await patchSlides(id, Object.entries(edits).map(([slideId, changes]) => ({ id: slideId, ...changes })));
+      }
+      dirty.current = { slides: {}, structural: false };
+      if (res) setGeneration(g => ({ ...g, version: res.version }));
       toast.success("Saved successfully");
     } catch (e) {
-      toast.error("Failed to save");
+      if (e.response?.status === 409) {
+        toast.error("This carousel was changed elsewhere. Reloaded the latest version.");
+        discardAndReload();
+      } else {
+        toast.error("Failed to save");
+      }
     } finally {
       setSaving(false);
     }
@@ -120,7 +158,7 @@ const Editor = () => {
       const updatedSlides = generation.slides.map((slide, idx) => 
         idx === activeSlideIndex ? { ...slide, background_url: result.url } : slide
       );
-      setGeneration({ ...generation, slides: updatedSlides });
+      setGeneration({ ...generation, slides: updatedSlides, version: result.version ?? generation.version });
       toast.success("Image generated");
     } catch (e) {
       toast.error("Failed to generate image");
@@ -129,6 +167,33 @@ const Editor = () => {
     }
   };
 
+  const handleGenerateAllImages = async () => {
+    setGeneratingImage(true);
+    const toastId = toast.loading("Generating backgrounds...");
+    try {
+      const { job_id } = await generateImages(id);
+      let job;
+      do {
+        await new Promise(r => setTimeout(r, 2000));
+        job = await getJob(job_id);
+        const p = job.progress;
+        if (p?.total) toast.loading(`Generating backgrounds... ${p.done + p.failed}/${p.total}`, { id: toastId });
+      } while (job.status === 'queued' || job.status === 'running');
+
+      await loadGeneration();
+      if (job.status === 'succeeded') {
+        const failed = job.progress?.failed || 0;
+        toast.success(failed ? `Backgrounds generated (${failed} failed)` : "Backgrounds generated", { id: toastId });
+      } else {
+        toast.error("Background generation failed", { id: toastId });
+      }
+    } catch (e) {
+      toast.error("Failed to generate backgrounds", { id: toastId });
+    } finally {
+      setGeneratingImage(false);
+    }
+  };
+
   const downloadSlide = async () => {
     const node = document.getElementById(`slide-${activeSlideIndex}`);
     if (!node) return;
@@ -152,11 +217,12 @@ const Editor = () => {
         });
         if (res.ok) {
             toast.success("Generating Assets... (This may take a minute)");
-            setPolling(true);
+            const { job_id } = await res.json();
+            setPolling(job_id);
             
             // Safety timeout to stop polling after 2 mins
             setTimeout(() => {
-                setPolling(false);
+                setPolling(null);
                 setGeneratingImage(false);
             }, 120000);
         } else {
@@ -185,6 +251,7 @@ const Editor = () => {
     const newSlides = [...slidesWithoutCTA, newSlide];
     if (ctaSlide) newSlides.push(ctaSlide);
     
+    dirty.current.structural = true;
     setGeneration({ ...generation, slides: newSlides });
     setActiveSlideIndex(newSlides.length - (ctaSlide ? 2 : 1));
   };
@@ -193,6 +260,7 @@ const Editor = () => {
     e.stopPropagation();
     if (generation.slides.length <= 1) return;
     const newSlides = generation.slides.filter((_, i) => i !== index);
+    dirty.current.structural = true;
     setGeneration({ ...generation, slides: newSlides });
     if (activeSlideIndex >= index && activeSlideIndex > 0) setActiveSlideIndex(activeSlideIndex - 1);
   };
@@ -214,6 +282,13 @@ const Editor = () => {
             </div>
         </div>
 
+        {changedElsewhere && (
+            <div className="border-b border-yellow-500/30 bg-yellow-900/20 px-6 py-2 flex items-center justify-between text-sm text-yellow-200 shrink-0">
+                <span>This carousel was changed elsewhere while you were editing. Saving may be rejected.</span>
+                <Button onClick={discardAndReload} variant="outline" size="sm" className="border-yellow-500/50 text-yellow-200">Discard my edits and reload</Button>
+            </div>
+        )}
+
         <div className="flex-1 flex overflow-hidden">
             {/* Sidebar */}
             <div className="w-48 border-r border-border bg-secondary/20 overflow-y-auto p-4 space-y-4 flex flex-col shrink-0">
@@ -284,6 +359,7 @@ const Editor = () => {
                                 <label className="text-xs font-mono text-muted-foreground">BACKGROUND PROMPT</label>
                                 <Textarea value={activeSlide.background_prompt} onChange={e => handleUpdateSlide('background_prompt', e.target.value)} className="bg-secondary border-transparent text-xs" rows={4} />
                                 <Button onClick={handleGenerateImage} disabled={generatingImage} className="w-full bg-secondary hover:bg-secondary/80 border border-border">{generatingImage ? <Loader2 className="animate-spin mr-2" /> : <Wand2 className="mr-2" />} GENERATE ART</Button>
+                                <Button onClick={handleGenerateAllImages} disabled={generatingImage} variant="outline" className="w-full bg-transparent border-border text-xs">GENERATE MISSING ART FOR ALL SLIDES</Button>
                             </div>
                         </TabsContent>
 
@@ -7,9 +7,13 @@ const api = axios.create({
   baseURL: `${API_URL}/api`,
 });
 
-export const getGenerations = async () => {
-  const res = await api.get('/generations/');
-  return res.data;
+// Summary view: no slide bodies. Pass the previous page's nextCursor to paginate
+// (null on the last page).
+export const getGenerations = async ({ cursor, limit = 60, ...filters } = {}) => {
+  const res = await api.get('/generations/', {
+    params: { view: 'summary', limit, ...(cursor ? { cursor } : {}), ...filters },
+  });
+  return { items: res.data, nextCursor: res.headers['x-next-cursor'] || null };
 };
 
 export const getGeneration = async (id) => {
@@ -22,11 +26,36 @@ export const updateGeneration = async (id, data) => {
   return res.data;
 };
 
+// Field-level slide edits. `version` is the generation version the edits were
+// based on; the server answers 409 if someone else wrote in between.
+export const patchSlide = async (genId, slideId, changes, version) => {
+  const res = await api.patch(`/generations/${genId}/slides/${slideId}`, changes, {
+    headers: version != null ? { 'If-Match': `"${version}"` } : {},
+  });
+  return res.data;
+};
+
+export const patchSlides = async (genId, slides, version) => {
+  const res = await api.patch(`/generations/${genId}/slides`, { slides, version });
+  return res.data;
+};
+
 export const generateImage = async (genId, slideId) => {
   const res = await api.post(`/generations/${genId}/generate-image/${slideId}`);
   return res.data;
 };
 
+// Backgrounds for every slide that lacks one, in one background job
+export const generateImages = async (genId, overwrite = false) => {
+  const res = await api.post(`/generations/${genId}/generate-images`, null, { params: { overwrite } });
+  return res.data;
+};
+
+export const getJob = async (jobId) => {
+  const res = await api.get(`/jobs/${jobId}`);
+  return res.data;
+};
+
 export const triggerGeneration = async (topic, slideCount = 5, context = "", theme = "trust_clarity", businessName = "", businessType = "") => {
   const res = await api.post('/webhooks/trigger', { 
     topic, 
@@ -43,3 +72,15 @@ export const triggerViralVisuals = async (genId) => {
   const res = await api.post(`/generations/${genId}/generate-viral-visuals`);
   return res.data;
 };
+
+// Live updates over Server-Sent Events. Pass a generation id to follow one
+// generation, or null for all. `onReset` fires when the server can't replay
+// what was missed during a reconnect and the caller should refetch.
+// Returns an unsubscribe function.
+export const subscribeGenerations = (id, onChange, onReset = onChange) => {
+  const url = `${API_URL}/api/generations/stream${id ? `?id=${encodeURIComponent(id)}` : ''}`;
+  const source = new EventSource(url);
+  source.addEventListener('generation', (e) => onChange(JSON.parse(e.data)));
+  source.addEventListener('reset', () => onReset(null));
+  return () => source.close();
+};
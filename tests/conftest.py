@@ -0,0 +1,114 @@
+
+import os
+import re
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND))
+
+# Settings are read at import time; keep tests off the network and quiet
+os.environ.setdefault("TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_EXPORTER_OTLP_ENDPOINT", "")
+# Anything that reaches the real client instead of the `db` fixture fails fast
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017/?serverSelectionTimeoutMS=500")
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """In-memory Mongo, patched in wherever the app reads `database.db`"""
+    import database
+
+    mock_db = AsyncMongoMockClient()["test"]
+    monkeypatch.setattr(database, "db", mock_db)
+    return mock_db
+
+
+_FILTERED_PATH = re.compile(r"^(\w+)\.\$\[(\w+)\]\.(.+)$")
+
+
+def _matches(value, wanted) -> bool:
+    if isinstance(wanted, dict):
+        return value in wanted["$in"]
+    return value == wanted
+
+
+class ArrayFilterCollection:
+    """
+    mongomock has no arrayFilters. The app only uses the `{"<x>.id": value}`
+    and `{"<x>.id": {"$in": [...]}}` shapes, which this expands into `array.<index>.field` paths against the
+    matched document before delegating.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def _expand(self, query: dict, update: dict, array_filters: list):
+        doc = await self._collection.find_one(query)
+        if doc is None:
+            return query, update
+        idents = {}
+        for array_filter in array_filters:
+            (path, value), = array_filter.items()
+            ident, field = path.split(".", 1)
+            idents[ident] = (field, value)
+        expanded = {}
+        for path, value in update.get("$set", {}).items():
+            match = _FILTERED_PATH.match(path)
+            if not match:
+                expanded[path] = value
+                continue
+            array, ident, rest = match.groups()
+            field, wanted = idents[ident]
+            for i, element in enumerate(doc.get(array, [])):
+                if _matches(element.get(field), wanted):
+                    expanded[f"{array}.{i}.{rest}"] = value
+        return {**query, "_id": doc["_id"]}, {**update, "$set": expanded}
+
+    async def find_one_and_update(self, query, update, *args, array_filters=None, **kwargs):
+        if array_filters:
+            query, update = await self._expand(query, update, array_filters)
+        return await self._collection.find_one_and_update(query, update, *args, **kwargs)
+
+    async def update_one(self, query, update, *args, array_filters=None, **kwargs):
+        if array_filters:
+            query, update = await self._expand(query, update, array_filters)
+        return await self._collection.update_one(query, update, *args, **kwargs)
+
+
+class AppDatabase:
+    def __init__(self, db):
+        self._db = db
+        self.generations = ArrayFilterCollection(db.generations)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __getitem__(self, name):
+        return self.generations if name == "generations" else self._db[name]
+
+
+@pytest.fixture
+def app_db(db, monkeypatch):
+    """`db` plus the route modules' own `db` imports, job queue and event bus pointed at it"""
+    from routes import generations, webhooks
+    from services import events, job_queue
+
+    app = AppDatabase(db)
+    monkeypatch.setattr(webhooks, "db", app)
+    monkeypatch.setattr(generations, "db", app)
+    monkeypatch.setattr(job_queue, "_queue", job_queue.JobQueue(db.jobs))
+    monkeypatch.setattr(events, "_bus", events.GenerationEventBus(app.generations))
+    return app
@@ -0,0 +1,90 @@
+
+import pytest
+
+from config import get_settings
+from models import BatchTriggerPayload
+from routes import webhooks
+from services.job_queue import get_job_queue
+
+pytestmark = pytest.mark.anyio
+
+
+async def trigger(*items):
+    return await webhooks.trigger_generation_batch(BatchTriggerPayload(items=list(items)))
+
+
+def statuses(response):
+    return [r["status"] for r in response["results"]]
+
+
+async def test_batch_inserts_generations_and_jobs(app_db):
+    response = await trigger({"topic": "Rates"}, {"topic": "Hiring", "extra_context": "viral"})
+
+    assert statuses(response) == ["accepted", "accepted"]
+    assert await app_db.generations.count_documents({}) == 2
+    jobs = await app_db.jobs.find({}, {"_id": 0}).sort("kind", 1).to_list(10)
+    assert [job["kind"] for job in jobs] == ["ai_viral_generation", "standard_generation"]
+    ids = {r["id"] for r in response["results"]}
+    assert {job["payload"]["generation_id"] for job in jobs} == ids
+    assert {r["job_id"] for r in response["results"]} == {job["id"] for job in jobs}
+
+
+async def test_duplicates_within_a_batch_and_invalid_items(app_db):
+    response = await trigger(
+        {"topic": "Rates", "business_name": "Acme"},
+        {"topic": "  rates ", "business_name": "ACME"},
+        {"slide_count": 3},
+        {"topic": "Rates", "business_name": "Other"},
+    )
+
+    assert statuses(response) == ["accepted", "duplicate", "invalid", "accepted"]
+    assert response["results"][1]["id"] == response["results"][0]["id"]
+    assert response["results"][2]["errors"][0]["loc"] == ["topic"]
+    assert (response["accepted"], response["duplicate"], response["invalid"]) == (2, 1, 1)
+    assert await app_db.generations.count_documents({}) == 2
+
+
+async def test_duplicates_across_batches_point_at_the_first_generation(app_db):
+    first = await trigger({"topic": "Rates", "idempotency_key": "feed:1"})
+    second = await trigger({"topic": "Different title", "idempotency_key": "feed:1"}, {"topic": "New"})
+
+    assert statuses(second) == ["duplicate", "accepted"]
+    assert second["results"][0]["id"] == first["results"][0]["id"]
+    assert await app_db.generations.count_documents({}) == 2
+    assert await app_db.jobs.count_documents({}) == 2
+
+
+async def test_expired_keys_are_taken_over(app_db):
+    first = await trigger({"topic": "Rates"})
+    await app_db.ingest_keys.update_many({}, {"$set": {"expires_at": webhooks.datetime(2000, 1, 1)}})
+
+    again = await trigger({"topic": "Rates"})
+    assert statuses(again) == ["accepted"]
+    assert again["results"][0]["id"] != first["results"][0]["id"]
+    key = await app_db.ingest_keys.find_one({})
+    assert key["generation_id"] == again["results"][0]["id"]
+
+
+async def test_failed_enqueue_rolls_back_the_batch(app_db, monkeypatch):
+    async def broken_enqueue_many(jobs):
+        raise RuntimeError("jobs collection unavailable")
+
+    queue = get_job_queue()
+    monkeypatch.setattr(queue, "enqueue_many", broken_enqueue_many)
+    with pytest.raises(RuntimeError):
+        await trigger({"topic": "Rates"}, {"topic": "Hiring"})
+
+    assert await app_db.generations.count_documents({}) == 0
+    assert await app_db.ingest_keys.count_documents({}) == 0
+
+    # The feed can retry the same items
+    monkeypatch.delattr(queue, "enqueue_many")
+    response = await trigger({"topic": "Rates"}, {"topic": "Hiring"})
+    assert statuses(response) == ["accepted", "accepted"]
+
+
+async def test_batch_size_is_capped(app_db, monkeypatch):
+    monkeypatch.setattr(get_settings(), "ingest_max_batch", 2)
+    with pytest.raises(webhooks.HTTPException) as e:
+        await trigger({"topic": "a"}, {"topic": "b"}, {"topic": "c"})
+    assert e.value.status_code == 413
@@ -0,0 +1,125 @@
+
+from datetime import timedelta
+
+import pytest
+
+from services import job_queue
+from services.job_queue import DEAD, QUEUED, RUNNING, SUCCEEDED, JobQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(db):
+    return JobQueue(db.jobs)
+
+
+async def expire_lease(queue, job_id):
+    await queue.collection.update_one(
+        {"id": job_id},
+        {"$set": {"lease_expires_at": job_queue._now() - timedelta(seconds=1)}},
+    )
+
+
+async def test_claim_is_exclusive(queue):
+    job_id = await queue.enqueue("k", {"n": 1})
+
+    job = await queue.claim("w1")
+    assert job["id"] == job_id
+    assert job["status"] == RUNNING
+    assert job["attempts"] == 1
+    assert job["lease_owner"] == "w1"
+    assert await queue.claim("w2") is None
+
+
+async def test_claim_filters_kinds(queue):
+    await queue.enqueue("a", {})
+    assert await queue.claim("w1", kinds=["b"]) is None
+    assert (await queue.claim("w1", kinds=["a"]))["kind"] == "a"
+
+
+async def test_expired_lease_is_reclaimed(queue):
+    job_id = await queue.enqueue("k", {}, max_attempts=3)
+    await queue.claim("w1")
+    await expire_lease(queue, job_id)
+
+    job = await queue.claim("w2")
+    assert job["id"] == job_id
+    assert job["lease_owner"] == "w2"
+    assert job["attempts"] == 2
+    # The first worker lost its lease
+    assert not await queue.heartbeat(job_id, "w1")
+    assert await queue.heartbeat(job_id, "w2")
+
+
+async def test_expired_lease_on_final_attempt_is_dead_lettered(queue, monkeypatch):
+    dead = []
+
+    async def hook(job):
+        dead.append(job["id"])
+
+    monkeypatch.setattr(job_queue, "_dead_letter_hooks", {"k": [hook]})
+    job_id = await queue.enqueue("k", {}, max_attempts=1)
+    await queue.claim("w1")
+    await expire_lease(queue, job_id)
+
+    assert await queue.claim("w2") is None
+    job = await queue.get(job_id)
+    assert job["status"] == DEAD
+    assert "lease expired" in job["last_error"]
+    assert dead == [job_id]
+
+
+async def test_fail_retries_then_dead_letters(queue, monkeypatch):
+    dead = []
+
+    async def hook(job):
+        dead.append(job["id"])
+
+    monkeypatch.setattr(job_queue, "_dead_letter_hooks", {"k": [hook]})
+    job_id = await queue.enqueue("k", {}, max_attempts=2)
+
+    job = await queue.claim("w1")
+    await queue.fail(job, "w1", "boom")
+    stored = await queue.get(job_id)
+    assert stored["status"] == QUEUED
+    assert stored["last_error"] == "boom"
+    assert dead == []
+
+    # Retry is scheduled in the future; make it due
+    await queue.collection.update_one({"id": job_id}, {"$set": {"run_at": job_queue._now()}})
+    job = await queue.claim("w1")
+    assert job["attempts"] == 2
+    await queue.fail(job, "w1", "boom again")
+    assert (await queue.get(job_id))["status"] == DEAD
+    assert dead == [job_id]
+
+
+async def test_fail_from_a_worker_that_lost_the_lease_is_ignored(queue, monkeypatch):
+    monkeypatch.setattr(job_queue, "_dead_letter_hooks", {})
+    job_id = await queue.enqueue("k", {}, max_attempts=2)
+    job = await queue.claim("w1")
+    await expire_lease(queue, job_id)
+    await queue.claim("w2")
+
+    await queue.fail(job, "w1", "late failure")
+    stored = await queue.get(job_id)
+    assert stored["status"] == RUNNING
+    assert stored["lease_owner"] == "w2"
+
+
+async def test_complete_and_requeue(queue):
+    first = await queue.enqueue("k", {})
+    job = await queue.claim("w1")
+    await queue.complete(first, "w1", {"ok": True})
+    stored = await queue.get(first)
+    assert stored["status"] == SUCCEEDED
+    assert stored["result"] == {"ok": True}
+
+    second = await queue.enqueue("k", {})
+    job = await queue.claim("w1")
+    await queue.requeue(second, "w1")
+    stored = await queue.get(second)
+    assert stored["status"] == QUEUED
+    assert stored["attempts"] == 0
+    assert job["id"] == second
@@ -0,0 +1,72 @@
+
+import json
+
+import pytest
+
+from services.json_stream import WILDCARD, IncrementalJSONParser
+
+DOCUMENT = {
+    "hero": {"prompt": "a {bracketed} \"quoted\" skyline", "style": "neon"},
+    "slides": [
+        {"title": "One, two", "content": "back\\slash [x]", "tags": ["a", "b"]},
+        {"title": "Ünïcode ✓", "content": "line\nbreak", "nested": {"slides": [{"x": 1}]}},
+        {"title": "CTA", "content": "", "type": "cta"},
+    ],
+}
+PATHS = [("hero",), ("slides", WILDCARD)]
+
+
+def feed_in_chunks(parser, text, size):
+    events = []
+    for i in range(0, len(text), size):
+        events.extend(parser.feed(text[i:i + size]))
+    return events
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, 64, 10_000])
+def test_reports_each_container_once_whatever_the_chunking(size):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=2)
+    parser = IncrementalJSONParser(PATHS)
+    events = feed_in_chunks(parser, text, size)
+
+    assert events == [
+        (("hero",), DOCUMENT["hero"]),
+        (("slides", 0), DOCUMENT["slides"][0]),
+        (("slides", 1), DOCUMENT["slides"][1]),
+        (("slides", 2), DOCUMENT["slides"][2]),
+    ]
+    assert parser.result() == DOCUMENT
+
+
+def test_values_arrive_as_soon_as_they_close():
+    text = json.dumps(DOCUMENT, ensure_ascii=False)
+    cut = text.index('{"title": "Ünïcode')
+    parser = IncrementalJSONParser(PATHS)
+
+    first = parser.feed(text[:cut])
+    assert [path for path, _ in first] == [("hero",), ("slides", 0)]
+    rest = parser.feed(text[cut:])
+    assert [path for path, _ in rest] == [("slides", 1), ("slides", 2)]
+
+
+def test_escaped_quotes_and_keys_do_not_confuse_paths():
+    doc = {"a\"}": {"hero": {"x": 1}}, "hero": [1, 2], "slides": [[1], {"k": "]"}]}
+    parser = IncrementalJSONParser(PATHS)
+    events = feed_in_chunks(parser, json.dumps(doc), 3)
+    # Only top-level "hero" and direct "slides" elements are reported, not nested namesakes
+    assert events == [(("hero",), [1, 2]), (("slides", 0), [1]), (("slides", 1), {"k": "]"})]
+
+
+def test_unwatched_paths_are_ignored():
+    parser = IncrementalJSONParser([("slides", 1)])
+    events = parser.feed(json.dumps(DOCUMENT))
+    assert events == [(("slides", 1), DOCUMENT["slides"][1])]
+
+
+def test_truncated_stream_fails_on_result():
+    text = json.dumps(DOCUMENT)
+    parser = IncrementalJSONParser(PATHS)
+    events = parser.feed(text[:-40])
+    assert [path for path, _ in events][:2] == [("hero",), ("slides", 0)]
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
@@ -0,0 +1,203 @@
+
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from config import get_settings
+from services.kie_poller import COMPLETED, KieTaskPoller, SharedKieTaskPoller
+from services.kie_service import KieTaskFailed
+from services.leader import LeaderLease
+
+pytestmark = pytest.mark.anyio
+
+RESULT_URL = "https://tempfile.aiquickdraw.com/r/hero.png"
+
+
+def success(url=RESULT_URL):
+    return {"state": "success", "resultJson": json.dumps({"resultUrls": [url]})}
+
+
+class FakeKie:
+    """recordInfo stand-in: per task id, the (done, url) answers or exceptions to return in turn"""
+
+    def __init__(self, **answers):
+        self.answers = {task_id: list(seq) for task_id, seq in answers.items()}
+        self.calls = []
+
+    async def fetch_task(self, task_id):
+        self.calls.append(task_id)
+        seq = self.answers.get(task_id) or [(False, None)]
+        answer = seq.pop(0) if len(seq) > 1 else seq[0]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+def fast(poller):
+    poller.tick = 0.01
+    poller.initial_delay = 0
+    poller.max_delay = 0.01
+    return poller
+
+
+async def test_poll_resolves_after_pending_answers():
+    kie = FakeKie(t1=[(False, None), (False, None), (True, RESULT_URL)])
+    poller = fast(KieTaskPoller(kie))
+    try:
+        assert await poller.wait("t1", timeout=2) == RESULT_URL
+    finally:
+        await poller.stop()
+    assert kie.calls == ["t1"] * 3
+    assert poller.stats()["completed"] == 1
+
+
+async def test_poll_errors_are_retried_and_failures_raised():
+    kie = FakeKie(t1=[RuntimeError("502"), (True, RESULT_URL)], t2=[KieTaskFailed("Task state: fail")])
+    poller = fast(KieTaskPoller(kie))
+    try:
+        assert await poller.wait("t1", timeout=2) == RESULT_URL
+        with pytest.raises(KieTaskFailed):
+            await poller.wait("t2", timeout=2)
+    finally:
+        await poller.stop()
+    assert poller.stats()["poll_errors"] == 1
+
+
+async def test_callback_resolves_without_polling():
+    kie = FakeKie()
+    poller = KieTaskPoller(kie)
+    poller.initial_delay = 60
+    waiter = asyncio.create_task(poller.wait("t1", timeout=2))
+    await asyncio.sleep(0)
+    try:
+        assert poller.resolve("t1", {"state": "generating"}) is False
+        assert poller.resolve("t1", success()) is True
+        assert await waiter == RESULT_URL
+    finally:
+        await poller.stop()
+    assert kie.calls == []
+    assert poller.resolve("unknown", success()) is False
+
+
+async def test_wait_times_out():
+    poller = KieTaskPoller(FakeKie())
+    poller.initial_delay = 60
+    try:
+        with pytest.raises(TimeoutError):
+            await poller.wait("t1", timeout=0.05)
+    finally:
+        await poller.stop()
+    assert poller.stats()["queue_depth"] == 0
+
+
+def shared_poller(db, kie, holder):
+    lease = LeaderLease("kie-poller", ttl=5, collection=db.leases)
+    lease.holder = holder
+    return fast(SharedKieTaskPoller(kie, collection=db.kie_tasks, lease=lease))
+
+
+async def test_shared_poller_only_leader_polls(db):
+    kie = FakeKie(t1=[(False, None), (True, RESULT_URL)])
+    leader, follower = shared_poller(db, kie, "a"), shared_poller(db, kie, "b")
+    assert await leader.lease.try_acquire()
+    assert not await follower.lease.try_acquire()
+    try:
+        # The follower's waiter is resolved from kie_tasks, written by the leader's poll
+        follower.start()
+        leader.start()
+        assert await follower.wait("t1", timeout=2) == RESULT_URL
+    finally:
+        await follower.stop()
+        await leader.stop()
+    assert set(kie.calls) == {"t1"}
+    doc = await db.kie_tasks.find_one({"_id": "t1"})
+    assert doc["status"] == COMPLETED
+    assert doc["url"] == RESULT_URL
+
+
+async def test_shared_callback_on_another_worker(db):
+    kie = FakeKie()
+    waiting, receiving = shared_poller(db, kie, "a"), shared_poller(db, kie, "b")
+    waiting.initial_delay = 60
+    try:
+        waiter = asyncio.create_task(waiting.wait("t1", timeout=2))
+        await asyncio.sleep(0.02)
+        assert await receiving.callback("t1", success()) is True
+        assert await waiter == RESULT_URL
+    finally:
+        await waiting.stop()
+        await receiving.stop()
+    assert kie.calls == []
+
+
+async def test_shared_callback_before_wait(db):
+    poller = shared_poller(db, FakeKie(), "a")
+    poller.initial_delay = 60
+    try:
+        await poller.callback("t1", {"state": "fail", "failMsg": "nsfw"})
+        # _register must not overwrite the stored result
+        with pytest.raises(KieTaskFailed, match="nsfw"):
+            await poller.wait("t1", timeout=2)
+    finally:
+        await poller.stop()
+
+
+class RecordingPoller:
+    def __init__(self):
+        self.calls = []
+
+    async def callback(self, task_id, data):
+        self.calls.append((task_id, data))
+        return True
+
+
+@pytest.fixture
+def callback_env(monkeypatch):
+    from routes import webhooks
+
+    poller = RecordingPoller()
+    monkeypatch.setattr(webhooks, "get_kie_poller", lambda: poller)
+    monkeypatch.setattr(get_settings(), "kie_callback_token", "s3cret")
+    return webhooks.kie_callback, poller
+
+
+async def test_callback_route_requires_token(callback_env, monkeypatch):
+    kie_callback, poller = callback_env
+    payload = {"data": {"taskId": "t1", **success()}}
+    for token in ("wrong", "s3crét"):
+        with pytest.raises(HTTPException) as e:
+            await kie_callback(payload, token=token)
+        assert e.value.status_code == 403
+
+    monkeypatch.setattr(get_settings(), "kie_callback_token", "")
+    with pytest.raises(HTTPException) as e:
+        await kie_callback(payload, token="")
+    assert e.value.status_code == 403
+    assert poller.calls == []
+
+
+@pytest.mark.parametrize("url", [
+    "http://tempfile.aiquickdraw.com/r/hero.png",
+    "https://169.254.169.254/latest/meta-data",
+    "https://aiquickdraw.com.evil.example/x.png",
+])
+async def test_callback_route_rejects_foreign_result_urls(callback_env, url):
+    kie_callback, poller = callback_env
+    with pytest.raises(HTTPException) as e:
+        await kie_callback({"data": {"taskId": "t1", **success(url)}}, token="s3cret")
+    assert e.value.status_code == 400
+    assert poller.calls == []
+
+
+async def test_callback_route_hands_record_to_poller(callback_env):
+    kie_callback, poller = callback_env
+    assert await kie_callback({"data": {"taskId": "t1", **success()}}, token="s3cret") == {"status": "ok"}
+    failed = {"taskId": "t2", "state": "fail", "failMsg": "nsfw"}
+    await kie_callback({"data": failed}, token="s3cret")
+    assert [task_id for task_id, _ in poller.calls] == ["t1", "t2"]
+
+    with pytest.raises(HTTPException) as e:
+        await kie_callback({"data": success()}, token="s3cret")
+    assert e.value.status_code == 400
@@ -0,0 +1,69 @@
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo.errors import AutoReconnect
+
+from services.leader import LeaderLease
+
+pytestmark = pytest.mark.anyio
+
+
+def lease(db, holder, ttl=5):
+    lease = LeaderLease("poller", ttl=ttl, collection=db.leases)
+    lease.holder = holder
+    return lease
+
+
+async def test_one_leader_at_a_time(db):
+    a, b = lease(db, "a"), lease(db, "b")
+    assert await a.try_acquire()
+    assert not await b.try_acquire()
+    assert a.is_leader and not b.is_leader
+    # Renewal by the holder keeps it
+    assert await a.try_acquire()
+    assert (await db.leases.find_one({"_id": "poller"}))["holder"] == "a"
+
+
+async def test_expired_lease_is_taken_over(db):
+    a, b = lease(db, "a"), lease(db, "b")
+    assert await a.try_acquire()
+    await db.leases.update_one({"_id": "poller"}, {"$set": {
+        "expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}})
+
+    assert await b.try_acquire()
+    assert b.counters["acquired"] == 1
+    # The old leader finds out on its next renewal
+    assert not await a.try_acquire()
+    assert not a.is_leader
+    assert a.counters["lost"] == 1
+
+
+async def test_stop_hands_over_immediately(db):
+    a, b = lease(db, "a", ttl=60), lease(db, "b", ttl=60)
+    a.start()
+    for _ in range(50):
+        if a.is_leader:
+            break
+        await asyncio.sleep(0.01)
+    assert a.is_leader
+    await a.stop()
+    assert not a.is_leader
+    assert await b.try_acquire()
+
+
+async def test_leadership_lapses_locally_when_renewals_fail(db, monkeypatch):
+    a = lease(db, "a", ttl=0.05)
+    assert await a.try_acquire()
+
+    async def unreachable(*args, **kwargs):
+        raise AutoReconnect("primary unreachable")
+
+    monkeypatch.setattr(a.collection, "find_one_and_update", unreachable)
+    # Still within the lease it already holds
+    assert await a.try_acquire()
+    assert a.counters["renew_errors"] == 1
+    await asyncio.sleep(0.06)
+    assert not await a.try_acquire()
+    assert not a.is_leader
@@ -0,0 +1,97 @@
+
+import asyncio
+
+import pytest
+
+from services.pipeline import PipelineFailed, Stage, run_pipeline
+
+pytestmark = pytest.mark.anyio
+
+
+def stage(name, result=None, after=(), required=True, delay=0.0, error=None, log=None):
+    async def run(deps):
+        if log is not None:
+            log.append(("start", name, dict(deps)))
+        await asyncio.sleep(delay)
+        if error:
+            raise error
+        if log is not None:
+            log.append(("end", name))
+        return result
+
+    return Stage(name, run, after=after, required=required)
+
+
+async def test_dependencies_get_results_and_independent_stages_overlap():
+    log = []
+    stages = [
+        stage("text", "T", log=log),
+        stage("hero", "H", after=["text"], delay=0.02, log=log),
+        stage("backgrounds", "B", after=["text"], delay=0.02, log=log),
+        stage("design", "D", after=["hero", "backgrounds"], log=log),
+    ]
+    results = await run_pipeline(stages)
+
+    assert results == {"text": "T", "hero": "H", "backgrounds": "B", "design": "D"}
+    starts = {entry[1]: i for i, entry in enumerate(log) if entry[0] == "start"}
+    ends = {entry[1]: i for i, entry in enumerate(log) if entry[0] == "end"}
+    # hero and backgrounds both start before either finishes
+    assert max(starts["hero"], starts["backgrounds"]) < min(ends["hero"], ends["backgrounds"])
+    assert ("start", "design", {"hero": "H", "backgrounds": "B"}) in log
+
+
+async def test_optional_failure_skips_dependents_only():
+    timings = {}
+
+    async def on_stage(name, timing):
+        timings[name] = timing
+
+    stages = [
+        stage("text", "T"),
+        stage("alternates", after=["text"], required=False, error=RuntimeError("kie down")),
+        stage("pick", after=["alternates"], required=False),
+        stage("hero", "H", after=["text"]),
+    ]
+    results = await run_pipeline(stages, on_stage=on_stage)
+
+    assert results == {"text": "T", "hero": "H"}
+    assert timings["alternates"]["status"] == "failed"
+    assert "kie down" in timings["alternates"]["error"]
+    assert timings["pick"] == {"status": "skipped"}
+    assert timings["hero"]["status"] == "succeeded"
+    assert timings["hero"]["duration_ms"] >= 0
+
+
+async def test_required_failure_fails_the_pipeline_after_other_stages_finish():
+    finished = []
+
+    async def on_stage(name, timing):
+        finished.append(name)
+
+    stages = [
+        stage("hero", error=ValueError("no hero")),
+        stage("overlay", after=["hero"]),
+        stage("backgrounds", "B", delay=0.02),
+    ]
+    with pytest.raises(PipelineFailed) as e:
+        await run_pipeline(stages, on_stage=on_stage)
+
+    assert list(e.value.failures) == ["hero"]
+    assert sorted(finished) == ["backgrounds", "hero", "overlay"]
+
+
+async def test_on_stage_errors_are_not_fatal():
+    async def on_stage(name, timing):
+        raise RuntimeError("mongo down")
+
+    assert await run_pipeline([stage("a", 1)], on_stage=on_stage) == {"a": 1}
+
+
+@pytest.mark.parametrize("stages, message", [
+    ([stage("a", after=["missing"])], "unknown"),
+    ([stage("a", after=["b"]), stage("b", after=["a"])], "cycle"),
+    ([stage("a"), stage("b", after=["c"]), stage("c", after=["b"])], "cycle"),
+])
+async def test_invalid_graphs_are_rejected_before_running(stages, message):
+    with pytest.raises(ValueError, match=message):
+        await run_pipeline(stages)
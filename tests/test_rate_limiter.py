@@ -0,0 +1,161 @@
+
+import asyncio
+import time
+
+import pytest
+
+from config import get_settings
+from services import rate_limiter
+from services.rate_limiter import ProviderLimiter, TokenBucket, call_with_limits, current_tenant, stream_with_limits
+
+pytestmark = pytest.mark.anyio
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiters(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_limiters", {})
+    monkeypatch.setattr(get_settings(), "rate_limit_backoff_base", 0.001)
+
+
+async def test_token_bucket_bursts_then_paces():
+    bucket = TokenBucket(per_minute=600, capacity=2)  # 10 per second
+    started = time.monotonic()
+    await bucket.take()
+    await bucket.take()
+    assert time.monotonic() - started < 0.05
+    await bucket.take()
+    assert time.monotonic() - started >= 0.08
+
+
+async def test_token_bucket_oversized_request_and_disabled_bucket():
+    bucket = TokenBucket(per_minute=600, capacity=5)
+    started = time.monotonic()
+    # Larger than the bucket: goes through once it is full instead of waiting forever
+    await bucket.take(50)
+    await TokenBucket(per_minute=0).take(10 ** 6)
+    assert time.monotonic() - started < 0.05
+
+
+async def test_concurrency_is_capped_and_released_on_error():
+    limiter = ProviderLimiter("t", rpm=0, tpm=0, concurrency=2)
+    peak = 0
+
+    async def call(fail):
+        nonlocal peak
+        async with limiter.acquire():
+            peak = max(peak, limiter.stats_counters["in_flight"])
+            await asyncio.sleep(0.01)
+            if fail:
+                raise RuntimeError("boom")
+
+    results = await asyncio.gather(*(call(i % 2 == 0) for i in range(6)), return_exceptions=True)
+    assert sum(isinstance(r, RuntimeError) for r in results) == 3
+    assert peak == 2
+    assert limiter.stats_counters["in_flight"] == 0
+    assert limiter.stats_counters["calls"] == 6
+
+
+async def test_tenants_are_admitted_round_robin():
+    limiter = ProviderLimiter("t", rpm=0, tpm=0, concurrency=1)
+    order = []
+    busy = asyncio.Event()
+
+    async def call(tenant, name):
+        async with limiter.acquire(tenant=tenant):
+            order.append(name)
+            await busy.wait()
+
+    # One call holds the only slot while a noisy tenant queues four calls ahead of a quiet one
+    holder = asyncio.create_task(call("noisy", "held"))
+    await asyncio.sleep(0)
+    waiters = [asyncio.create_task(call("noisy", f"noisy{i}")) for i in range(4)]
+    waiters.append(asyncio.create_task(call("quiet", "quiet0")))
+    await asyncio.sleep(0.01)
+    busy.set()
+    await asyncio.gather(holder, *waiters)
+
+    assert order[0] == "held"
+    assert order.index("quiet0") <= 3
+    assert [n for n in order if n.startswith("noisy")] == [f"noisy{i}" for i in range(4)]
+
+
+async def test_penalize_blocks_new_admissions():
+    limiter = ProviderLimiter("t", rpm=0, tpm=0, concurrency=4)
+    limiter.penalize(0.1)
+    started = time.monotonic()
+    async with limiter.acquire():
+        pass
+    assert time.monotonic() - started >= 0.09
+    assert limiter.stats_counters["rate_limited"] == 1
+
+
+async def test_limits_are_split_between_workers(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "multi_worker", True)
+    monkeypatch.setattr(settings, "web_concurrency", 4)
+    monkeypatch.setattr(settings, "rate_limits", {"kie": {"rpm": 120, "tpm": 0, "concurrency": 10}})
+    limiter = rate_limiter.get_limiter("kie", "m")
+    assert limiter.requests.rate == pytest.approx(30 / 60)
+    assert limiter.semaphore._value == 3
+
+
+async def test_call_with_limits_retries_transient_statuses():
+    attempts = []
+
+    async def call():
+        attempts.append(current_tenant.get())
+        if len(attempts) < 3:
+            raise ProviderError(503)
+        return "ok"
+
+    assert await call_with_limits("openai", "retry-test", call, circuit=False) == "ok"
+    assert len(attempts) == 3
+
+
+async def test_call_with_limits_gives_up_on_client_errors_and_honours_retry_after():
+    calls = 0
+
+    async def bad_request():
+        nonlocal calls
+        calls += 1
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        await call_with_limits("openai", "retry-test", bad_request, circuit=False)
+    assert calls == 1
+
+    started, attempts = time.monotonic(), []
+
+    async def throttled():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise ProviderError(429, retry_after=0.1)
+        return "ok"
+
+    assert await call_with_limits("openai", "retry-test", throttled, circuit=False) == "ok"
+    assert attempts[1] - started >= 0.09
+    assert rate_limiter.get_limiter("openai", "retry-test").stats_counters["rate_limited"] == 1
+
+
+async def test_stream_holds_the_slot_until_the_block_exits(monkeypatch):
+    monkeypatch.setattr(get_settings(), "rate_limits", {"openai:stream-test": {"concurrency": 1}})
+    limiter = rate_limiter.get_limiter("openai", "stream-test")
+
+    async def open_stream():
+        return "stream"
+
+    async with stream_with_limits("openai", "stream-test", open_stream, circuit=False) as stream:
+        assert stream == "stream"
+        assert limiter.stats_counters["in_flight"] == 1
+        second = asyncio.create_task(call_with_limits("openai", "stream-test", open_stream, circuit=False))
+        await asyncio.sleep(0.02)
+        assert not second.done()
+    assert await second == "stream"
+    assert limiter.stats_counters["in_flight"] == 0
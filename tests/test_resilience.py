@@ -0,0 +1,207 @@
+
+import asyncio
+import time
+
+import pytest
+
+from services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpen, hedged, is_provider_failure
+
+pytestmark = pytest.mark.anyio
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def breaker(**kwargs):
+    options = dict(failure_threshold=3, failure_rate=0.5, min_calls=10, window=60, reset_timeout=0.05)
+    return CircuitBreaker("test", **{**options, **kwargs})
+
+
+async def ok():
+    return "ok"
+
+
+async def down():
+    raise ProviderError(503)
+
+
+async def bad_request():
+    raise ProviderError(400)
+
+
+def test_provider_failures():
+    assert is_provider_failure(ProviderError(503))
+    assert is_provider_failure(ProviderError(408))
+    assert is_provider_failure(asyncio.TimeoutError())
+    assert not is_provider_failure(ProviderError(429))
+    assert not is_provider_failure(ProviderError(400))
+    assert not is_provider_failure(ValueError())
+
+
+async def test_opens_after_consecutive_failures_and_fails_fast():
+    b = breaker()
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            await b.call(down)
+    assert b.state == OPEN
+
+    called = False
+
+    async def probe():
+        nonlocal called
+        called = True
+
+    with pytest.raises(CircuitOpen):
+        await b.call(probe)
+    with pytest.raises(CircuitOpen):
+        b.raise_if_open()
+    assert not called
+    assert b.counters["rejected"] == 2
+
+
+async def test_client_errors_and_successes_keep_it_closed():
+    b = breaker()
+    for _ in range(5):
+        with pytest.raises(ProviderError):
+            await b.call(bad_request)
+    assert b.state == CLOSED
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            await b.call(down)
+    assert await b.call(ok) == "ok"
+    # The success reset the consecutive count
+    with pytest.raises(ProviderError):
+        await b.call(down)
+    assert b.state == CLOSED
+
+
+async def test_opens_on_failure_rate():
+    b = breaker(failure_threshold=100, min_calls=4)
+    for fn in (ok, down, ok, down):
+        try:
+            await b.call(fn)
+        except ProviderError:
+            pass
+    assert b.state == OPEN
+
+
+async def test_half_open_allows_one_trial():
+    b = breaker()
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            await b.call(down)
+    await asyncio.sleep(0.06)
+
+    gate = asyncio.Event()
+
+    async def slow_ok():
+        await gate.wait()
+        return "ok"
+
+    trial = asyncio.create_task(b.call(slow_ok))
+    await asyncio.sleep(0)
+    assert b.state == HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        await b.call(ok)
+    gate.set()
+    assert await trial == "ok"
+    assert b.state == CLOSED
+
+
+async def test_failed_trial_reopens_for_longer():
+    b = breaker()
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            await b.call(down)
+    await asyncio.sleep(0.06)
+    with pytest.raises(ProviderError):
+        await b.call(down)
+    assert b.state == OPEN
+    assert b.opened_until - time.monotonic() > 0.07
+
+
+async def test_hedge_wins_when_primary_is_slow():
+    started = []
+    cancelled = []
+
+    async def call():
+        index = len(started)
+        started.append(index)
+        try:
+            await asyncio.sleep(1 if index == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(index)
+            raise
+        return index
+
+    assert await hedged(call, delay=0.02, name="test") == 1
+    await asyncio.sleep(0)
+    assert started == [0, 1]
+    assert cancelled == [0]
+
+
+async def test_fast_primary_is_not_hedged():
+    calls = 0
+
+    async def call():
+        nonlocal calls
+        calls += 1
+        return "primary"
+
+    assert await hedged(call, delay=0.05, name="test") == "primary"
+    assert await hedged(call, delay=0, name="test") == "primary"
+    assert calls == 2
+
+
+async def test_hedge_after_failure_and_all_failed():
+    calls = 0
+
+    async def flaky():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise ProviderError(503)
+        return "second"
+
+    assert await hedged(flaky, delay=1, name="test") == "second"
+
+    with pytest.raises(ProviderError):
+        await hedged(down, delay=0.01, name="test", max_attempts=3)
+
+
+class FallbackOpenAI:
+    async def generate_image(self, prompt):
+        return "https://dalle.example/hero.png"
+
+    async def analyze_design_from_image(self, url, use_cache=True):
+        return {}
+
+
+class RecordingMirror:
+    async def mirror(self, url):
+        return f"/api/images/{url.rsplit('/', 1)[-1]}"
+
+
+async def test_viral_visuals_run_without_kie(app_db, monkeypatch):
+    from routes import generations
+    from services import openai_service, resilience
+    from services.kie_service import EDIT_MODEL, HERO_MODEL
+
+    monkeypatch.setattr(resilience, "_breakers", {})
+    for model in (HERO_MODEL, EDIT_MODEL):
+        resilience.get_breaker("kie", model)._open()
+    monkeypatch.setattr(openai_service, "_service", FallbackOpenAI())
+    monkeypatch.setattr(generations, "ImageMirror", RecordingMirror)
+    await app_db.generations.insert_one({"id": "g1", "topic": "Rates", "slides": [
+        {"id": "s1", "title": "Hero", "content": "", "background_prompt": "skyline"},
+        {"id": "s2", "title": "Body", "content": "", "background_prompt": "skyline"},
+    ]})
+
+    await generations.process_viral_visuals("g1")
+
+    doc = await app_db.generations.find_one({"id": "g1"})
+    assert doc["pipeline"]["status"] == "succeeded"
+    assert [s["background_url"] for s in doc["slides"]] == ["/api/images/hero.png"] * 2
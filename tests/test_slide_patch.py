@@ -0,0 +1,129 @@
+
+import pytest
+from fastapi import HTTPException, Response
+from pydantic import ValidationError
+
+from models import BulkSlidePatch, SlidePatch
+from routes import generations
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def generation(app_db):
+    # No `version` field: written before versioning, treated as version 0
+    await app_db.generations.insert_one({
+        "id": "g1",
+        "topic": "Rates",
+        "slides": [
+            {"id": "s1", "title": "Hero", "content": "", "theme": "trust_clarity"},
+            {"id": "s2", "title": "Body", "content": "old", "theme": "trust_clarity"},
+            {"id": "s3", "title": "CTA", "content": "", "theme": "trust_clarity"},
+        ],
+    })
+    return "g1"
+
+
+async def stored(app_db, gen_id="g1"):
+    return await app_db.generations.find_one({"id": gen_id}, {"_id": 0})
+
+
+async def patch(slide_id, if_match=None, gen_id="g1", **changes):
+    response = Response()
+    body = await generations.patch_slide(gen_id, slide_id, SlidePatch(**changes), response, if_match=if_match)
+    return body, response
+
+
+async def test_etag_and_versioned_patch(app_db, generation):
+    response = Response()
+    await generations.get_generation(generation, response)
+    assert response.headers["ETag"] == '"0"'
+
+    body, response = await patch("s2", if_match='"0"', content="new")
+    assert body["version"] == 1
+    assert response.headers["ETag"] == '"1"'
+
+    doc = await stored(app_db)
+    assert doc["version"] == 1
+    assert [s["content"] for s in doc["slides"]] == ["", "new", ""]
+    assert doc["slides"][1]["title"] == "Body"
+
+
+async def test_stale_version_is_rejected(app_db, generation):
+    await patch("s1", if_match='"0"', title="First")
+    with pytest.raises(HTTPException) as e:
+        await patch("s2", if_match='W/"0"', title="Second")
+    assert e.value.status_code == 409
+    assert e.value.detail["version"] == 1
+    assert (await stored(app_db))["slides"][1]["title"] == "Body"
+
+
+async def test_missing_targets_and_bad_input(app_db, generation):
+    for kwargs, status in [
+        ({"slide_id": "nope", "if_match": '"0"'}, 404),
+        ({"slide_id": "s1", "gen_id": "missing"}, 404),
+        ({"slide_id": "s1", "if_match": "latest"}, 400),
+    ]:
+        with pytest.raises(HTTPException) as e:
+            await patch(title="x", **kwargs)
+        assert e.value.status_code == status
+    with pytest.raises(HTTPException) as e:
+        await patch("s1")
+    assert e.value.status_code == 400
+    assert (await stored(app_db)).get("version") is None
+
+
+async def test_patch_without_if_match_skips_the_check(app_db, generation):
+    await patch("s1", title="a")
+    body, _ = await patch("s1", title="b")
+    assert body["version"] == 2
+
+
+async def test_null_only_clears_nullable_fields(app_db, generation):
+    for body in ('{"title": null}', '{"text_bg_enabled": null}', '{"container_opacity": null}'):
+        with pytest.raises(ValidationError):
+            SlidePatch.model_validate_json(body)
+    with pytest.raises(ValidationError):
+        BulkSlidePatch.model_validate_json('{"slides": [{"id": "s1", "title": null}]}')
+    assert (await stored(app_db)).get("version") is None
+
+    await patch("s1", headline_color="#ff0000")
+    await generations.patch_slide(generation, "s1", SlidePatch.model_validate_json('{"headline_color": null}'),
+                                  Response(), if_match=None)
+    slide = (await stored(app_db))["slides"][0]
+    assert (slide["title"], slide["headline_color"]) == ("Hero", None)
+
+
+async def test_bulk_patch_writes_each_slide_once(app_db, generation):
+    body = BulkSlidePatch(version=0, slides=[
+        {"id": "s1", "theme": "modern_luxury"},
+        {"id": "s3", "theme": "modern_luxury", "title": "Follow"},
+        {"id": "s1", "title": "Hero!"},
+    ])
+    result = await generations.patch_slides(generation, body, Response(), if_match=None)
+    assert result == {"status": "updated", "version": 1, "slides": 2}
+
+    slides = (await stored(app_db))["slides"]
+    assert [(s["title"], s["theme"]) for s in slides] == [
+        ("Hero!", "modern_luxury"), ("Body", "trust_clarity"), ("Follow", "modern_luxury")]
+
+    with pytest.raises(HTTPException) as e:
+        await generations.patch_slides(generation, body, Response(), if_match=None)
+    assert e.value.status_code == 409
+
+
+async def test_put_requires_and_bumps_the_version(app_db, generation):
+    doc = await stored(app_db)
+    doc["slides"] = doc["slides"][:2]
+
+    with pytest.raises(HTTPException) as e:
+        await generations.update_generation(generation, dict(doc), Response(), if_match=None)
+    assert e.value.status_code == 428
+
+    result = await generations.update_generation(generation, {**doc, "version": 0}, Response(), if_match=None)
+    assert result["version"] == 1
+    assert len((await stored(app_db))["slides"]) == 2
+
+    with pytest.raises(HTTPException) as e:
+        await generations.update_generation(generation, dict(doc), Response(), if_match='"0"')
+    assert e.value.status_code == 409